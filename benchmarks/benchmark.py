@@ -0,0 +1,173 @@
+"""
+Measures the throughput of the generators on synthetic trees.
+
+Each stage (PDF generation, file counting and directory structure generation) is
+timed separately, in a fresh process, on every tree profile. PDF generation is
+also timed with each compression preset, to show the size/time tradeoff. The
+results are written as JSON so runs from different commits can be compared.
+
+Usage:
+    python -m benchmarks.benchmark --profiles wide mixed --scale 0.5 --output results.json
+    python -m benchmarks.benchmark --stages generate_pdf --compression fast small
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from benchmarks.synthetic_tree import PROFILES, build_tree
+from pdf_generator.compression import COMPRESSION_PRESETS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(REPO_ROOT, 'config.json')
+IGNORE_FILE_PATH = os.path.join(REPO_ROOT, 'ignore_folders.json')
+
+STAGES = ('generate_pdf', 'get_total_file_count', 'print_directory_structure')
+
+def peak_rss_bytes() -> Optional[int]:
+    """Returns the peak resident set size of this process and its children, if the platform reports it."""
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports kilobytes
+
+def run_stage(stage: str, tree_dir: str, output_dir: str, jobs: int = 1, compression: Optional[str] = None) -> dict:
+    """Runs one stage on a tree and returns its duration, peak memory and output size."""
+    from pdf_generator.pdf_generator import PDFGenerator
+    from directory_structure_generator.directory_structure import iter_structure_entries, write_directory_structure
+
+    output_bytes = None
+    start = time.perf_counter()
+    if stage == 'generate_pdf':
+        pdf_generator = PDFGenerator(tree_dir, output_dir, config_path=CONFIG_PATH, ignore_file_path=IGNORE_FILE_PATH,
+                                     compression=compression)
+        result = pdf_generator.generate_pdf(False, None, jobs=jobs)
+        if result is not True:
+            raise RuntimeError(f"PDF generation failed: {result}")
+        seconds = time.perf_counter() - start
+        output_bytes = os.path.getsize(os.path.join(output_dir, f"{os.path.basename(tree_dir)} dir content.pdf"))
+    elif stage == 'get_total_file_count':
+        pdf_generator = PDFGenerator(tree_dir, output_dir, config_path=CONFIG_PATH, ignore_file_path=IGNORE_FILE_PATH)
+        pdf_generator.get_total_file_count()
+        seconds = time.perf_counter() - start
+    elif stage == 'print_directory_structure':
+        structure_path = os.path.join(output_dir, 'structure.txt')
+        with open(structure_path, 'w', encoding='utf-8') as structure_file:
+            write_directory_structure(structure_file, iter_structure_entries(tree_dir, IGNORE_FILE_PATH))
+        seconds = time.perf_counter() - start
+        output_bytes = os.path.getsize(structure_path)
+    else:
+        raise ValueError(f"Unknown stage '{stage}'. Choose from: {', '.join(STAGES)}")
+
+    return {'seconds': seconds, 'peak_rss_bytes': peak_rss_bytes(), 'output_bytes': output_bytes}
+
+def run_stage_isolated(stage: str, tree_dir: str, output_dir: str, jobs: int = 1,
+                       compression: Optional[str] = None) -> dict:
+    """Runs a stage in a fresh process, so peak memory and warm caches do not carry over between stages."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_stage, stage, tree_dir, output_dir, jobs, compression).result()
+
+def benchmark_profile(profile: str, scale: float = 1.0, jobs: int = 1, repeat: int = 1,
+                      stages=STAGES, seed: int = 0, compressions=()) -> dict:
+    """Builds the tree of a profile and measures every stage on it.
+
+    With ``repeat``, each stage runs several times and the fastest run is kept.
+    When PDF generation is measured, it is measured again with each of the
+    ``compressions`` presets, and the output size is reported relative to the tree.
+    """
+    work_dir = tempfile.mkdtemp(prefix='pdf_benchmark_')
+    try:
+        tree_dir = os.path.join(work_dir, profile)
+        output_dir = os.path.join(work_dir, 'output')
+        os.makedirs(tree_dir)
+        os.makedirs(output_dir)
+        tree = build_tree(tree_dir, profile, scale, seed)
+
+        results = {}
+        for stage in stages:
+            runs = [run_stage_isolated(stage, tree_dir, output_dir, jobs) for _ in range(repeat)]
+            best = min(runs, key=lambda run: run['seconds'])
+            seconds = max(best['seconds'], 1e-9)
+            results[stage] = {
+                'seconds': round(best['seconds'], 6),
+                'files_per_sec': round(tree.files / seconds, 2),
+                'mb_per_sec': round(tree.bytes / (1024 * 1024) / seconds, 3),
+                'peak_rss_bytes': best['peak_rss_bytes'],
+                'output_bytes': best['output_bytes'],
+            }
+
+        compression_results = {}
+        if 'generate_pdf' in stages:
+            for compression in compressions:
+                runs = [run_stage_isolated('generate_pdf', tree_dir, output_dir, jobs, compression) for _ in range(repeat)]
+                best = min(runs, key=lambda run: run['seconds'])
+                compression_results[compression] = {
+                    'seconds': round(best['seconds'], 6),
+                    'output_bytes': best['output_bytes'],
+                    'size_ratio': round(best['output_bytes'] / max(tree.bytes, 1), 4),
+                }
+        return {'profile': profile, **tree._asdict(), 'stages': results, 'compression': compression_results}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(profiles: List[str], scale: float = 1.0, jobs: int = 1, repeat: int = 1,
+                   stages=STAGES, compressions=()) -> dict:
+    """Runs the benchmark on each profile and returns the JSON-serialisable report."""
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': scale,
+        'jobs': jobs,
+        'repeat': repeat,
+        'results': [benchmark_profile(profile, scale, jobs, repeat, stages, compressions=compressions)
+                    for profile in profiles],
+    }
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the PDF and directory structure generators on synthetic trees.')
+    parser.add_argument('-p', '--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES),
+                        help='Tree profiles to benchmark')
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help='Scales the number and size of generated files')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Worker processes used to render the PDF')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='Runs per stage; the fastest is reported')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help='Stages to measure')
+    parser.add_argument('-c', '--compression', nargs='*', choices=list(COMPRESSION_PRESETS),
+                        default=list(COMPRESSION_PRESETS),
+                        help='Compression presets to compare PDF generation with; none to skip the comparison')
+    parser.add_argument('-o', '--output', help='Write the JSON report to this file instead of stdout')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    report = run_benchmarks(args.profiles, args.scale, args.jobs, args.repeat, args.stages, args.compression)
+    report_json = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as report_file:
+            report_file.write(report_json)
+    else:
+        print(report_json)
+
+if __name__ == '__main__':
+    main()
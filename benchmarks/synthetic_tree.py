@@ -0,0 +1,108 @@
+"""
+Builds synthetic directory trees to benchmark the generators on.
+
+Every tree is generated from a fixed seed, so the same profile and scale always
+produce the same files and results can be compared across commits.
+"""
+
+import os
+import random
+from typing import Callable, Dict, NamedTuple
+
+# Printable source-like text the generated files are made of
+_WORDS = ("def", "class", "return", "import", "self", "value", "result", "for", "in", "if",
+          "else", "print", "config", "path", "items", "0", "1", "42", "None", "True")
+
+class TreeStats(NamedTuple):
+    """What was written into a synthetic tree."""
+    files: int
+    text_files: int
+    binary_files: int
+    bytes: int
+
+def make_text(rng: random.Random, size: int) -> str:
+    """Returns about ``size`` characters of code-like text split into lines."""
+    lines = []
+    length = 0
+    while length < size:
+        line = "    " * rng.randint(0, 3) + " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 12)))
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)[:size]
+
+class TreeWriter:
+    """Writes files into a tree and keeps count of what was written."""
+
+    def __init__(self, root: str, seed: int):
+        self.root = root
+        self.rng = random.Random(seed)
+        self.files = self.text_files = self.binary_files = self.bytes = 0
+
+    def text(self, relative_path: str, size: int):
+        self._write(relative_path, make_text(self.rng, size).encode('utf-8'))
+        self.text_files += 1
+
+    def binary(self, relative_path: str, size: int):
+        # A PNG signature followed by noise, so the sniffer sees a binary file
+        noise_size = max(0, size - 8)
+        self._write(relative_path, b'\x89PNG\r\n\x1a\n' + self.rng.getrandbits(8 * noise_size).to_bytes(noise_size, 'little'))
+        self.binary_files += 1
+
+    def _write(self, relative_path: str, content: bytes):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        self.files += 1
+        self.bytes += len(content)
+
+    def stats(self) -> TreeStats:
+        return TreeStats(self.files, self.text_files, self.binary_files, self.bytes)
+
+def build_wide(writer: TreeWriter, scale: float):
+    """Many sibling folders, each with a handful of small files."""
+    for folder in range(max(1, int(100 * scale))):
+        for index in range(5):
+            writer.text(os.path.join(f"package_{folder:03d}", f"module_{index}.py"), 2000)
+
+def build_deep(writer: TreeWriter, scale: float):
+    """A single chain of nested folders with a file at every level."""
+    parts = []
+    for level in range(max(1, int(60 * scale))):
+        parts.append(f"level_{level:02d}")
+        writer.text(os.path.join(*parts, "file.txt"), 1000)
+
+def build_tiny(writer: TreeWriter, scale: float):
+    """Lots of very small files in a few folders."""
+    for index in range(max(1, int(2000 * scale))):
+        writer.text(os.path.join(f"bucket_{index % 20:02d}", f"tiny_{index:05d}.txt"), 40)
+
+def build_huge(writer: TreeWriter, scale: float):
+    """A few large files."""
+    for index in range(3):
+        writer.text(f"huge_{index}.log", max(1024, int(4 * 1024 * 1024 * scale)))
+
+def build_mixed(writer: TreeWriter, scale: float):
+    """Text files of varied sizes interleaved with binary files."""
+    for index in range(max(1, int(300 * scale))):
+        relative_path = os.path.join(f"src_{index % 10}", f"file_{index:04d}")
+        if index % 4 == 3:
+            writer.binary(relative_path + ".png", writer.rng.randint(1024, 64 * 1024))
+        else:
+            writer.text(relative_path + ".py", writer.rng.randint(100, 20000))
+
+PROFILES: Dict[str, Callable[[TreeWriter, float], None]] = {
+    'wide': build_wide,
+    'deep': build_deep,
+    'tiny': build_tiny,
+    'huge': build_huge,
+    'mixed': build_mixed,
+}
+
+def build_tree(root: str, profile: str, scale: float = 1.0, seed: int = 0) -> TreeStats:
+    """Writes the synthetic tree of a profile into ``root`` and returns what was written."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown tree profile '{profile}'. Choose from: {', '.join(PROFILES)}")
+    writer = TreeWriter(root, seed)
+    PROFILES[profile](writer, scale)
+    return writer.stats()
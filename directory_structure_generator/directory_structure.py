@@ -7,56 +7,437 @@ output_file_path: The path to write the generated directory structure text file
 
 import json
 import os
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
 
-def print_directory_structure(start_path: str, ignore_file_path) -> list:
+from utils.cancellation import CancellationToken, OperationCancelled
+from utils.config_cache import load_ignore_folders
+from utils.directory_scanner import DirectoryManifest, DirectoryScanner, ScanEntry
+from utils.path_filter import PathFilter
+from utils.profiler import NULL_PROFILER, Profiler
+from utils.sources import Source
+
+# The structure is written as nested JSON (as json.dumps(structure, indent=4) would),
+# as one JSON object per line, or as an indented tree like the `tree` command prints
+STRUCTURE_FORMATS = ('json', 'ndjson', 'tree')
+
+def iter_structure_entries(start_path: str, ignore_file_path, manifest: Optional[DirectoryManifest] = None,
+                           path_filter: Optional[PathFilter] = None,
+                           cancel_token: Optional[CancellationToken] = None,
+                           profiler: Profiler = NULL_PROFILER,
+                           source: Optional[Source] = None) -> Iterator[ScanEntry]:
+    """Yields the entries that make up the directory structure, in depth-first order.
+
+    Takes the same arguments as :func:`print_directory_structure`, and the ``source``
+    to scan when no manifest is given; the entries of that scan are yielded as they
+    are found. The ignore list is loaded once, and ignored folders are skipped with
+    everything below them, so the depth of every entry yielded is one more than the
+    depth of its parent.
+    """
+    ignore_folders = frozenset(load_ignore_folders(ignore_file_path))
+    if manifest is None:
+        manifest = DirectoryScanner(start_path, ignore_folders, path_filter, cancel_token, profiler, source).iter_entries()
+    return (entry for entry, kept in _iter_decisions(manifest, ignore_folders, cancel_token) if kept)
+
+def iter_structure_tree(start_path: str, ignore_file_path, manifest: Optional[DirectoryManifest] = None,
+                        path_filter: Optional[PathFilter] = None,
+                        cancel_token: Optional[CancellationToken] = None,
+                        profiler: Profiler = NULL_PROFILER,
+                        source: Optional[Source] = None) -> Iterator[Tuple[ScanEntry, bool]]:
+    """Yields the entries of :func:`iter_structure_entries`, each with whether it is the last of its siblings.
+
+    That is what the tree format needs to know before it writes the subtree of an entry.
+    Without a manifest, the scan reads one entry ahead in each directory it lists; the
+    entries of a manifest are already in memory, and are looked at from the end.
+    """
+    ignore_folders = frozenset(load_ignore_folders(ignore_file_path))
+    if manifest is not None:
+        entries = [entry for entry, kept in _iter_decisions(manifest, ignore_folders, cancel_token) if kept]
+        return zip(entries, _last_sibling_flags(entries))
+    scanner = DirectoryScanner(start_path, ignore_folders, path_filter, cancel_token, profiler, source)
+    return _checking(scanner.iter_entries_with_last(ignore_folders), cancel_token)
+
+def _checking(items: Iterable, cancel_token: Optional[CancellationToken]) -> Iterator:
+    for item in items:
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        yield item
+
+def iter_structure_decisions(start_path: str, ignore_file_path, manifest: Optional[DirectoryManifest] = None,
+                             path_filter: Optional[PathFilter] = None,
+                             cancel_token: Optional[CancellationToken] = None,
+                             profiler: Profiler = NULL_PROFILER,
+                             source: Optional[Source] = None) -> Iterator[Tuple[ScanEntry, bool]]:
+    """Yields every scanned entry with whether it is part of the directory structure.
+
+    Like :func:`iter_structure_entries`, but entries in and below ignored folders are
+    yielded too, as excluded.
+    """
+    ignore_folders = frozenset(load_ignore_folders(ignore_file_path))
+    if manifest is None:
+        manifest = DirectoryScanner(start_path, ignore_folders, path_filter, cancel_token, profiler, source).iter_entries()
+    return _iter_decisions(manifest, ignore_folders, cancel_token)
+
+def _iter_decisions(entries: Iterable[ScanEntry], ignore_folders,
+                    cancel_token: Optional[CancellationToken]) -> Iterator[Tuple[ScanEntry, bool]]:
+    skip_depth = None
+    for entry in entries:
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        if skip_depth is not None:
+            if entry.depth > skip_depth:
+                yield entry, False
+                continue
+            skip_depth = None
+
+        if entry.name in ignore_folders:
+            skip_depth = entry.depth
+            yield entry, False  # Skip this item if it's in the ignore list
+            continue
+        yield entry, True
+
+def print_directory_structure(start_path: str, ignore_file_path, manifest: Optional[DirectoryManifest] = None,
+                              path_filter: Optional[PathFilter] = None,
+                              cancel_token: Optional[CancellationToken] = None,
+                              profiler: Profiler = NULL_PROFILER) -> list:
     """Generates a nested list representing the directory structure.
        Ignores folders specified in a JSON file.
 
     Args:
         start_path (str): The starting directory path.
         ignore_file_path (str, optional): The path to the JSON file containing the ignore list. Defaults to 'ignore_folders.json'.
+        manifest (DirectoryManifest, optional): A scan of ``start_path`` to reuse instead of walking the directory again.
+        path_filter (PathFilter, optional): The filter to scan with when no manifest is given, so the structure
+            matches the PDF. Defaults to pruning only the ignored folders.
+        cancel_token (CancellationToken, optional): Checked for every entry; raises OperationCancelled
+            once the token is cancelled or out of time.
+        profiler (Profiler, optional): Collects the time spent scanning and building the structure.
 
     Returns:
-        list: A nested list representing the directory structure.
+        list: A nested list representing the directory structure. To write the structure to a file
+        without holding it in memory, use :func:`write_directory_structure` instead.
     """
-    try:
-        with open(ignore_file_path, 'r') as ignore_file:
-            ignore_folders = json.load(ignore_file)
-    except FileNotFoundError:
-        print(f"Warning: Ignore file '{ignore_file_path}' not found. Proceeding without ignoring folders.")
-        ignore_folders = []
-
+    entries = iter_structure_entries(start_path, ignore_file_path, manifest, path_filter, cancel_token, profiler)
     structure = []
-    for item in os.listdir(start_path):
-        item_path = os.path.join(start_path, item)
-        if item in ignore_folders:
-            continue  # Skip this item if it's in the ignore list
-
-        if os.path.isdir(item_path):
-            structure.append({
-                "name": item,
-                "type": "dir",
-                "children": print_directory_structure(item_path, ignore_file_path)
-            })
-        else:
-            structure.append({"name": item, "type": "file"})
+    parents = [structure]  # parents[depth] is the children list that entries at that depth go into
+    with profiler.stage('structure_build'):
+        for entry in entries:
+            del parents[entry.depth + 1:]
+            if entry.is_dir:
+                children = []
+                parents[entry.depth].append({"name": entry.name, "type": "dir", "children": children})
+                parents.append(children)
+            else:
+                parents[entry.depth].append({"name": entry.name, "type": "file"})
     return structure
 
-def create_pdf_from_directory_structure(directory, output_file_path, ignore_file_path):
+def write_directory_structure(output: TextIO, entries: Iterable[ScanEntry], output_format: str = 'json',
+                              root_name: str = '.'):
+    """Writes structure entries (from :func:`iter_structure_entries`) to a text file as they come.
+
+    'json' writes exactly what ``json.dumps(print_directory_structure(...), indent=4)`` would,
+    without building the nested list. 'ndjson' writes one object per entry with its relative
+    path and type. 'tree' writes the tree under ``root_name`` with box-drawing lines; it
+    holds the entries until they are all known, which :func:`write_directory_tree` does not.
+    """
+    if output_format == 'json':
+        _write_json(output, entries)
+    elif output_format == 'ndjson':
+        for entry in entries:
+            output.write(_ndjson_text(entry))
+    elif output_format == 'tree':
+        entries = list(entries)
+        write_directory_tree(output, zip(entries, _last_sibling_flags(entries)), root_name)
+    else:
+        raise ValueError(f"Unknown structure format '{output_format}'. Choose from: {', '.join(STRUCTURE_FORMATS)}")
+
+def _with_following(entries: Iterable[ScanEntry]) -> Iterator[tuple]:
+    """Yields each entry with the entry after it (None after the last one)."""
+    previous = None
+    for entry in entries:
+        if previous is not None:
+            yield previous, entry
+        previous = entry
+    if previous is not None:
+        yield previous, None
+
+def _write_json(output: TextIO, entries: Iterable[ScanEntry]):
+    output.write('[')
+    previous = None
+    for entry, following in _with_following(entries):
+        output.write(_json_text(previous, entry, following))
+        previous = entry
+    output.write(_json_end(previous))
+
+# An entry at depth d is a dict indented by 1 + 2d levels; its keys and the closing
+# bracket of its children are one level deeper
+def _json_newline(level: int) -> str:
+    return '\n' + '    ' * level
+
+def _json_closing(depth: int) -> str:
+    return _json_newline(2 + 2 * depth) + ']' + _json_newline(1 + 2 * depth) + '}'
+
+def _json_text(previous: Optional[ScanEntry], entry: ScanEntry, following: Optional[ScanEntry]) -> str:
+    """Returns what the JSON structure has for an entry, from the end of the entry before it.
+
+    That closes the directories that end before the entry; whether the entry opens a
+    list of children depends on the entry after it.
+    """
+    depth = entry.depth
+    text = ''
+    if previous is not None:
+        # The directories above the entry before are open, and so is that entry if this one is its first child
+        opened = previous.is_dir and depth > previous.depth
+        for closed in range(previous.depth - (not opened), depth - 1, -1):
+            text += _json_closing(closed)
+        if not opened:
+            text += ','
+    text += (_json_newline(1 + 2 * depth) + '{' +
+             _json_newline(2 + 2 * depth) + '"name": ' + json.dumps(entry.name) + ',' +
+             _json_newline(2 + 2 * depth) + '"type": ' + ('"dir"' if entry.is_dir else '"file"'))
+    if not entry.is_dir:
+        return text + _json_newline(1 + 2 * depth) + '}'
+    if following is not None and following.depth > depth:
+        return text + ',' + _json_newline(2 + 2 * depth) + '"children": ['
+    return text + ',' + _json_newline(2 + 2 * depth) + '"children": []' + _json_newline(1 + 2 * depth) + '}'
+
+def _json_end(last: Optional[ScanEntry]) -> str:
+    """Returns what closes the JSON structure after its last entry."""
+    if last is None:
+        return ']'
+    return ''.join(_json_closing(closed) for closed in range(last.depth - 1, -1, -1)) + '\n]'
+
+def _ndjson_text(entry: ScanEntry) -> str:
+    return json.dumps({"path": entry.relative_path, "type": "dir" if entry.is_dir else "file"}) + '\n'
+
+def _last_sibling_flags(entries: List[ScanEntry]) -> bytearray:
+    # Whether an entry is the last of its siblings is only known once its parent's subtree
+    # ends, so that is worked out in one backward pass, keeping a flag per entry
+    is_last = bytearray(len(entries))
+    sibling_follows = []  # sibling_follows[depth]: a later entry at that depth shares the parent
+    for index in range(len(entries) - 1, -1, -1):
+        depth = entries[index].depth
+        del sibling_follows[depth + 1:]
+        sibling_follows.extend([False] * (depth + 1 - len(sibling_follows)))
+        is_last[index] = not sibling_follows[depth]
+        sibling_follows[depth] = True
+    return is_last
+
+def write_directory_tree(output: TextIO, entries: Iterable[Tuple[ScanEntry, bool]], root_name: str = '.'):
+    """Writes the tree of structure entries (from :func:`iter_structure_tree`) to a text file as they come.
+
+    Every entry comes with whether it is the last of its siblings, so that it and its
+    subtree can be drawn right away; only the prefix of each open directory is kept.
+    """
+    output.write(root_name + '/\n')
+    prefixes = ['']  # prefixes[depth] is drawn in front of the entries at that depth
+    for entry, last in entries:
+        del prefixes[entry.depth + 1:]
+        output.write(_tree_line(prefixes[entry.depth], entry, last))
+        if entry.is_dir:
+            prefixes.append(_tree_child_prefix(prefixes[entry.depth], last))
+
+def _tree_line(prefix: str, entry: ScanEntry, last: bool) -> str:
+    return prefix + ('└── ' if last else '├── ') + entry.name + ('/' if entry.is_dir else '') + '\n'
+
+def _tree_child_prefix(prefix: str, last: bool) -> str:
+    return prefix + ('    ' if last else '│   ')
+
+def create_pdf_from_directory_structure(directory, output_file_path, ignore_file_path, manifest=None, path_filter=None,
+                                        cancel_token=None, profiler=NULL_PROFILER, output_format='json', source=None):
     """
     Generate a text file with the directory structure.
-    """    
+
+    The structure is streamed to the file as the entries are walked, in ``output_format``
+    (see :data:`STRUCTURE_FORMATS`). The partial file is removed if the walk is cancelled.
+    The tree is read from ``source``, if given, and named after it.
+    """
     # Write the directory structure to the text file
     try:
-        # Generate the directory structure as a string
-        directory_structure = print_directory_structure(directory, ignore_file_path)
+        root_name = source.name if source else os.path.basename(directory)
+        if output_format == 'tree':
+            entries = iter_structure_tree(directory, ignore_file_path, manifest, path_filter, cancel_token, profiler,
+                                          source)
+        else:
+            entries = iter_structure_entries(directory, ignore_file_path, manifest, path_filter, cancel_token,
+                                             profiler, source)
 
-        # Convert the list to JSON string before writing
-        directory_structure = json.dumps(directory_structure, indent=4)
-        
         print(f"Writing directory structure to file: {output_file_path}")
-        with open(output_file_path, 'w', encoding='utf-8') as txt_file:
-            txt_file.write(directory_structure)
+        with profiler.stage('structure_write'):
+            try:
+                with open(output_file_path, 'w', encoding='utf-8') as txt_file:
+                    if output_format == 'tree':
+                        write_directory_tree(txt_file, entries, root_name)
+                    else:
+                        write_directory_structure(txt_file, entries, output_format, root_name)
+            except OperationCancelled:
+                os.remove(output_file_path)
+                raise
         print(f"Directory structure generation successful!")
     except IOError as e:
-        print(f"Error writing to file: {e}")
\ No newline at end of file
+        print(f"Error writing to file: {e}")
+
+def iter_spliced_decisions(entries: List[ScanEntry], ignore_folders) -> Iterator[Tuple[ScanEntry, bool]]:
+    """Yields the entries of a splice made to a manifest with whether each is part of the directory structure.
+
+    The entries are a subtree in depth-first order, as :meth:`DirectoryScanner.update_manifest`
+    splices them in; they are all excluded when a folder above them is ignored.
+    """
+    if entries and not ignore_folders.isdisjoint(os.path.dirname(entries[0].relative_path).split(os.sep)):
+        return ((entry, False) for entry in entries)
+    return _iter_decisions(entries, ignore_folders, None)
+
+class LiveStructure:
+    """The structure file of a watched directory, kept in step with the manifest it was written from.
+
+    :meth:`rebuild` writes the file from the entries of the manifest. :meth:`update` takes
+    the splices made to the manifest since (see :meth:`DirectoryScanner.update_manifest`),
+    renders again the entries whose text they change, and rewrites the file from the
+    first of those on. The file is the same as :func:`create_pdf_from_directory_structure`
+    writes from the manifest.
+    """
+
+    def __init__(self, output_file_path: str, output_format: str = 'json', ignore_folders=frozenset(),
+                 root_name: str = '.'):
+        if output_format not in STRUCTURE_FORMATS:
+            raise ValueError(f"Unknown structure format '{output_format}'. Choose from: {', '.join(STRUCTURE_FORMATS)}")
+        self.output_file_path = output_file_path
+        self.output_format = output_format
+        self.ignore_folders = frozenset(ignore_folders)
+        self.header = _encode({'json': '[', 'ndjson': '', 'tree': root_name + '/\n'}[output_format])
+        self.entries: List[ScanEntry] = []  # The entries of the manifest, spliced along with it
+        # What each entry writes, encoded: b'' for an entry that is not part of the structure, None until rendered
+        self.chunks: List[Optional[bytes]] = []
+
+    def rebuild(self, entries: Iterable[ScanEntry], cancel_token: Optional[CancellationToken] = None):
+        """Writes the whole file from the entries of a manifest."""
+        self.entries = list(entries)
+        self.chunks = [None if kept else b'' for _, kept in _iter_decisions(self.entries, self.ignore_folders, cancel_token)]
+        if self.output_format == 'tree':
+            self._render_tree(0, len(self.entries), '')
+        else:
+            self._render(0, len(self.entries))
+        self._write_from(0)
+
+    def update(self, splices: Iterable[Tuple[int, List[ScanEntry], List[ScanEntry]]],
+               cancel_token: Optional[CancellationToken] = None):
+        """Applies the ``(start, removed entries, added entries)`` splices made to the manifest, in order.
+
+        Files changed in place do not change the structure. Nothing is written if no
+        entry was added or removed.
+        """
+        first = None  # Index of the first entry whose text changed
+        for start, removed, added in splices:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            if len(removed) == len(added) and all(old.relative_path == new.relative_path and old.is_dir == new.is_dir
+                                                  for old, new in zip(removed, added)):
+                self.entries[start:start + len(added)] = added
+                continue
+            end = start + len(added)
+            self.entries[start:start + len(removed)] = added
+            self.chunks[start:start + len(removed)] = [None if kept else b''
+                                                       for _, kept in iter_spliced_decisions(added, self.ignore_folders)]
+            changed = self._render_splice(start, end, (added or removed)[0].depth)
+            # Entries before a splice keep their index, so the first change is still the smallest index
+            first = changed if first is None else min(first, changed)
+        if first is not None:
+            self._write_from(first)
+
+    def _render_splice(self, start: int, end: int, depth: int) -> int:
+        """Renders the entries whose text changes with a subtree at ``depth`` spliced in from ``start`` to ``end``.
+
+        Returns the index of the first of them.
+        """
+        if self.output_format == 'ndjson':
+            self._render(start, end)
+            return start
+        if self.output_format == 'json':
+            # The entry before tells whether it opens its children, and the entry after closes what ends before it
+            before = self._kept_before(start)
+            after = self._kept_from(end)
+            start = before if before is not None else start
+            self._render(start, after + 1 if after is not None else end)
+            return start
+
+        # In the tree, the sibling before the subtree may become the last one or stop being it, which changes
+        # the prefix of its own subtree too; the prefix of the subtree's depth is taken from the lines above
+        index = start - 1
+        while index >= 0 and (self.entries[index].depth > depth or
+                              (self.entries[index].depth == depth and self.chunks[index] == b'')):
+            index -= 1
+        if index >= 0 and self.entries[index].depth == depth:
+            start = index
+            prefix = self.chunks[index].decode('utf-8')[:4 * depth]
+        elif index >= 0 and self.chunks[index] != b'':
+            parent_line = self.chunks[index].decode('utf-8')
+            prefix = _tree_child_prefix(parent_line[:4 * (depth - 1)], parent_line[4 * (depth - 1):4 * depth] == '└── ')
+        else:
+            prefix = ''  # At the top, or below an ignored folder, where nothing is drawn
+        self._render_tree(start, end, prefix)
+        return start
+
+    def _kept_before(self, index: int) -> Optional[int]:
+        index -= 1
+        while index >= 0 and self.chunks[index] == b'':
+            index -= 1
+        return index if index >= 0 else None
+
+    def _kept_from(self, index: int) -> Optional[int]:
+        while index < len(self.entries) and self.chunks[index] == b'':
+            index += 1
+        return index if index < len(self.entries) else None
+
+    def _render(self, start: int, end: int):
+        """Renders the entries of the structure from ``start`` to ``end`` as JSON or NDJSON."""
+        indexes = [index for index in range(start, end) if self.chunks[index] != b'']
+        if self.output_format == 'ndjson':
+            for index in indexes:
+                self.chunks[index] = _encode(_ndjson_text(self.entries[index]))
+            return
+        if not indexes:
+            return
+        before = self._kept_before(indexes[0])
+        after = self._kept_from(end)
+        entries = [self.entries[index] for index in indexes]
+        previous = [self.entries[before] if before is not None else None] + entries[:-1]
+        following = entries[1:] + [self.entries[after] if after is not None else None]
+        for index, entry_before, entry, entry_after in zip(indexes, previous, entries, following):
+            self.chunks[index] = _encode(_json_text(entry_before, entry, entry_after))
+
+    def _render_tree(self, start: int, end: int, prefix: str):
+        """Renders the tree lines from ``start`` to ``end``, a run of siblings and their subtrees drawn after ``prefix``."""
+        indexes = [index for index in range(start, end) if self.chunks[index] != b'']
+        if not indexes:
+            return
+        entries = [self.entries[index] for index in indexes]
+        depth = entries[0].depth
+        after = self._kept_from(end)
+        # A sibling after the run keeps its last entry from being the last one
+        following = [self.entries[after]] if after is not None and self.entries[after].depth == depth else []
+        prefixes = {depth: prefix}
+        for index, entry, last in zip(indexes, entries, _last_sibling_flags(entries + following)):
+            self.chunks[index] = _encode(_tree_line(prefixes[entry.depth], entry, last))
+            if entry.is_dir:
+                prefixes[entry.depth + 1] = _tree_child_prefix(prefixes[entry.depth], last)
+
+    def _end(self) -> bytes:
+        if self.output_format != 'json':
+            return b''
+        last = self._kept_before(len(self.entries))
+        return _encode(_json_end(self.entries[last] if last is not None else None))
+
+    def _write_from(self, first: int):
+        """Writes the entries from ``first`` on over the end of the file, or the whole file."""
+        tail = b''.join(self.chunks[first:]) + self._end()
+        if first > 0 and os.path.isfile(self.output_file_path):
+            with open(self.output_file_path, 'r+b') as output_file:
+                output_file.seek(len(self.header) + sum(map(len, self.chunks[:first])))
+                output_file.write(tail)
+                output_file.truncate()
+        else:
+            with open(self.output_file_path, 'wb') as output_file:
+                output_file.write(self.header + b''.join(self.chunks[:first]) + tail)
+
+def _encode(text: str) -> bytes:
+    # As a file opened in text mode would write it
+    return text.replace('\n', os.linesep).encode('utf-8')
@@ -10,19 +10,101 @@ Args:
 """
 # directory_structure_generator.py
 import os
-from .directory_structure import create_pdf_from_directory_structure
+from utils.config_cache import load_ignore_folders
+from utils.logging_utils import logger
+from utils.profiler import NULL_PROFILER
+from utils.sources import open_source
+from .directory_structure import (LiveStructure, create_pdf_from_directory_structure, iter_spliced_decisions,
+                                  iter_structure_decisions)
+from .manifest_store import update_manifest, write_manifest
+
+# Output file name suffix for each structure format
+OUTPUT_SUFFIXES = {'json': 'directory content.txt', 'ndjson': 'directory content.ndjson', 'tree': 'directory tree.txt'}
 
 class DirectoryStructureGenerator:
-    def __init__(self, directory, output_path, ignore_file_path: str = 'ignore_folders.json'):
+    def __init__(self, directory, output_path, ignore_file_path: str = 'ignore_folders.json', path_filter=None,
+                 profiler=NULL_PROFILER, output_format: str = 'json', source=None):
         self.directory = directory
+        # The directory, archive or git revision the tree is read from; the PDF generator passes in its own
+        self.source = source if source is not None else open_source(directory)
         self.output_path = output_path
         self.ignore_file_path = ignore_file_path
+        self.path_filter = path_filter
+        self.profiler = profiler
+        if output_format not in OUTPUT_SUFFIXES:
+            raise ValueError(f"Unknown structure format '{output_format}'. Choose from: {', '.join(OUTPUT_SUFFIXES)}")
+        self.output_format = output_format
 
-    def generate_directory_structure(self):
-        directory_name = os.path.basename(self.directory)
-        output_file_name = f"{directory_name} directory content.txt"
+    def structure_path(self) -> str:
+        directory_name = self.source.name
+        output_file_name = f"{directory_name} {OUTPUT_SUFFIXES[self.output_format]}"
         
         # Combine the output directory and file name to get the full output path
-        full_output_path = os.path.join(self.output_path, output_file_name)
+        return os.path.join(self.output_path, output_file_name)
+
+    def generate_directory_structure(self, manifest=None, cancel_token=None):
+        create_pdf_from_directory_structure(self.directory, self.structure_path(), self.ignore_file_path, manifest,
+                                            self.path_filter, cancel_token, self.profiler, self.output_format,
+                                            self.source)
+
+    def start_live_structure(self, manifest, cancel_token=None) -> LiveStructure:
+        """Writes the structure file from a complete manifest, like :meth:`generate_directory_structure`.
+
+        Returns it as a :class:`LiveStructure`, which :meth:`LiveStructure.update` keeps in
+        step with the splices made to the manifest afterwards.
+        """
+        live_structure = LiveStructure(self.structure_path(), self.output_format,
+                                       load_ignore_folders(self.ignore_file_path), self.source.name)
+        with self.profiler.stage('structure_write'):
+            live_structure.rebuild(manifest, cancel_token)
+        logger.verbose(f"Directory structure saved in {live_structure.output_file_path}")
+        return live_structure
+
+    def generate_manifest(self, manifest=None, cancel_token=None, included_files=None, hash_files=False) -> str:
+        """Writes "<name> manifest.sqlite", recording the size, mtime and inclusion of every scanned entry.
+
+        ``included_files`` are the files that go into the PDF; without them, every file
+        in the structure counts as included. With ``hash_files``, included files are
+        hashed, reusing the hashes of unchanged files from the previous manifest, which
+        is kept as "<name> manifest.previous.sqlite" to diff against. Returns the path
+        of the manifest.
+        """
+        directory_name = self.source.name
+        manifest_path = os.path.join(self.output_path, f"{directory_name} manifest.sqlite")
+        previous_path = os.path.join(self.output_path, f"{directory_name} manifest.previous.sqlite")
+        included_paths = {entry.relative_path for entry in included_files} if included_files is not None else None
+
+        decisions = iter_structure_decisions(self.directory, self.ignore_file_path, manifest, self.path_filter,
+                                             cancel_token, self.profiler, self.source)
+        if included_paths is not None:
+            decisions = ((entry, kept and (entry.is_dir or entry.relative_path in included_paths))
+                         for entry, kept in decisions)
+        if os.path.exists(manifest_path):
+            os.replace(manifest_path, previous_path)
+        with self.profiler.stage('manifest_write'):
+            write_manifest(manifest_path, self.directory, decisions, hash_files,
+                           previous_path if os.path.exists(previous_path) else None, cancel_token, self.source)
+        logger.verbose(f"Manifest saved in {manifest_path}")
+        return manifest_path
+
+    def update_manifest(self, splices, included_files=None, hash_files=False, cancel_token=None) -> str:
+        """Brings the manifest written by :meth:`generate_manifest` in step with the splices made to the scan since.
 
-        create_pdf_from_directory_structure(self.directory, full_output_path, self.ignore_file_path)
+        ``splices`` are those of :meth:`DirectoryScanner.update_manifest`, and ``included_files``
+        the added files that go into the PDF (all of them, when not given). Only the rows of
+        the entries removed and added change, and the previous manifest is kept as it is.
+        Returns the path of the manifest.
+        """
+        manifest_path = os.path.join(self.output_path, f"{self.source.name} manifest.sqlite")
+        ignore_folders = frozenset(load_ignore_folders(self.ignore_file_path))
+        included_paths = {entry.relative_path for entry in included_files} if included_files is not None else None
+        changes = []
+        for _, removed, added in splices:
+            decisions = iter_spliced_decisions(added, ignore_folders)
+            if included_paths is not None:
+                decisions = [(entry, kept and (entry.is_dir or entry.relative_path in included_paths))
+                             for entry, kept in decisions]
+            changes.append((removed, decisions))
+        with self.profiler.stage('manifest_write'):
+            update_manifest(manifest_path, changes, hash_files, cancel_token, self.source)
+        return manifest_path
@@ -0,0 +1,274 @@
+"""
+Writes and compares SQLite manifests of a directory tree.
+
+A manifest has one row per scanned entry with its size, mtime, whether it is
+included in the output, and optionally the SHA-256 of its content. Every row also
+has a digest: for a file, of its metadata and hash; for a directory, of its own
+row and the digests of its children, like a Merkle tree. Two manifests are
+compared by walking down only the directories whose digests differ, so the cost
+grows with the number of changes rather than the size of the tree.
+
+Usage:
+    python -m directory_structure_generator.manifest_store old.sqlite new.sqlite
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from typing import Iterable, Iterator, Optional, Tuple
+
+from pdf_generator.render_cache import hash_file
+from utils.cancellation import CancellationToken
+from utils.directory_scanner import ScanEntry
+from utils.logging_utils import logger
+from utils.path_filter import to_posix_path
+from utils.sources import Source
+
+# Bump this when the schema or the digests change; older manifests are not read
+MANIFEST_VERSION = 1
+
+# Rows are inserted in batches of this many
+INSERT_BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE entries (
+    path TEXT PRIMARY KEY,     -- Relative path with forward slashes
+    parent TEXT NOT NULL,      -- Path of the parent directory; '' at the top
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,        -- 'dir' or 'file'
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    included INTEGER NOT NULL, -- 1 if the entry is part of the output
+    hash TEXT,                 -- SHA-256 of the content, for files when hashing
+    digest TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX entries_by_parent ON entries (parent);
+"""
+
+def _file_digest(name: str, size: int, mtime_ns: int, included: bool, content_hash: Optional[str]) -> str:
+    key = f"file\0{name}\0{size}\0{mtime_ns}\0{int(included)}\0{content_hash or ''}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def _dir_digest(name: str, included: bool, child_digests: list) -> str:
+    digest = hashlib.sha1(f"dir\0{name}\0{int(included)}".encode('utf-8'))
+    for child_name, child_digest in sorted(child_digests):
+        digest.update(f"\0{child_name}\0{child_digest}".encode('utf-8'))
+    return digest.hexdigest()
+
+def _load_hashes(manifest_path: str) -> dict:
+    """Returns the content hashes of a previous manifest by path, with the size and mtime they were taken at."""
+    try:
+        with closing(_open_read_only(manifest_path)) as connection:
+            if _read_info(connection).get('version') != str(MANIFEST_VERSION):
+                return {}
+            rows = connection.execute("SELECT path, size, mtime_ns, hash FROM entries WHERE hash IS NOT NULL")
+            return {path: (size, mtime_ns, content_hash) for path, size, mtime_ns, content_hash in rows}
+    except (OSError, sqlite3.Error):
+        return {}
+
+def _open_read_only(manifest_path: str) -> sqlite3.Connection:
+    if not os.path.isfile(manifest_path):
+        raise FileNotFoundError(f"Manifest '{manifest_path}' not found.")
+    return sqlite3.connect(f"file:{manifest_path}?mode=ro", uri=True)
+
+def _read_info(connection: sqlite3.Connection) -> dict:
+    return dict(connection.execute("SELECT key, value FROM info"))
+
+def write_manifest(manifest_path: str, directory: str, entries: Iterable[Tuple[ScanEntry, bool]],
+                   hash_files: bool = False, previous_path: Optional[str] = None,
+                   cancel_token: Optional[CancellationToken] = None, source: Optional[Source] = None) -> str:
+    """Writes a manifest of ``(entry, included)`` pairs in depth-first order and returns the root digest.
+
+    With ``hash_files``, the content of every included file is hashed (read from
+    ``source``, if given), unless the manifest at ``previous_path`` has its hash for
+    the same size and mtime. The file only appears at ``manifest_path`` once it is complete.
+    """
+    previous_hashes = _load_hashes(previous_path) if hash_files and previous_path else {}
+    temp_path = manifest_path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.executescript(SCHEMA)
+        rows = []
+        open_dirs = []  # (row, child digests) of the directories whose subtree is being walked
+        top_digests = []
+
+        def close_dir():
+            row, child_digests = open_dirs.pop()
+            row[-1] = _dir_digest(row[2], row[6], child_digests)
+            (open_dirs[-1][1] if open_dirs else top_digests).append((row[2], row[-1]))
+            rows.append(row)
+
+        for entry, included in entries:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            while len(open_dirs) > entry.depth:
+                close_dir()
+            path = to_posix_path(entry.relative_path)
+            parent = path.rpartition('/')[0]
+            if entry.is_dir:
+                open_dirs.append(([path, parent, entry.name, 'dir', entry.size, entry.mtime_ns, included, None, None], []))
+                continue
+
+            content_hash = None
+            if hash_files and included:
+                previous = previous_hashes.get(path)
+                if previous and previous[:2] == (entry.size, entry.mtime_ns):
+                    content_hash = previous[2]
+                else:
+                    try:
+                        content_hash = hash_file(entry.relative_path, source=source) if source else hash_file(entry.path)
+                    except OSError as e:
+                        logger.warning(f"Could not hash {entry.path}: {e}")
+            digest = _file_digest(entry.name, entry.size, entry.mtime_ns, included, content_hash)
+            (open_dirs[-1][1] if open_dirs else top_digests).append((entry.name, digest))
+            rows.append([path, parent, entry.name, 'file', entry.size, entry.mtime_ns, included, content_hash, digest])
+            if len(rows) >= INSERT_BATCH_SIZE:
+                connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                rows.clear()
+        while open_dirs:
+            close_dir()
+        connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+        root_digest = _dir_digest('', True, top_digests)
+        connection.executemany("INSERT INTO info VALUES (?, ?)", [
+            ('version', str(MANIFEST_VERSION)), ('directory', os.path.abspath(directory)),
+            ('hashed', str(int(hash_files))), ('root_digest', root_digest),
+        ])
+        connection.commit()
+    except BaseException:
+        connection.close()
+        os.remove(temp_path)
+        raise
+    connection.close()
+    os.replace(temp_path, manifest_path)
+    return root_digest
+
+def update_manifest(manifest_path: str, changes: Iterable[Tuple[Iterable[ScanEntry], Iterable[Tuple[ScanEntry, bool]]]],
+                    hash_files: bool = False, cancel_token: Optional[CancellationToken] = None,
+                    source: Optional[Source] = None) -> str:
+    """Updates the rows of a manifest written by :func:`write_manifest` in place and returns the new root digest.
+
+    ``changes`` are ``(removed entries, (entry, included) pairs added)``, applied in order.
+    Only their rows and the digests of the directories above them are written again.
+    Files are hashed as :func:`write_manifest` does, but a removed file that comes back
+    with the same size and mtime keeps its hash. Nothing is changed if it is cancelled.
+    """
+    with closing(sqlite3.connect(manifest_path)) as connection:
+        if _read_info(connection).get('version') != str(MANIFEST_VERSION):
+            raise ValueError(f"{manifest_path} is not a version {MANIFEST_VERSION} manifest.")
+        previous_hashes = {}
+        stale_dirs = {''}  # Directories whose digest has to be worked out again, with the root
+        for removed, added in changes:
+            for entry in removed:
+                path = to_posix_path(entry.relative_path)
+                row = connection.execute("SELECT size, mtime_ns, hash FROM entries WHERE path = ?", (path,)).fetchone()
+                if row and row[2]:
+                    previous_hashes[path] = row
+                connection.execute("DELETE FROM entries WHERE path = ?", (path,))
+                stale_dirs.add(path.rpartition('/')[0])
+            rows = []
+            for entry, included in added:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                path = to_posix_path(entry.relative_path)
+                parent = path.rpartition('/')[0]
+                stale_dirs.add(parent)
+                if entry.is_dir:
+                    stale_dirs.add(path)
+                    rows.append([path, parent, entry.name, 'dir', entry.size, entry.mtime_ns, included, None, ''])
+                    continue
+                content_hash = None
+                if hash_files and included:
+                    previous = previous_hashes.get(path)
+                    if previous and previous[:2] == (entry.size, entry.mtime_ns):
+                        content_hash = previous[2]
+                    else:
+                        try:
+                            content_hash = hash_file(entry.relative_path, source=source) if source else hash_file(entry.path)
+                        except OSError as e:
+                            logger.warning(f"Could not hash {entry.path}: {e}")
+                digest = _file_digest(entry.name, entry.size, entry.mtime_ns, included, content_hash)
+                rows.append([path, parent, entry.name, 'file', entry.size, entry.mtime_ns, included, content_hash, digest])
+            connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+        # Every directory above a changed row changes too; children are worked out before their parents
+        for path in list(stale_dirs):
+            while path:
+                path = path.rpartition('/')[0]
+                stale_dirs.add(path)
+        for path in sorted(stale_dirs, key=lambda path: path.count('/') if path else -1, reverse=True):
+            child_digests = list(connection.execute("SELECT name, digest FROM entries WHERE parent = ?", (path,)))
+            if not path:
+                root_digest = _dir_digest('', True, child_digests)
+                continue
+            row = connection.execute("SELECT name, included FROM entries WHERE path = ?", (path,)).fetchone()
+            if row:
+                connection.execute("UPDATE entries SET digest = ? WHERE path = ?",
+                                   (_dir_digest(row[0], row[1], child_digests), path))
+        connection.execute("UPDATE info SET value = ? WHERE key = 'root_digest'", (root_digest,))
+        connection.commit()
+    return root_digest
+
+def diff_manifests(old_path: str, new_path: str) -> Iterator[Tuple[str, str]]:
+    """Yields ``(change, path)`` for every entry that differs between two manifests.
+
+    ``change`` is 'added', 'removed' or 'changed'. Everything below an added or removed
+    directory is reported too. Directories with equal digests are not looked into.
+    """
+    with closing(_open_read_only(old_path)) as old, closing(_open_read_only(new_path)) as new:
+        for connection, path in ((old, old_path), (new, new_path)):
+            if _read_info(connection).get('version') != str(MANIFEST_VERSION):
+                raise ValueError(f"{path} is not a version {MANIFEST_VERSION} manifest.")
+        if _read_info(old)['root_digest'] == _read_info(new)['root_digest']:
+            return
+        yield from _diff_children(old, new, '')
+
+def _children(connection: sqlite3.Connection, parent: str) -> dict:
+    rows = connection.execute("SELECT name, path, type, included, digest FROM entries WHERE parent = ?", (parent,))
+    return {name: (path, entry_type, included, digest) for name, path, entry_type, included, digest in rows}
+
+def _subtree(connection: sqlite3.Connection, path: str, entry_type: str) -> Iterator[str]:
+    yield path
+    if entry_type == 'dir':
+        for child_path, child_type, _, _ in _children(connection, path).values():
+            yield from _subtree(connection, child_path, child_type)
+
+def _diff_children(old: sqlite3.Connection, new: sqlite3.Connection, parent: str) -> Iterator[Tuple[str, str]]:
+    old_children = _children(old, parent)
+    new_children = _children(new, parent)
+    for name in sorted(old_children.keys() | new_children.keys()):
+        old_child = old_children.get(name)
+        new_child = new_children.get(name)
+        if old_child and new_child and old_child[3] == new_child[3]:
+            continue  # Same digest, so the same entry and, for a directory, the same subtree
+        if old_child and new_child and old_child[1] == new_child[1]:
+            if new_child[1] == 'file' or old_child[2] != new_child[2]:
+                yield 'changed', new_child[0]
+            if new_child[1] == 'dir':
+                yield from _diff_children(old, new, new_child[0])
+            continue
+        if old_child:
+            yield from (('removed', path) for path in _subtree(old, old_child[0], old_child[1]))
+        if new_child:
+            yield from (('added', path) for path in _subtree(new, new_child[0], new_child[1]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List the entries that differ between two directory manifests.')
+    parser.add_argument('old', help='The earlier manifest')
+    parser.add_argument('new', help='The later manifest')
+    args = parser.parse_args(argv)
+    changes = 0
+    for change, path in diff_manifests(args.old, args.new):
+        print(f"{change}\t{path}")
+        changes += 1
+    sys.exit(1 if changes else 0)
+
+if __name__ == '__main__':
+    main()
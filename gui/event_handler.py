@@ -1,13 +1,23 @@
 import os
+import queue
+import threading
 from tkinter import messagebox
-from pdf_generator.pdf_generator import PDFGenerator
-from directory_structure_generator.directory_structure_generator import DirectoryStructureGenerator
+from utils.cancellation import CancellationToken, OperationCancelled
+
+# Queued progress and feedback events are applied to the widgets about 30 times per second
+FRAME_INTERVAL_MS = 33
 
 class GUIEventHandler:
     def __init__(self, app):
         self.app = app 
+        self.events = queue.Queue()
+        self.cancel_token = CancellationToken()
+        self.worker = None
 
     def handle_generate_pdf(self):
+        if self.worker and self.worker.is_alive():
+            return  # A generation is already running
+
         inputs = self.app.input_frame.get_user_inputs()
         directory = inputs['directory']
         file_types = inputs['file_types']
@@ -40,41 +50,129 @@ class GUIEventHandler:
         os.makedirs(output_subdir_path, exist_ok=True)
 
         # 3. Update GUI and Start:
+        self.cancel_token = CancellationToken()
+        self.app.output_frame.reset()
         self.app.output_frame.update_status("Processing files...")
+        self.app.set_running(True)
+
+        # 4. Generate in a worker thread; the Tk main loop only applies the queued events
+        self.worker = threading.Thread(
+            target=self.run_generation,
+            args=(directory, output_subdir_path, file_types, exclude_file_types, exclude_folders, include_hidden,
+                  self.cancel_token),
+            name='pdf-generation',
+            daemon=True,
+        )
+        self.worker.start()
+        self.app.master.after(FRAME_INTERVAL_MS, self.drain_events)
+
+    def handle_cancel(self):
+        """Asks the running generation to stop at the next file or chunk."""
+        if self.worker and self.worker.is_alive():
+            self.cancel_token.cancel("PDF generation was cancelled.")
+            self.app.output_frame.update_status("Cancelling...")
+
+    def report_progress(self, current, total):
+        """Progress callback, called from the worker thread."""
+        self.events.put(('progress', current, total))
+
+    def report_feedback(self, message):
+        """Feedback callback, called from the worker thread."""
+        self.events.put(('feedback', message))
 
+    def run_generation(self, directory, output_subdir_path, file_types, exclude_file_types, exclude_folders,
+                       include_hidden, cancel_token):
+        """Generates the PDF and the directory structure. Runs in the worker thread."""
+        # Imported here rather than at startup, so the window shows without waiting for fpdf to load
+        from pdf_generator.pdf_generator import PDFGenerator
+        from directory_structure_generator.directory_structure_generator import DirectoryStructureGenerator
         try:
-            # 4. PDF Generation:
             pdf_generator = PDFGenerator(
                 directory, output_subdir_path, exclude_folders=exclude_folders, exclude_file_types=exclude_file_types,
                 ignore_file_path='ignore_folders.json'
             )
+            # Scanned once with the generator's filter and shared by the PDF and the directory structure
+            manifest = pdf_generator.scan_directory(include_hidden=include_hidden, cancel_token=cancel_token)
             result = pdf_generator.generate_pdf(
                 include_hidden,
                 file_types,
-                progress_callback=self.app.output_frame.update_progress,
-                feedback_callback=self.app.output_frame.add_feedback,
+                progress_callback=self.report_progress,
+                feedback_callback=self.report_feedback,
+                manifest=manifest,
+                cancel_token=cancel_token,
             )
 
             if result is True:
                 print("PDF generated successfully!")
-                self.app.output_frame.update_status("Generating directory structure...")
+                self.events.put(('status', "Generating directory structure..."))
 
-                dir_structure_gen = DirectoryStructureGenerator(directory, output_subdir_path, ignore_file_path='ignore_folders.json')
-                dir_structure_gen.generate_directory_structure()
+                dir_structure_gen = DirectoryStructureGenerator(
+                    directory, output_subdir_path, ignore_file_path='ignore_folders.json',
+                    path_filter=pdf_generator.get_path_filter(include_hidden)
+                )
+                dir_structure_gen.generate_directory_structure(manifest, cancel_token)
 
                 print("Directory structure text file generated successfully!")
-                self.app.output_frame.add_feedback("Directory structure text file generated successfully!")
-                self.app.output_frame.update_status("Completed!")
-                messagebox.showinfo("Success", "PDF and directory structure generated successfully!")
+                self.events.put(('feedback', "Directory structure text file generated successfully!"))
+                self.events.put(('status', "Completed!"))
+                self.events.put(('dialog', messagebox.showinfo, "Success", "PDF and directory structure generated successfully!"))
             elif result is False:  
-                self.app.output_frame.update_status("No matching files found.")
-                messagebox.showinfo("Info", "No matching files were found to generate a PDF.")
+                self.events.put(('status', "No matching files found."))
+                self.events.put(('dialog', messagebox.showinfo, "Info", "No matching files were found to generate a PDF."))
+            elif isinstance(result, OperationCancelled):
+                self.report_cancelled(result)
             elif isinstance(result, Exception):  # Check if result is an exception
                 error_message = f"An error occurred during PDF generation: {result}"
-                self.app.output_frame.add_feedback(error_message)
+                self.events.put(('feedback', error_message))
                 raise Exception(error_message)
 
+        except OperationCancelled as e:
+            self.report_cancelled(e)
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
+            self.events.put(('dialog', messagebox.showerror, "Error", f"An error occurred: {e}"))
         finally:
-            self.app.output_frame.update_status("")  # Clear status message
\ No newline at end of file
+            self.events.put(('finished',))
+
+    def report_cancelled(self, error):
+        self.events.put(('feedback', f"PDF generation stopped: {error}"))
+        self.events.put(('dialog', messagebox.showinfo, "Cancelled", str(error)))
+
+    def drain_events(self):
+        """Applies all queued worker events to the widgets, then reschedules itself.
+
+        Progress updates are coalesced to the latest one and feedback lines are added
+        in one batch, so the widgets are redrawn at most once per frame.
+        """
+        progress = None
+        feedback = []
+        dialogs = []
+        finished = False
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            kind = event[0]
+            if kind == 'progress':
+                progress = event[1:]
+            elif kind == 'feedback':
+                feedback.append(event[1])
+            elif kind == 'status':
+                self.app.output_frame.update_status(event[1])
+            elif kind == 'dialog':
+                dialogs.append(event[1:])
+            elif kind == 'finished':
+                finished = True
+
+        if feedback:
+            self.app.output_frame.add_feedback_lines(feedback)
+        if progress:
+            self.app.output_frame.update_progress(*progress)
+        for show_dialog, title, message in dialogs:
+            show_dialog(title, message)
+
+        if finished:
+            self.app.set_running(False)
+            self.app.output_frame.update_status("")  # Clear status message
+        else:
+            self.app.master.after(FRAME_INTERVAL_MS, self.drain_events)
@@ -35,11 +35,22 @@ class PDFGeneratorApp:
         # Event Handler
         self.event_handler = GUIEventHandler(self)
 
-        # Generate PDF Button
-        generate_button = tk.Button(
-            master, text="Generate PDF", command=self.event_handler.handle_generate_pdf
+        # Generate PDF and Cancel Buttons
+        buttons_frame = tk.Frame(master)
+        buttons_frame.pack(pady=10)
+        self.generate_button = tk.Button(
+            buttons_frame, text="Generate PDF", command=self.event_handler.handle_generate_pdf
         )
-        generate_button.pack(pady=10)
+        self.generate_button.pack(side="left", padx=5)
+        self.cancel_button = tk.Button(
+            buttons_frame, text="Cancel", command=self.event_handler.handle_cancel, state="disabled"
+        )
+        self.cancel_button.pack(side="left", padx=5)
+
+    def set_running(self, running):
+        """Enables the Cancel button while a generation runs, and the Generate button otherwise."""
+        self.generate_button.config(state="disabled" if running else "normal")
+        self.cancel_button.config(state="normal" if running else "disabled")
 
     def handle_input_change(self):
         """Handles changes to input fields. Updates status based on input validity."""
@@ -1,6 +1,9 @@
 import tkinter as tk
 from tkinter import ttk
 
+# The feedback log only keeps the most recent lines, so it stays fast on large runs
+MAX_FEEDBACK_LINES = 1000
+
 class OutputFrame(tk.LabelFrame):
     def __init__(self, master):
         super().__init__(master, text="Output & Feedback")
@@ -27,22 +30,33 @@ class OutputFrame(tk.LabelFrame):
         scrollbar.grid(row=2, column=2, sticky="ns")
         self.feedback_listbox.config(yscrollcommand=scrollbar.set)
 
+    def reset(self):
+        """Clears the progress bar and the feedback log before a new run."""
+        self.progress_var.set(0)
+        self.feedback_listbox.delete(0, tk.END)
+
     def update_progress(self, current, total):
-        """Updates the progress bar."""
+        """Updates the progress bar. The widget is redrawn by the Tk main loop."""
         if total > 0:
             progress = (current / total) * 100
             self.progress_var.set(progress)  # Update the progress bar variable
-            self.progress_bar.update()
         else:
             self.progress_var.set(0)  # Reset to 0 if total is 0
-            self.progress_bar.update()
 
     def update_status(self, message):
         """Updates the status label with the currently processed file."""
         self.status_label.config(text=message)
-        self.status_label.update()
 
     def add_feedback(self, message):
         """Adds a message to the feedback listbox."""
-        self.feedback_listbox.insert(tk.END, message)
+        self.add_feedback_lines([message])
+
+    def add_feedback_lines(self, messages):
+        """Adds a batch of messages to the feedback listbox, dropping the oldest lines
+        beyond MAX_FEEDBACK_LINES."""
+        messages = messages[-MAX_FEEDBACK_LINES:]
+        self.feedback_listbox.insert(tk.END, *messages)
+        overflow = self.feedback_listbox.size() - MAX_FEEDBACK_LINES
+        if overflow > 0:
+            self.feedback_listbox.delete(0, overflow - 1)
         self.feedback_listbox.see(tk.END)  # Scroll to the bottom
\ No newline at end of file
@@ -1,69 +1,379 @@
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor
-
-from pdf_generator.pdf_generator import PDFGenerator 
-from directory_structure_generator.directory_structure_generator import DirectoryStructureGenerator
+from typing import NamedTuple, Optional
 
+# The generators (and fpdf with them) are imported where they are used, once the arguments
+# are known to be valid, so that --help and usage errors return without loading them
 from utils.argparse_utils import parse_arguments
-from utils.logging_utils import configure_logging
+from utils.cancellation import CancellationToken
+from utils.logging_utils import configure_logging, shutdown_logging
+from utils.profiler import NULL_PROFILER, Profiler
+
+# A batch scans up to this many directories ahead of those rendering, and starts the largest of them first
+BATCH_SCAN_AHEAD = 8
+
+class DirectoryRun(NamedTuple):
+    """The generators of one directory of a batch, with its scan and total file size."""
+    name: str
+    directory: str
+    output_subdir_path: str
+    pdf_generator: object
+    directory_structure_generator: object
+    manifest: object
+    cache_dir: Optional[str]
+    profiler: Profiler
+    total_bytes: int
+
+def create_generators(directory, output_subdir_path, args, profiler, executor=None):
+    """Creates the PDF and directory structure generators of one directory."""
+    from pdf_generator.pdf_generator import PDFGenerator
+    from directory_structure_generator.directory_structure_generator import DirectoryStructureGenerator
+
+    # Pass the output subdirectory path to the PDFGenerator and DirectoryStructureGenerator
+    pdf_generator = PDFGenerator(directory, output_subdir_path, args.exclude_folders, args.exclude_file_types,
+                                 config_path= 'config.json',
+                                 ignore_file_path='ignore_folders.json',
+                                 exclude_patterns=args.exclude_patterns,
+                                 use_gitignore=args.gitignore,
+                                 profiler=profiler,
+                                 stream=args.stream,
+                                 compression=args.compression,
+                                 executor=executor)
+    # Both outputs share the same compiled filter, so the structure matches the PDF
+    path_filter = pdf_generator.get_path_filter(args.include_hidden)
+    # ... and read the same source, so an archive or git revision is only indexed once
+    directory_structure_generator = DirectoryStructureGenerator(directory, output_subdir_path,
+                                                                ignore_file_path='ignore_folders.json',
+                                                                path_filter=path_filter,
+                                                                profiler=profiler,
+                                                                output_format=args.structure_format,
+                                                                source=pdf_generator.source)
+    return pdf_generator, directory_structure_generator
+
+def create_cancel_token(args):
+    # One token stops all outputs of a directory on Ctrl+C or when a budget runs out
+    return CancellationToken(timeout=args.timeout, max_bytes=args.max_bytes,
+                             file_timeout=args.file_timeout, max_file_bytes=args.max_file_bytes)
+
+def submit_outputs(executor, args, pdf_generator, directory_structure_generator, manifest, cache_dir, cancel_token):
+    """Starts generating the outputs of one directory. Returns their futures by task name."""
+    futures = {}
+    # Start the PDF generation task
+    if args.split:
+        futures['PDF generation'] = executor.submit(pdf_generator.generate_volumes, args.include_hidden, args.file_types,
+                                                    args.split, args.volume_size,
+                                                    manifest=manifest, jobs=args.jobs,
+                                                    cache_dir=cache_dir, cancel_token=cancel_token)
+    else:
+        futures['PDF generation'] = executor.submit(pdf_generator.generate_pdf, args.include_hidden, args.file_types,
+                                                    manifest=manifest, jobs=args.jobs,
+                                                    cache_dir=cache_dir, cancel_token=cancel_token)
+
+    # Start the directory structure generation task
+    futures['Directory structure generation'] = executor.submit(directory_structure_generator.generate_directory_structure,
+                                                                manifest, cancel_token)
+
+    # The manifest records which files go into the PDF, with the same filters as the PDF
+    if args.manifest or args.manifest_hashes:
+        included_files = pdf_generator.iter_files_to_process(manifest, args.include_hidden, args.file_types or None)
+        futures['Manifest generation'] = executor.submit(directory_structure_generator.generate_manifest, manifest,
+                                                         cancel_token, included_files, args.manifest_hashes)
+    return futures
+
+def report_outputs(futures, logger, label=''):
+    """Logs how the tasks of one directory ended, prefixed with ``label``.
+
+    Returns the error message of each task by name, None for the tasks that succeeded.
+    """
+    errors = {}
+    for task, future in futures.items():
+        errors[task] = None
+        try:
+            result = future.result()
+            # The PDF generation returns its exception rather than raising it
+            if isinstance(result, Exception):
+                logger.error(f'{label}{task} failed: {result}')
+                errors[task] = str(result)
+            else:
+                logger.info(f'{label}{task} successful')
+        except Exception as e:
+            logger.error(f'{label}{task} failed: {e}')
+            logger.exception(e)
+            errors[task] = str(e)
+    return errors
+
+def write_profile(profiler, output_subdir_path, directory_name, args, logger):
+    if profiler.enabled:
+        report_path = os.path.join(output_subdir_path, f"{directory_name} profile.json")
+        cprofile_path = os.path.join(output_subdir_path, f"{directory_name} profile.prof") if args.cprofile else None
+        profiler.write_report(report_path, cprofile_path)
+        logger.verbose(f"Profile report saved in {report_path}")
+
+def scan_batch_entry(entry, args, output_folder_path, pool, logger) -> Optional[DirectoryRun]:
+    """Creates the generators of one directory of a batch and scans it. Returns None if it cannot be read."""
+    from utils.sources import is_source
+
+    if not is_source(entry.directory):
+        logger.error(f"Invalid directory path: {entry.directory}")
+        return None
+    output_subdir_path = os.path.join(output_folder_path, entry.name)
+    os.makedirs(output_subdir_path, exist_ok=True)
+    profiler = Profiler(cprofile=args.cprofile) if args.profile or args.cprofile else NULL_PROFILER
+    try:
+        pdf_generator, directory_structure_generator = create_generators(entry.directory, output_subdir_path,
+                                                                         args, profiler, executor=pool)
+        manifest = pdf_generator.scan_directory(include_hidden=args.include_hidden)
+    except (OSError, ValueError) as e:  # An archive or revision that cannot be read
+        logger.error(f"{entry.name}: {e}")
+        return None
+    # Estimated from the sizes the scan found; binary files are only sniffed when the directory is rendered
+    total_bytes = sum(file_entry.size for file_entry in
+                      pdf_generator.iter_files_to_process(manifest, args.include_hidden, args.file_types or None,
+                                                          sniff=False))
+    return DirectoryRun(entry.name, entry.directory, output_subdir_path, pdf_generator, directory_structure_generator,
+                        manifest, os.path.join(output_folder_path, f"{entry.name}.cache") if args.incremental else None,
+                        profiler, total_bytes)
+
+def run_batch(args, output_folder_path, logger):
+    """Generates the outputs of every directory listed in the batch file, each in output/<name>.
+
+    The file sections of all directories are rendered in one process pool of ``args.jobs``
+    workers, started once for the whole batch. Directories are scanned while others
+    render, up to BATCH_SCAN_AHEAD ahead of them, and up to ``args.jobs`` directories
+    render at a time, the largest scanned one first. The time budget of a directory
+    starts when it starts rendering. Returns whether every directory succeeded.
+    """
+    from collections import deque
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    from pdf_generator.pdf_generator import create_shared_pool
+    from utils.batch_file import read_batch_file
+
+    try:
+        entries = read_batch_file(args.batch)
+    except (OSError, ValueError) as e:
+        logger.error(f"Invalid batch file {args.batch}: {e}")
+        return False
+
+    failed = []
+    pending = deque(entries)
+    scanned = []
+    running = []  # (run, cancel token, futures) of the directories rendering
+
+    def finish(run, futures):
+        if any(report_outputs(futures, logger, f'{run.name}: ').values()):
+            failed.append(run.name)
+        write_profile(run.profiler, run.output_subdir_path, run.pdf_generator.source.name, args, logger)
+        run.pdf_generator.source.close()  # Its archive or git process is not read again
+
+    with create_shared_pool(args.jobs) as pool, ThreadPoolExecutor() as executor:
+        try:
+            while pending or scanned or running:
+                # Once the window of scanned directories is full, the largest of them start in the free slots
+                while scanned and len(running) < args.jobs and (len(scanned) >= BATCH_SCAN_AHEAD or not pending):
+                    run = max(scanned, key=lambda run: run.total_bytes)
+                    scanned.remove(run)
+                    logger.info(f"{run.name}: rendering {run.total_bytes} bytes")
+                    cancel_token = create_cancel_token(args)  # Its time budget starts now
+                    running.append((run, cancel_token, submit_outputs(
+                        executor, args, run.pdf_generator, run.directory_structure_generator, run.manifest,
+                        run.cache_dir, cancel_token)))
+                if pending and len(scanned) < BATCH_SCAN_AHEAD:
+                    entry = pending.popleft()
+                    run = scan_batch_entry(entry, args, output_folder_path, pool, logger)
+                    if run is None:
+                        failed.append(entry.name)
+                    else:
+                        scanned.append(run)
+                    continue
+                wait([future for _, _, futures in running for future in futures.values()], return_when=FIRST_COMPLETED)
+                for item in [item for item in running if all(future.done() for future in item[2].values())]:
+                    running.remove(item)
+                    finish(item[0], item[2])
+        except KeyboardInterrupt:
+            for _, cancel_token, _ in running:
+                cancel_token.cancel('Interrupted by the user.')
+            logger.warning('Interrupted, stopping the generation...')
+            wait([future for _, _, futures in running for future in futures.values()])
+            for run, _, futures in running:
+                finish(run, futures)
+            failed.extend(run.name for run in scanned)
+            failed.extend(entry.name for entry in pending)
+            for run in scanned:
+                run.pdf_generator.source.close()
+
+    generated = len(entries) - len(failed)
+    logger.verbose(f"Batch finished: {generated} of {len(entries)} directories generated"
+                   + (f"; failed: {', '.join(failed)}" if failed else ''))
+    return not failed
+
+def run_watch(args, directory, output_subdir_path, cache_dir, profiler, logger):
+    """Generates the outputs of a directory, then updates them whenever its files change, until interrupted.
+
+    The watcher reports the paths that changed, and only those are scanned again. The
+    PDF gets the new pages of the changed files appended as an incremental update; the
+    structure file is rewritten from the first entry that was added or removed on, and
+    the SQLite manifest only has the rows of the changed entries written again.
+    """
+    import time
+    from pdf_generator.pdf_generator import create_shared_pool
+    from pdf_generator.render_cache import RenderCache
+    from utils.directory_scanner import DirectoryScanner
+    from utils.file_watcher import create_watcher
+    from utils.path_filter import GITIGNORE_FILE_NAME
+
+    pool = create_shared_pool(args.jobs) if args.jobs > 1 else None
+    pdf_generator, directory_structure_generator = create_generators(directory, output_subdir_path, args, profiler,
+                                                                     executor=pool)
+    # A watched file may be truncated while it is read, which a memory-mapped read would crash on
+    pdf_generator.mmap_threshold = None
+    path_filter = pdf_generator.get_path_filter(args.include_hidden)
+    scanner = DirectoryScanner(directory, path_filter=path_filter, profiler=profiler)
+    cache = RenderCache.open(cache_dir, pdf_generator.cache_max_bytes)
+
+    live_structure = None
+
+    def write_other_outputs(manifest, splices, cancel_token):
+        # Without the splices made to the scan, the outputs are written afresh
+        nonlocal live_structure
+        if splices is None:
+            live_structure = directory_structure_generator.start_live_structure(manifest, cancel_token)
+        else:
+            live_structure.update(splices, cancel_token)
+        if not (args.manifest or args.manifest_hashes):
+            return
+        if splices is None:
+            included_files = pdf_generator.iter_files_to_process(manifest, args.include_hidden, args.file_types or None)
+            directory_structure_generator.generate_manifest(manifest, cancel_token, included_files, args.manifest_hashes)
+        else:
+            included_files = [entry for _, _, added in splices for entry in added
+                              if pdf_generator.includes_file(manifest, entry, args.include_hidden, args.file_types or None)]
+            directory_structure_generator.update_manifest(splices, included_files, args.manifest_hashes, cancel_token)
+
+    # The watcher starts first, so that changes made during the first generation are not missed
+    watcher = create_watcher(directory, path_filter, args.watch_poll)
+    try:
+        cancel_token = create_cancel_token(args)
+        manifest = scanner.scan()
+        live_pdf = pdf_generator.start_live_pdf(cache, manifest, args.include_hidden, args.file_types, args.jobs,
+                                                cancel_token=cancel_token)
+        write_other_outputs(manifest, None, cancel_token)
+        logger.verbose(f"Watching {directory} for changes ({watcher.kind}); press Ctrl+C to stop")
+
+        resync = False  # Set after a failed update, which may have left the scan or the PDF half updated
+        while True:
+            batch = watcher.wait_for_changes(args.watch_debounce)
+            if batch is None:
+                continue
+            started = time.perf_counter()
+            cancel_token = create_cancel_token(args)
+            # A .gitignore file changes what is excluded everywhere below it
+            rescan = resync or batch.rescan or any(os.path.basename(path) == GITIGNORE_FILE_NAME for path in batch.paths)
+            try:
+                splices = []
+                changed, structure_changed = scanner.update_manifest(manifest, None if rescan else batch.paths, splices)
+                if not (changed or structure_changed or resync):
+                    continue
+                page_count = pdf_generator.update_live_pdf(live_pdf, cache, manifest, args.include_hidden, args.file_types,
+                                                           changed_paths=None if resync else changed, jobs=args.jobs,
+                                                           cancel_token=cancel_token)
+                write_other_outputs(manifest, None if resync else splices, cancel_token)
+                resync = False
+                logger.verbose(f"Updated {len(changed)} changed files in {time.perf_counter() - started:.3f}s "
+                               f"({page_count} pages)")
+            except Exception as e:
+                logger.error(f"Update failed, everything is checked again on the next change: {e}")
+                logger.exception(e)
+                resync = True
+    except KeyboardInterrupt:
+        logger.warning('Stopped watching')
+    finally:
+        watcher.close()
+        cache.save()
+        if pool:
+            pool.shutdown(cancel_futures=True)
 
 def main():
     logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
     os.makedirs(logs_dir, exist_ok=True)
     log_file = os.path.join(logs_dir, 'pdf_generator.log')
-    logger = configure_logging(log_file)
-    
     args = parse_arguments()
-    
+    logger = configure_logging(log_file, queued=not args.log_sync, sample_every=args.log_sample)
+
+    # Determine the output folder path using a relative path from main.py
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    output_folder_path = os.path.join(script_dir, 'output')
+
+    if args.batch:
+        succeeded = run_batch(args, output_folder_path, logger)
+        shutdown_logging()
+        sys.exit(0 if succeeded else 1)
+
     # 1. Get Directory Input (Command Line or Prompt)
     directory = args.directory if args.directory else input("Enter the directory path: ")
 
-    # 2. Validate Directory
-    if not directory or not os.path.isdir(directory):
+    # 2. Validate Directory (or archive, or git revision)
+    from utils.sources import is_source, open_source
+    try:
+        source = open_source(directory) if directory and is_source(directory) else None
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        source = None
+    if source is None:
         logger.error(f"Invalid directory path: {directory}")
         print("Invalid directory path: " + directory)
-        print("Please provide a valid directory path.")
+        print("Please provide a valid directory path, archive or repository@revision.")
         sys.exit(1)
- 
-    # Determine the output folder path using a relative path from main.py
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_folder_path = os.path.join(script_dir, 'output')
+    if args.watch and not os.path.isdir(directory):
+        logger.error(f"--watch needs a directory, not {directory}")
+        print("--watch needs a directory.")
+        sys.exit(1)
+
+    from concurrent.futures import ThreadPoolExecutor, wait
 
-    # Create a subdirectory named after the directory being processed
-    directory_name = os.path.basename(directory)
+    # Create a subdirectory named after the directory (or archive, or revision) being processed
+    directory_name = source.name
     output_subdir_path = os.path.join(output_folder_path, directory_name)
     os.makedirs(output_subdir_path, exist_ok=True)
 
-    # Pass the output subdirectory path to the PDFGenerator and DirectoryStructureGenerator
-    pdf_generator = PDFGenerator(directory, output_subdir_path, args.exclude_folders, args.exclude_file_types,
-                                 config_path= 'config.json',
-                                 ignore_file_path='ignore_folders.json')
-    directory_structure_generator = DirectoryStructureGenerator(directory, output_subdir_path,
-                                                                ignore_file_path='ignore_folders.json')
+    # Cached per-file renders live next to the output subdirectory
+    cache_dir = os.path.join(output_folder_path, f"{directory_name}.cache") if args.incremental or args.watch else None
+
+    # Timings of both outputs are collected in one report, written next to the PDF
+    profiler = Profiler(cprofile=args.cprofile) if args.profile or args.cprofile else NULL_PROFILER
+
+    if args.watch:
+        run_watch(args, directory, output_subdir_path, cache_dir, profiler, logger)
+        write_profile(profiler, output_subdir_path, directory_name, args, logger)
+        shutdown_logging()
+        return
+
+    pdf_generator, directory_structure_generator = create_generators(directory, output_subdir_path, args, profiler)
+    cancel_token = create_cancel_token(args)
+
+    # Walk the directory once and share the result between both outputs
+    try:
+        manifest = pdf_generator.scan_directory(include_hidden=args.include_hidden, cancel_token=cancel_token)
+    except KeyboardInterrupt:
+        logger.warning('Interrupted while scanning the directory')
+        sys.exit(130)
 
     # Use ThreadPoolExecutor to run the tasks in parallel
     with ThreadPoolExecutor() as executor:
-        # Start the PDF generation task
-        pdf_generation_future = executor.submit(pdf_generator.generate_pdf, args.include_hidden, args.file_types)
+        futures = submit_outputs(executor, args, pdf_generator, directory_structure_generator, manifest, cache_dir,
+                                 cancel_token)
+        try:
+            wait(list(futures.values()))
+        except KeyboardInterrupt:
+            # The tasks stop at their next check, so the results below come back quickly
+            cancel_token.cancel('Interrupted by the user.')
+            logger.warning('Interrupted, stopping the generation...')
 
-        # Start the directory structure generation task
-        directory_structure_future = executor.submit(directory_structure_generator.generate_directory_structure)
+        # Wait for the tasks to complete and handle exceptions
+        report_outputs(futures, logger)
 
-        # Wait for both tasks to complete and handle exceptions
-        try:
-            pdf_generation_future.result()
-            logger.info('PDF generation successful')
-        except Exception as e:
-            logger.error(f'PDF generation failed: {e}')
-            logger.exception(e)
+    write_profile(profiler, output_subdir_path, directory_name, args, logger)
 
-        try:
-            directory_structure_future.result()
-            logger.info('Directory structure generation successful')
-        except Exception as e:
-            logger.error(f'Directory structure generation failed: {e}')
-            logger.exception(e)
+    shutdown_logging()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,15 @@
+from typing import Dict, NamedTuple
+
+class CompressionPreset(NamedTuple):
+    """How hard the PDF output is compressed."""
+    level: int  # zlib level of the page contents; 0 writes them uncompressed
+    dedupe: bool  # Share identical fonts and resources between merged fragments
+
+COMPRESSION_PRESETS: Dict[str, CompressionPreset] = {
+    'none': CompressionPreset(level=0, dedupe=False),
+    'fast': CompressionPreset(level=1, dedupe=False),
+    'default': CompressionPreset(level=6, dedupe=False),
+    'small': CompressionPreset(level=9, dedupe=True),
+}
+
+DEFAULT_COMPRESSION = 'default'
@@ -0,0 +1,53 @@
+import json
+import os
+from typing import NamedTuple, Optional
+
+from utils.config_cache import load_cached
+from .compression import DEFAULT_COMPRESSION
+from .render_cache import DEFAULT_CACHE_MAX_BYTES
+
+# File contents are either laid out as code, one monospace line per source line,
+# or flowed as text with FPDF's multi_cell
+LAYOUTS = ('code', 'text')
+
+class GeneratorConfig(NamedTuple):
+    """The settings of a configuration file, with defaults filled in and font paths resolved."""
+    font_family: str
+    font_size: float
+    line_spacing: float
+    cache_max_bytes: int
+    layout: str
+    code_font_family: str
+    font_path: Optional[str]
+    code_font_path: Optional[str]
+    font_cache_dir: Optional[str]  # None for the default metrics cache
+    compression: str
+
+def _config_path(config_dir: str, path: Optional[str]) -> Optional[str]:
+    return os.path.join(config_dir, os.path.expanduser(path)) if path else None
+
+def parse_config(config_path: str) -> GeneratorConfig:
+    """Reads a configuration file. Raises ValueError for an unknown layout."""
+    with open(config_path, 'r') as config_file:
+        config = json.load(config_file)
+    layout = config.get('layout', 'code')
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}' in {config_path}. Choose from: {', '.join(LAYOUTS)}")
+    # Optional TrueType files for the two fonts; relative paths are relative to the configuration file
+    config_dir = os.path.dirname(os.path.abspath(config_path))
+    return GeneratorConfig(
+        font_family=config.get('font_family', 'Arial'),
+        font_size=config.get('font_size', 10),
+        line_spacing=config.get('line_spacing', 10),
+        cache_max_bytes=config.get('cache_max_bytes', DEFAULT_CACHE_MAX_BYTES),
+        layout=layout,
+        code_font_family=config.get('code_font_family', 'Courier'),
+        font_path=_config_path(config_dir, config.get('font_path')),
+        code_font_path=_config_path(config_dir, config.get('code_font_path')),
+        font_cache_dir=_config_path(config_dir, config.get('font_cache_dir')),
+        compression=config.get('compression', DEFAULT_COMPRESSION),
+    )
+
+def load_config(config_path: str) -> GeneratorConfig:
+    """Returns the parsed configuration file, parsing it only once per process until it changes."""
+    return load_cached(config_path, parse_config)
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+
+from fpdf.ttfonts import TTFontFile
+
+# Parsed TrueType metrics are kept here across runs unless config.json sets font_cache_dir
+DEFAULT_FONT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pdf_generator', 'fonts')
+
+# Metrics already loaded by this process, by cache key
+_loaded_metrics = {}
+
+def font_cache_path(ttf_path: str, cache_dir: str) -> str:
+    """Returns the cache file of a font. The key changes whenever the font file does."""
+    stat_result = os.stat(ttf_path)
+    key = f"{os.path.abspath(ttf_path)}:{stat_result.st_size}:{stat_result.st_mtime_ns}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+def parse_font_metrics(ttf_path: str) -> dict:
+    """Parses the metrics and glyph widths of a TrueType font, like FPDF.add_font does."""
+    ttf = TTFontFile()
+    ttf.getMetrics(ttf_path)
+    return {
+        'name': re.sub('[ ()]', '', ttf.fullName),
+        'type': 'TTF',
+        'desc': {
+            'Ascent': int(round(ttf.ascent, 0)),
+            'Descent': int(round(ttf.descent, 0)),
+            'CapHeight': int(round(ttf.capHeight, 0)),
+            'Flags': ttf.flags,
+            'FontBBox': "[%s %s %s %s]" % tuple(int(round(value, 0)) for value in ttf.bbox),
+            'ItalicAngle': int(ttf.italicAngle),
+            'StemV': int(round(ttf.stemV, 0)),
+            'MissingWidth': int(round(ttf.defaultWidth, 0)),
+        },
+        'up': round(ttf.underlinePosition),
+        'ut': round(ttf.underlineThickness),
+        'ttffile': ttf_path,
+        'originalsize': os.stat(ttf_path).st_size,
+        'cw': ttf.charWidths,
+    }
+
+def load_font_metrics(ttf_path: str, cache_dir: str = DEFAULT_FONT_CACHE_DIR) -> dict:
+    """Returns the metrics of a TrueType font, parsing the font only if they are not cached.
+
+    Metrics are cached in memory for the life of the process and on disk across runs.
+    A cache that cannot be written is not an error; the font is just parsed again.
+    """
+    cache_path = font_cache_path(ttf_path, cache_dir)
+    if cache_path in _loaded_metrics:
+        return _loaded_metrics[cache_path]
+
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            metrics = pickle.load(cache_file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        metrics = parse_font_metrics(ttf_path)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Written to a temporary file first, so concurrent runs never read a partial cache
+            file_descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            with os.fdopen(file_descriptor, 'wb') as temp_file:
+                pickle.dump(metrics, temp_file)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass
+    _loaded_metrics[cache_path] = metrics
+    return metrics
+
+def register_unicode_font(pdf, family: str, ttf_path: str, cache_dir: str = DEFAULT_FONT_CACHE_DIR):
+    """Adds a TrueType font to an FPDF document, as ``FPDF.add_font(uni=True)`` does, from cached metrics.
+
+    Only the glyphs used in the document are embedded when it is saved.
+    """
+    family = family.lower()
+    if family == 'arial':
+        family = 'helvetica'  # FPDF.set_font looks Arial up under this name
+    if family in pdf.fonts:
+        return
+    metrics = load_font_metrics(ttf_path, cache_dir)
+    cache_path = font_cache_path(ttf_path, cache_dir)
+    pdf.fonts[family] = {
+        'i': len(pdf.fonts) + 1, 'type': 'TTF',
+        'name': metrics['name'], 'desc': metrics['desc'],
+        'up': metrics['up'], 'ut': metrics['ut'],
+        'cw': metrics['cw'],
+        'ttffile': ttf_path, 'fontkey': family,
+        'subset': list(range(0, 32)),
+        # FPDF also caches the widths of the first 128 characters next to this file
+        'unifilename': cache_path if os.path.isdir(cache_dir) else None,
+    }
+    pdf.font_files[family] = {'length1': metrics['originalsize'], 'type': 'TTF', 'ttffile': ttf_path}
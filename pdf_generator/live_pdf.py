@@ -0,0 +1,271 @@
+"""
+Keeps a merged PDF up to date file by file with incremental updates.
+
+A PDF can be changed by appending objects to its end, followed by a new cross-reference
+section that points back to the previous one (ISO 32000-1, 7.5.6). When files change,
+only the pages of their new fragments and the nodes of the page tree above them are
+appended, so the cost of an update grows with the size of the change rather than with
+the size of the document. The pages they replace stay in the file, unused, until the
+document is merged again.
+"""
+
+import io
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .pdf_operations import PDFOperations
+
+# The document is merged again once the appended updates are larger than the merged document was
+MAX_APPENDED_RATIO = 1.0
+
+# The pages of this many files go under one node of the page tree, whose root only lists the nodes,
+# so that an update writes the nodes of the files it changes and the root again, not every page
+PAGE_TREE_NODE_FILES = 128
+
+# Files added next to each other make their node grow; past this many files, the document is merged again
+MAX_PAGE_TREE_NODE_FILES = 8 * PAGE_TREE_NODE_FILES
+
+_STARTXREF = re.compile(rb'startxref\s+(\d+)\s+%%EOF\s*$')
+
+class _PageTreeNode:
+    """A node of the page tree, with the files whose pages it lists, in order."""
+
+    def __init__(self, number: int, files: List[str]):
+        self.number = number
+        self.files = files
+
+
+class LivePDF:
+    """A PDF merged from a header and one fragment per file, whose files can be replaced in place.
+
+    :meth:`rebuild` merges every fragment; :meth:`update` then swaps the pages of the
+    files whose fragment changed by appending an incremental update. ``needs_rebuild``
+    tells when the document should be merged again: before the first merge, when the
+    output was changed by something else, or when the replaced pages take too much room.
+    """
+
+    def __init__(self, output_path: str, header_path: str, dedupe: bool = False):
+        self.output_path = output_path
+        self.header_path = header_path
+        self.dedupe = dedupe
+        self.fragments: Dict[str, str] = {}  # Relative path of a file -> its fragment
+        self.pages: Dict[str, List[int]] = {}  # Relative path of a file -> object numbers of its pages
+        self.header_pages: List[int] = []
+        self.page_count = 0
+        self._trailer = {}  # /Root, /Info and /ID of the merged document
+        self._pages_number = 0  # Object number of the root of the page tree
+        self._header_node = 0  # Object number of the node of the header pages, the first under the root
+        self._nodes: List[_PageTreeNode] = []  # The nodes of the files' pages, in order
+        self._node_of: Dict[str, _PageTreeNode] = {}  # Relative path of a file -> the node listing its pages
+        self._size = 0  # Next free object number
+        self._startxref = 0
+        self._merged_bytes = 0
+        self._appended_bytes = 0
+        self._stamp = None
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return (self._stamp is None or self._stamp != self._file_stamp() or
+                self._appended_bytes > MAX_APPENDED_RATIO * self._merged_bytes or
+                any(len(node.files) > MAX_PAGE_TREE_NODE_FILES for node in self._nodes))
+
+    def _file_stamp(self) -> Optional[tuple]:
+        try:
+            stat_result = os.stat(self.output_path)
+        except OSError:
+            return None
+        return (stat_result.st_mtime_ns, stat_result.st_size)
+
+    def rebuild(self, sections: Iterable[Tuple[str, str]]) -> int:
+        """Merges the header and the fragments of ``sections``, (relative path, fragment) pairs in order.
+
+        Returns the number of pages.
+        """
+        from pypdf import PdfReader  # Only loaded when a document is merged or updated
+        sections = list(sections)
+        files = [relative_path for relative_path, _ in sections]
+        groups = [files[start:start + PAGE_TREE_NODE_FILES] for start in range(0, len(files), PAGE_TREE_NODE_FILES)]
+        page_counts = []
+        PDFOperations.merge_pdfs([self.header_path] + [fragment for _, fragment in sections], self.output_path,
+                                 dedupe=self.dedupe, page_counts=page_counts,
+                                 group_sizes=[1] + [len(group) for group in groups])
+
+        reader = PdfReader(self.output_path)
+        page_numbers = [page.indirect_reference.idnum for page in reader.pages]
+        self.header_pages = page_numbers[:page_counts[0]]
+        self.fragments = {}
+        self.pages = {}
+        start = page_counts[0]
+        for (relative_path, fragment), count in zip(sections, page_counts[1:]):
+            self.fragments[relative_path] = fragment
+            self.pages[relative_path] = page_numbers[start:start + count]
+            start += count
+        self.page_count = len(page_numbers)
+
+        self._trailer = {key: reader.trailer.raw_get(key) for key in ('/Root', '/Info', '/ID') if key in reader.trailer}
+        page_tree = reader.trailer['/Root'].raw_get('/Pages')
+        self._pages_number = page_tree.idnum
+        node_numbers = [node.idnum for node in page_tree.get_object()['/Kids']]
+        self._header_node = node_numbers[0]
+        self._nodes = [_PageTreeNode(number, group) for number, group in zip(node_numbers[1:], groups)]
+        self._node_of = {relative_path: node for node in self._nodes for relative_path in node.files}
+        self._size = reader.trailer['/Size']
+        with open(self.output_path, 'rb') as output_file:
+            output_file.seek(max(0, os.path.getsize(self.output_path) - 1024))
+            self._startxref = int(_STARTXREF.search(output_file.read()).group(1))
+        self._merged_bytes = os.path.getsize(self.output_path)
+        self._appended_bytes = 0
+        self._stamp = self._file_stamp()
+        return self.page_count
+
+    def update(self, fragments: Dict[str, Optional[str]], previous: Optional[Dict[str, Optional[str]]] = None) -> int:
+        """Replaces the pages of the files that changed.
+
+        ``fragments`` maps the files that changed, in document order, to their new
+        fragment, or to None for a file that is gone or has no pages. A file that is
+        not in the document yet goes right after the file ``previous`` maps it to, or
+        first when that is None. Only new fragments are read, and only the nodes of
+        the page tree whose files changed are written again. Returns the number of pages.
+        """
+        from pypdf import PdfReader
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+        previous = previous or {}
+        output = io.BytesIO()
+        output.write(b'\n')
+        offsets = {}
+        changed_nodes = {}  # id -> node whose list of pages changed
+        for relative_path, fragment in fragments.items():
+            node = self._node_of.get(relative_path)
+            if fragment is None:
+                self.fragments.pop(relative_path, None)
+                self.page_count -= len(self.pages.pop(relative_path, ()))
+                if node is not None:
+                    node.files.remove(relative_path)
+                    del self._node_of[relative_path]
+                    changed_nodes[id(node)] = node
+            elif fragment != self.fragments.get(relative_path):
+                if node is None:
+                    node = self._place(relative_path, previous.get(relative_path))
+                changed_nodes[id(node)] = node
+                pages = self._append_pages(PdfReader(fragment), output, offsets, node.number)
+                self.page_count += len(pages) - len(self.pages.get(relative_path, ()))
+                self.pages[relative_path] = pages
+                self.fragments[relative_path] = fragment
+
+        for node in changed_nodes.values():
+            if not node.files:
+                self._nodes.remove(node)
+                continue
+            kids = [number for relative_path in node.files for number in self.pages[relative_path]]
+            self._write_object(output, offsets, node.number, DictionaryObject({
+                NameObject('/Type'): NameObject('/Pages'),
+                NameObject('/Parent'): IndirectObject(self._pages_number, 0, None),
+                NameObject('/Kids'): ArrayObject(IndirectObject(number, 0, None) for number in kids),
+                NameObject('/Count'): NumberObject(len(kids)),
+            }))
+        # The root lists the nodes, and its count of pages changes with any of them
+        self._write_object(output, offsets, self._pages_number, DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(IndirectObject(number, 0, None)
+                                             for number in [self._header_node] + [node.number for node in self._nodes]),
+            NameObject('/Count'): NumberObject(self.page_count),
+        }))
+
+        # The cross-reference section lists the new objects in runs of consecutive numbers
+        xref_offset = self._stamp[1] + output.tell()
+        output.write(b'xref\n0 1\n0000000000 65535 f \n')
+        numbers = sorted(offsets)
+        start = 0
+        while start < len(numbers):
+            end = start + 1
+            while end < len(numbers) and numbers[end] == numbers[end - 1] + 1:
+                end += 1
+            output.write(f'{numbers[start]} {end - start}\n'.encode())
+            for number in numbers[start:end]:
+                output.write(f'{self._stamp[1] + offsets[number]:010d} 00000 n \n'.encode())
+            start = end
+        trailer = DictionaryObject({NameObject(key): value for key, value in self._trailer.items()})
+        trailer[NameObject('/Size')] = NumberObject(self._size)
+        trailer[NameObject('/Prev')] = NumberObject(self._startxref)
+        output.write(b'trailer\n')
+        trailer.write_to_stream(output)
+        output.write(f'\nstartxref\n{xref_offset}\n%%EOF\n'.encode())
+
+        with open(self.output_path, 'ab') as output_file:
+            output_file.write(output.getvalue())
+        self._startxref = xref_offset
+        self._appended_bytes += output.tell()
+        self._stamp = self._file_stamp()
+        return self.page_count
+
+    def _place(self, relative_path: str, previous: Optional[str]) -> _PageTreeNode:
+        """Puts a new file in the node of the file before it, or first, and returns that node."""
+        node = self._node_of.get(previous) if previous is not None else None
+        if node is not None:
+            node.files.insert(node.files.index(previous) + 1, relative_path)
+        elif self._nodes:
+            node = self._nodes[0]
+            node.files.insert(0, relative_path)
+        else:
+            node = _PageTreeNode(self._new_number(), [relative_path])
+            self._nodes.append(node)
+        self._node_of[relative_path] = node
+        return node
+
+    def _append_pages(self, reader, output: io.BytesIO, offsets: Dict[int, int], parent: int) -> List[int]:
+        """Writes the pages of a fragment, under the node ``parent``, and the objects they use as new objects.
+
+        Returns the page numbers.
+        """
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+        numbers = {}  # Object number in the fragment -> object number in the document
+        pending = []
+
+        def renumber(obj):
+            if isinstance(obj, IndirectObject):
+                if obj.idnum not in numbers:
+                    numbers[obj.idnum] = self._new_number()
+                    pending.append(obj)
+                return IndirectObject(numbers[obj.idnum], 0, None)
+            if isinstance(obj, DictionaryObject):
+                return DictionaryObject({key: renumber(value) for key, value in obj.items()})
+            if isinstance(obj, ArrayObject):
+                return ArrayObject(renumber(value) for value in obj)
+            return obj
+
+        page_numbers = []
+        for page in reader.pages:
+            number = self._new_number()
+            page_numbers.append(number)
+            numbers[page.indirect_reference.idnum] = number  # For links to the page from its own annotations
+            copy = renumber(DictionaryObject({key: value for key, value in page.items() if key != '/Parent'}))
+            copy[NameObject('/Parent')] = IndirectObject(parent, 0, None)
+            self._write_object(output, offsets, number, copy)
+            while pending:
+                reference = pending.pop()
+                self._write_object(output, offsets, numbers[reference.idnum], reference.get_object(), renumber)
+        return page_numbers
+
+    def _new_number(self) -> int:
+        self._size += 1
+        return self._size - 1
+
+    @staticmethod
+    def _write_object(output: io.BytesIO, offsets: Dict[int, int], number: int, obj, renumber=None):
+        from pypdf.generic import DictionaryObject, NameObject, NumberObject, StreamObject
+        offsets[number] = output.tell()
+        output.write(f'{number} 0 obj\n'.encode())
+        if isinstance(obj, StreamObject):
+            # The stream is copied as it is stored, still encoded with its filters
+            data = obj._data
+            dictionary = DictionaryObject({key: renumber(value) if renumber else value
+                                           for key, value in obj.items() if key != '/Length'})
+            dictionary[NameObject('/Length')] = NumberObject(len(data))
+            dictionary.write_to_stream(output)
+            output.write(b'\nstream\n' + data + b'\nendstream')
+        else:
+            (renumber(obj) if renumber else obj).write_to_stream(output)
+        output.write(b'\nendobj\n')
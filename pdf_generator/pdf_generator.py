@@ -1,39 +1,254 @@
 import os
 import json
-import mimetypes
-from typing import Callable, List, Optional
+import re
+import shutil
+import tempfile
+import threading
+import time
+from itertools import repeat
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
 
-from utils.logging_utils import logger
+from utils.cancellation import CancellationToken, OperationCancelled
+from utils.config_cache import load_ignore_folders
+from utils.directory_scanner import DirectoryManifest, DirectoryScanner, ScanEntry
+from utils.file_sniffer import guess_mime_type
+from utils.logging_utils import file_logger, logger, worker_logging
+from utils.path_filter import PathFilter, compile_path_filter
+from utils.profiler import NULL_PROFILER, Profiler
+from utils.sources import Source, open_source
+from .compression import COMPRESSION_PRESETS
+from .config import LAYOUTS, load_config
+from .font_cache import DEFAULT_FONT_CACHE_DIR
+from .live_pdf import LivePDF
 from .pdf_operations import PDFOperations
+from .render_cache import RenderCache, hash_file, make_settings_key
+from .text_reader import MMAP_THRESHOLD, TextFile
+
+# Files are read and laid out in batches of whole lines of about this many characters,
+# so memory use does not grow with the size of the file being rendered.
+READ_CHUNK_SIZE = 64 * 1024
+
+# The intro page of a PDF kept up to date by --watch is kept next to the cached fragments
+HEADER_FILE_NAME = 'header.pdf'
+
+# When rendering in parallel, the files are split into this many batches per worker
+# so that one batch of large files does not leave the other workers idle.
+BATCHES_PER_JOB = 4
+
+# Volumes hold the files of one top-level subdirectory, or are bounded by bytes of file content or by pages
+SPLIT_MODES = ('directory', 'bytes', 'pages')
+
+# Volume size used when none is given, by split mode
+DEFAULT_VOLUME_SIZES = {'bytes': 64 * 1024 * 1024, 'pages': 1000}
+
+def split_into_batches(entries: List[ScanEntry], batch_count: int) -> List[List[ScanEntry]]:
+    """Splits entries into contiguous batches of roughly equal size, keeping their order."""
+    if not entries:
+        return []
+    weights = [entry.size + 4096 for entry in entries]  # Every file costs at least a header and a few lines
+    target = sum(weights) / max(1, batch_count)
+
+    batches = [[]]
+    batch_weight = 0
+    for entry, weight in zip(entries, weights):
+        if batches[-1] and batch_weight + weight > target:
+            batches.append([])
+            batch_weight = 0
+        batches[-1].append(entry)
+        batch_weight += weight
+    return batches
+
+def plan_volumes(entries: List[ScanEntry], split_by: str, volume_size: Optional[int] = None,
+                 page_counts: Optional[List[int]] = None) -> List[List[int]]:
+    """Splits files into volumes and returns the indexes of the files in each volume, in directory order.
+
+    With 'directory', every top-level subdirectory gets a volume, and the files directly in
+    the directory share one. With 'bytes' and 'pages', consecutive files are packed into
+    volumes of at most ``volume_size`` bytes of content or pages (``page_counts`` gives the
+    pages of each file). A file over the limit gets a volume of its own.
+    """
+    if split_by == 'directory':
+        volumes = {}
+        for index, entry in enumerate(entries):
+            parts = entry.relative_path.split(os.sep, 1)
+            volumes.setdefault(parts[0] if len(parts) > 1 else '', []).append(index)
+        return list(volumes.values())
+    if split_by == 'bytes':
+        weights = [entry.size for entry in entries]
+    elif split_by == 'pages':
+        weights = page_counts
+    else:
+        raise ValueError(f"Unknown split mode '{split_by}'. Choose from: {', '.join(SPLIT_MODES)}")
+    limit = volume_size or DEFAULT_VOLUME_SIZES[split_by]
+
+    volumes = []
+    volume_weight = 0
+    for index, weight in enumerate(weights):
+        if not volumes or (volumes[-1] and volume_weight + weight > limit):
+            volumes.append([])
+            volume_weight = 0
+        volumes[-1].append(index)
+        volume_weight += weight
+    return volumes
+
+def render_fragment(settings: dict, files: List[Tuple[str, str]],
+                    fragment_path: str) -> Tuple[List[str], List[str], List[str], Optional[dict]]:
+    """Renders files into a standalone PDF fragment.
+
+    Returns the feedback messages, the relative paths of the files that were rendered
+    and of those among them that the per-file time budget cut short. No fragment is
+    written when every file was skipped. This runs in a worker process, so it only
+    takes picklable arguments; the cancellation budgets are rebuilt from the settings.
+    When profiling, the worker's profile data is returned too, to be merged by the parent.
+    """
+    profiler = Profiler() if settings.get('profile') else NULL_PROFILER
+    generator = PDFGenerator(settings['directory'], os.path.dirname(fragment_path),
+                             config_path=settings['config_path'],
+                             ignore_file_path=settings['ignore_file_path'],
+                             profiler=profiler,
+                             compression=settings['compression'])
+    generator.read_chunk_size = settings['read_chunk_size']
+    generator.mmap_threshold = settings['mmap_threshold']
+    if settings.get('stream'):
+        generator.pdf_operations.stream_to(fragment_path)
+    cancel_token = CancellationToken(**settings['budgets']) if settings.get('budgets') else None
+
+    messages = []
+    rendered = []
+    generator.pdf_operations.add_page()
+    for file_path, relative_path in files:
+        messages.append(f"Processing: {relative_path}")
+        if generator.process_file(file_path, relative_path, messages.append, cancel_token):
+            rendered.append(relative_path)
+    if rendered:
+        generator.pdf_operations.save_pdf(fragment_path)
+    else:
+        generator.pdf_operations.discard()
+    return messages, rendered, sorted(generator.truncated_files), profiler.data() if profiler.enabled else None
+
+def create_shared_pool(workers: int) -> Executor:
+    """Creates a process pool for several generators to render in (see ``executor``).
+
+    The workers are spawned rather than forked. A shared pool is used from several
+    threads, and a worker forked while another thread holds a lock would wait for it
+    forever. Spawning costs an import of the generator per worker, once. The workers
+    log through the handlers of this process (see :func:`worker_logging`).
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    initializer, initargs = worker_logging()
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=initializer, initargs=initargs)
+
+class FileCount:
+    """Counts the files to be processed in a background thread.
+
+    Rendering does not wait for the count: until it is known, the progress total
+    is the number of files counted so far. :meth:`stop` ends the count early, so
+    that it does not go on sniffing files after rendering stopped.
+    """
+
+    def __init__(self, files: Iterable[ScanEntry]):
+        self.counted = 0
+        self.total: Optional[int] = None
+        self._error: Optional[Exception] = None
+        self._done = threading.Event()
+        self._stopped = threading.Event()
+        threading.Thread(target=self._count, args=(files,), name='file-counter', daemon=True).start()
+
+    def _count(self, files: Iterable[ScanEntry]):
+        try:
+            for _ in files:
+                if self._stopped.is_set():
+                    break
+                self.counted += 1
+        except Exception as e:  # A failed scan, raised again by result()
+            self._error = e
+        finally:
+            self.total = self.counted
+            self._done.set()
+
+    def estimate(self, current_file: int) -> int:
+        """Returns the total if it is known, or the best lower bound so far."""
+        return self.total if self.total is not None else max(current_file, self.counted)
+
+    def result(self) -> int:
+        """Waits for the count to finish and returns the total. Raises the error the count stopped on."""
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self.total
+
+    def stop(self):
+        """Stops counting after the current file. Does nothing once the count is finished."""
+        self._stopped.set()
 
 class PDFGenerator:
     def __init__(self, directory: str, output_path: str, 
              exclude_folders: Optional[List[str]] = None, 
              exclude_file_types: Optional[List[str]] = None,
              config_path: str = 'config.json',
-             ignore_file_path: str = 'ignore_folders.json'):
+             ignore_file_path: str = 'ignore_folders.json',
+             exclude_patterns: Optional[List[str]] = None,
+             use_gitignore: bool = False,
+             profiler: Optional[Profiler] = None,
+             stream: bool = False,
+             compression: Optional[str] = None,
+             executor: Optional[Executor] = None,
+             source: Optional[Source] = None):
         
         self.directory = directory
+        # Files are listed and read through the source of the directory, archive or git revision
+        self.source = source if source is not None else open_source(directory)
         self.output_path = output_path
         self.exclude_folders = exclude_folders if exclude_folders else []
         self.exclude_file_types = exclude_file_types if exclude_file_types else []
+        self.exclude_patterns = exclude_patterns if exclude_patterns else []
+        self.use_gitignore = use_gitignore
+        self.stream = stream
+        self.config_path = config_path
+        self.ignore_file_path = ignore_file_path
+        # A process pool shared with other generators; fragments are rendered in it instead of a pool of their own
+        self.executor = executor
 
-        with open(config_path, 'r') as config_file:
-            config = json.load(config_file)
-        self.font_family = config.get('font_family', 'Arial')
-        self.font_size = config.get('font_size', 10)
-        self.line_spacing = config.get('line_spacing', 10)
+        config = load_config(config_path)
+        self.font_family = config.font_family
+        self.font_size = config.font_size
+        self.line_spacing = config.line_spacing
+        self.cache_max_bytes = config.cache_max_bytes
+        self.layout = config.layout
+        self.code_font_family = config.code_font_family
+        self.font_path = config.font_path
+        self.code_font_path = config.code_font_path
+        self.font_cache_dir = config.font_cache_dir or DEFAULT_FONT_CACHE_DIR
+        # A compression preset passed in (from the command line) takes precedence over the configuration
+        self.compression = compression or config.compression
+        if self.compression not in COMPRESSION_PRESETS:
+            raise ValueError(f"Unknown compression '{self.compression}'. Choose from: {', '.join(COMPRESSION_PRESETS)}")
         
-        # Load ignore folders from JSON
-        try:
-            with open(ignore_file_path, 'r') as ignore_file:
-                self.ignore_folders = json.load(ignore_file)
-        except FileNotFoundError:
-            print(f"Warning: Ignore file '{ignore_file_path}' not found. Proceeding without ignoring folders.")
-            self.ignore_folders = []
+        self.ignore_folders = list(load_ignore_folders(ignore_file_path))
 
-        self.pdf_operations = PDFOperations()
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.pdf_operations = PDFOperations(self.profiler, self.compression)
+        for family, ttf_path in ((self.font_family, self.font_path), (self.code_font_family, self.code_font_path)):
+            if ttf_path:
+                if not os.path.isfile(ttf_path):
+                    raise FileNotFoundError(f"Font file '{ttf_path}' from {config_path} not found.")
+                self.pdf_operations.add_font_file(family, ttf_path, self.font_cache_dir)
+        content_font = self.code_font_family if self.layout == 'code' else self.font_family
+        self.unicode_content = self.pdf_operations.is_unicode_font(content_font)
         self.found_file = False
+        self.read_chunk_size = READ_CHUNK_SIZE
+        # Relative paths of the files cut short by the per-file time budget, which are not cached
+        self.truncated_files: Set[str] = set()
+        # Files from this size up are memory-mapped when read from a directory; None reads every file as a stream
+        self.mmap_threshold = MMAP_THRESHOLD
+        self._path_filters = {}
+
+    def text_for_font(self, text: str, family: str) -> str:
+        """Returns text as it can be shown in a font: unchanged for Unicode fonts, ASCII only for core fonts."""
+        return text if self.pdf_operations.is_unicode_font(family) else self.filter_unsupported_chars(text)
 
     def filter_unsupported_chars(self, text: str) -> str:
         """Filters out characters that cannot be encoded in ASCII."""
@@ -41,136 +256,696 @@ class PDFGenerator:
 
     def get_file_type(self, file_path: str) -> str:
         """Gets the MIME type of a file."""
-        mime_type, _ = mimetypes.guess_type(file_path)
+        mime_type = guess_mime_type(file_path)
         return mime_type if mime_type else "application/octet-stream"
 
+    def get_path_filter(self, include_hidden: bool = True, file_types: Optional[List[str]] = None) -> PathFilter:
+        """Returns the compiled filter for the given options, building it only once."""
+        key = (include_hidden, tuple(file_types) if file_types else None)
+        if key not in self._path_filters:
+            self._path_filters[key] = compile_path_filter(
+                ignore_folders=tuple(self.ignore_folders), exclude_folders=tuple(self.exclude_folders),
+                exclude_file_types=tuple(self.exclude_file_types), file_types=key[1],
+                include_hidden=include_hidden, exclude_patterns=tuple(self.exclude_patterns),
+                use_gitignore=self.use_gitignore,
+            )
+        return self._path_filters[key]
+
     def should_process_file(self, file_path: str, file_types: Optional[List[str]] = None) -> bool:
         """Determines if a file should be processed based on inclusion/exclusion lists."""
-        file_extension = os.path.splitext(file_path)[-1]
-        
-        if file_extension:
-            should_process = (file_types is None or file_extension in file_types) and \
-                             file_extension not in self.exclude_file_types
+        return self.get_path_filter(file_types=file_types).accepts_file_type(file_path)
+
+    def add_chunk(self, chunk: str):
+        """Adds a chunk of file content to the PDF, dropping the characters the font cannot show."""
+        if self.unicode_content:
+            text = chunk
         else:
-            file_type = self.get_file_type(file_path)
-            should_process = not any(
-                excluded_type in file_type or excluded_type in "text"
-                for excluded_type in self.exclude_file_types
-            )
-        return should_process
+            with self.profiler.stage('filter_chars'):
+                text = self.filter_unsupported_chars(chunk)
+        if self.layout == 'code':
+            self.pdf_operations.add_code(text, self.line_spacing)
+        else:
+            self.pdf_operations.add_text(text, align='L')
 
-    def process_file(self, file_path: str, relative_path: str, feedback_callback: Optional[Callable] = None):
-        """Processes a single file by reading its content and adding it to the PDF."""
+    def open_text(self, relative_path: str, file_size: int) -> TextFile:
+        """Opens a file of the source to read its text, memory-mapping it if it is large."""
+        return TextFile(self.source, relative_path, file_size, self.read_chunk_size, self.mmap_threshold)
+
+    def process_file(self, file_path: str, relative_path: str, feedback_callback: Optional[Callable] = None,
+                     cancel_token: Optional[CancellationToken] = None) -> bool:
+        """Processes a single file by reading its content and adding it to the PDF.
+
+        Returns True if the file was added and False if it was skipped. The file is read
+        from the source at ``relative_path``; ``file_path`` names it in messages.
+        The content is streamed into the PDF chunk by chunk. The encoding of the file
+        is detected and checked over the whole file first, so a file that cannot be
+        decoded is skipped before anything from it is added.
+
+        With a cancellation token, files over the per-file size budget are skipped, a
+        file that runs past the per-file time budget is truncated, and OperationCancelled
+        is raised between chunks once the job is cancelled or out of budget.
+        """
+        profiler = self.profiler
+        file_started = time.perf_counter()
+        text_file = None
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            filtered_content = self.filter_unsupported_chars(content)
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            file_size = self.source.getsize(relative_path)
+            if cancel_token:
+                if cancel_token.exceeds_file_size(file_size):
+                    profiler.count('files_skipped')
+                    logger.warning(f"Skipping file {file_path}: {file_size} bytes is over the per-file budget.")
+                    if feedback_callback:
+                        feedback_callback(f"Skipped file {file_path}: {file_size} bytes is over the per-file budget.")
+                    return False
+                cancel_token.add_bytes(file_size)
+            started = time.time()
+
+            text_file = self.open_text(relative_path, file_size)
+            with profiler.stage('check_encoding'):
+                encoding = text_file.detect_encoding(cancel_token, started)
+            if encoding.codec != 'utf-8':
+                profiler.count('files_transcoded')
+                file_logger.info("Reading %s as %s", file_path, encoding.codec)
+            if text_file.mapped:
+                profiler.count('files_mapped')
+            chunks = profiler.timed(text_file.iter_chunks(), 'read')
+            first_chunk = next(chunks, '')
 
             self.pdf_operations.set_font(self.font_family, size=self.font_size)
-            self.pdf_operations.add_text(f"{os.path.basename(file_path)} ({relative_path}):", align='L')
-            self.pdf_operations.add_text(filtered_content, align='L')
+            self.pdf_operations.add_text(
+                self.text_for_font(f"{os.path.basename(file_path)} ({relative_path}):", self.font_family), align='L'
+            )
+            if self.layout == 'code':
+                self.pdf_operations.set_font(self.code_font_family, size=self.font_size)
+            self.add_chunk(first_chunk)
+            for chunk in chunks:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                    if cancel_token.file_timed_out(started):
+                        self.pdf_operations.set_font(self.font_family, size=self.font_size)
+                        self.pdf_operations.add_text("[Truncated: the file took too long to render.]", align='L')
+                        self.truncated_files.add(relative_path)
+                        logger.warning(f"Truncated file {file_path}: per-file time budget exceeded.")
+                        if feedback_callback:
+                            feedback_callback(f"Truncated file {file_path}: per-file time budget exceeded.")
+                        break
+                self.add_chunk(chunk)
+            chunks.close()
             self.pdf_operations.add_line_break()
 
-            logger.info(f"Processed file: {file_path}")
+            profiler.count('files_processed')
+            profiler.count('bytes_read', file_size)
+            profiler.record_file(relative_path, time.perf_counter() - file_started, file_size)
+
+            file_logger.info("Processed file: %s", file_path)
             if feedback_callback:
                 feedback_callback(f"Processed file: {file_path}")
+            return True
 
         except UnicodeDecodeError:
+            profiler.count('files_skipped')
             logger.warning(f"Skipping file {file_path} due to encoding issues.")
             if feedback_callback:
                 feedback_callback(f"Skipped file {file_path} due to encoding issues.")
         except OSError as e:
+            profiler.count('files_skipped')
             logger.error(f"Error processing file {file_path}: {e}")
             if feedback_callback:
                 feedback_callback(f"Error processing file {file_path}: {e}")
+        finally:
+            if text_file is not None:
+                text_file.close()
+        return False
+
+    def is_excluded_folder(self, folder_name: str, include_hidden: bool) -> bool:
+        """Determines if a folder (and everything below it) should be skipped."""
+        return self.get_path_filter(include_hidden).excludes_dir(folder_name, folder_name)
+
+    def scan_directory(self, directory_path: Optional[str] = None, include_hidden: bool = True,
+                       background: bool = False,
+                       cancel_token: Optional[CancellationToken] = None) -> DirectoryManifest:
+        """Walks the directory once and returns a manifest that can be shared between outputs.
+
+        Excluded folders, patterns, .gitignore rules and, unless ``include_hidden`` is
+        set, hidden entries are pruned while scanning. With ``background``, the manifest
+        is returned right away and filled by a background thread.
+        """
+        path_filter = self.get_path_filter(include_hidden)
+        scanner = DirectoryScanner(directory_path or self.directory, path_filter=path_filter,
+                                   cancel_token=cancel_token, profiler=self.profiler,
+                                   source=None if directory_path else self.source)
+        return scanner.scan_in_background() if background else scanner.scan()
+
+    def iter_files_to_process(self, manifest: DirectoryManifest, include_hidden: bool,
+                              file_types: Optional[List[str]] = None, sniff: bool = True) -> Iterator[ScanEntry]:
+        """Yields the manifest entries that end up in the PDF, in directory order.
+
+        The manifest may have been scanned with looser options (for example including
+        hidden files), so folder and file rules are checked again on the entries.
+        Without ``sniff``, binary files are not weeded out, so no file is read.
+        """
+        path_filter = self.get_path_filter(include_hidden, file_types)
+        if self.is_excluded_folder(os.path.basename(manifest.directory), include_hidden):
+            return
+
+        skip_depth = None  # Depth of the excluded folder whose subtree is being skipped
+        for entry in manifest:
+            if skip_depth is not None:
+                if entry.depth > skip_depth:
+                    continue
+                skip_depth = None
+
+            if entry.is_dir:
+                if path_filter.excludes_dir(entry.name, entry.relative_path):
+                    skip_depth = entry.depth
+            elif entry.is_file and self._includes_file(manifest, entry, path_filter, sniff):
+                yield entry
+
+    def includes_file(self, manifest: DirectoryManifest, entry: ScanEntry, include_hidden: bool,
+                      file_types: Optional[List[str]] = None) -> bool:
+        """Tells whether one manifest entry ends up in the PDF, as :meth:`iter_files_to_process` would find.
+
+        Only the folders above the entry are checked again, so the manifest is not walked.
+        """
+        if not entry.is_file or self.is_excluded_folder(os.path.basename(manifest.directory), include_hidden):
+            return False
+        path_filter = self.get_path_filter(include_hidden, file_types)
+        folder = os.path.dirname(entry.relative_path)
+        while folder:
+            if path_filter.excludes_dir(os.path.basename(folder), folder):
+                return False
+            folder = os.path.dirname(folder)
+        return self._includes_file(manifest, entry, path_filter)
+
+    def _includes_file(self, manifest: DirectoryManifest, entry: ScanEntry, path_filter: PathFilter,
+                       sniff: bool = True) -> bool:
+        if path_filter.excludes_file(entry.name, entry.relative_path) or not path_filter.accepts_file_type(entry.path):
+            return False
+        if not sniff:
+            return True
+        with self.profiler.stage('sniff'):
+            return not manifest.binary_type(entry)
 
     def process_directory(self, directory_path: str, include_hidden: bool,
                            file_types: Optional[List[str]],
                            feedback_callback: Optional[Callable] = None,
                            progress_callback: Optional[Callable] = None,
                            current_file: int = 0,
-                           total_files: int = 0):
-        """Recursively processes directories and files."""
-        if (not include_hidden and os.path.basename(directory_path).startswith('.')) or \
-           os.path.basename(directory_path) in self.exclude_folders or \
-           os.path.basename(directory_path) in self.ignore_folders:
-            return current_file
-
-        for item in os.listdir(directory_path):
-            item_path = os.path.join(directory_path, item)
-            relative_path = os.path.relpath(item_path, start=self.directory)
+                           total_files: int = 0,
+                           manifest: Optional[DirectoryManifest] = None,
+                           cancel_token: Optional[CancellationToken] = None):
+        """Processes the files of a directory tree, scanning it first if no manifest is given."""
+        if manifest is None:
+            manifest = self.scan_directory(directory_path, include_hidden, cancel_token=cancel_token)
 
-            if (include_hidden or not item.startswith('.')) and os.path.isfile(item_path):
-                if self.should_process_file(item_path, file_types):
-                    self.found_file = True
+        for entry in self.iter_files_to_process(manifest, include_hidden, file_types):
+            self.found_file = True
 
-                    if feedback_callback:
-                        feedback_callback(f"Processing: {relative_path}")
+            if feedback_callback:
+                feedback_callback(f"Processing: {entry.relative_path}")
 
-                    self.process_file(item_path, relative_path, feedback_callback)
+            self.process_file(entry.path, entry.relative_path, feedback_callback, cancel_token)
 
-                    if progress_callback:
-                        current_file += 1
-                        progress_callback(current_file, total_files)
-
-            elif os.path.isdir(item_path):
-                current_file = self.process_directory(  # Update current_file from recursive call
-                    item_path, include_hidden, file_types, feedback_callback,
-                    progress_callback=progress_callback, current_file=current_file,
-                    total_files=total_files
-                )
+            if progress_callback:
+                current_file += 1
+                progress_callback(current_file, total_files)
         return current_file  # Return the updated current_file count
 
-    def generate_pdf(self, include_hidden: bool, file_types: Optional[List[str]] = None, 
-                     progress_callback: Optional[Callable] = None, 
-                     feedback_callback: Optional[Callable] = None) -> Optional[bool]:
-        """Main function to generate the PDF."""
+    def get_render_settings(self, cancel_token: Optional[CancellationToken] = None) -> dict:
+        """Returns the picklable settings a worker process needs to render fragments."""
+        return {
+            'directory': self.directory,
+            'config_path': self.config_path,
+            'ignore_file_path': self.ignore_file_path,
+            'read_chunk_size': self.read_chunk_size,
+            'mmap_threshold': self.mmap_threshold,
+            'budgets': cancel_token.to_settings() if cancel_token else None,
+            'profile': self.profiler.enabled,
+            'stream': self.stream,
+            'compression': self.compression,
+        }
+
+    def render_fragments(self, batches: List[List[ScanEntry]], fragment_paths: List[str], jobs: int,
+                         feedback_callback: Optional[Callable] = None,
+                         progress_callback: Optional[Callable] = None,
+                         current_file: int = 0,
+                         total_files: int = 0,
+                         cancel_token: Optional[CancellationToken] = None) -> List[List[str]]:
+        """Renders each batch of files into its fragment path.
+
+        Batches are rendered in the generator's shared executor if it has one, or else in
+        a process pool when ``jobs`` is greater than 1. Feedback
+        and progress are reported in batch order. Returns the relative paths of the files
+        rendered from each batch.
+        Workers enforce the time and per-file budgets themselves; the byte budget and
+        cancellation are checked here after each batch, and pending batches are
+        dropped once the job is cancelled.
+        """
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        settings = self.get_render_settings(cancel_token)
+        file_lists = [[(entry.path, entry.relative_path) for entry in batch] for batch in batches]
+
+        rendered_files = []
+        executor = self.executor
+        if executor is None and jobs > 1 and len(batches) > 1:
+            # Spawned like a shared pool: the log writer and the scan and count threads are running
+            executor = create_shared_pool(jobs)
+        # A shared pool runs the batches of other generators too, so only these batches are cancelled
+        futures = ([executor.submit(render_fragment, settings, files, path) for files, path in zip(file_lists, fragment_paths)]
+                   if executor else None)
         try:
-            self.pdf_operations.add_page()
-            self.pdf_operations.set_font(self.font_family, size=self.font_size)
+            results = (future.result() for future in futures) if futures else map(render_fragment, repeat(settings), file_lists, fragment_paths)
+            for batch, (messages, rendered, truncated, profile_data) in zip(batches, results):
+                rendered_files.append(rendered)
+                self.truncated_files.update(truncated)
+                self.profiler.merge(profile_data)
+                if cancel_token:
+                    cancel_token.add_bytes(sum(entry.size for entry in batch))
+                if feedback_callback:
+                    for message in messages:
+                        feedback_callback(message)
+                if progress_callback:
+                    current_file += len(batch)
+                    progress_callback(current_file, total_files)
+        finally:
+            if futures:
+                for future in futures:
+                    future.cancel()
+            if executor and executor is not self.executor:
+                executor.shutdown(cancel_futures=True)
+        return rendered_files
 
-            directory_name = os.path.basename(self.directory)
-            self.pdf_operations.add_text(
-                f"This PDF contains the contents of folders and files from the directory '{directory_name}' and its subdirectories."
-            ).add_line_break()
-
-            total_file_count = self.get_total_file_count(file_types)
-            
-            # Explicitly check if file_types is empty to process all
-            if file_types is None or len(file_types) == 0:
-                self.process_directory(self.directory, include_hidden, None, feedback_callback, 
-                                       progress_callback=progress_callback, total_files=total_file_count)
+    def render_fragments_in_parallel(self, entries: List[ScanEntry], jobs: int, fragments_dir: str,
+                                     feedback_callback: Optional[Callable] = None,
+                                     progress_callback: Optional[Callable] = None,
+                                     total_files: int = 0,
+                                     cancel_token: Optional[CancellationToken] = None) -> List[str]:
+        """Renders batches of files into separate PDF fragments in a process pool.
+
+        Returns the fragment paths in directory order, ready to be merged.
+        """
+        if entries:
+            self.found_file = True
+
+        batches = split_into_batches(entries, jobs * BATCHES_PER_JOB)
+        fragment_paths = [os.path.join(fragments_dir, f"fragment_{index:05d}.pdf") for index in range(len(batches))]
+        self.render_fragments(batches, fragment_paths, jobs, feedback_callback,
+                              progress_callback=progress_callback, total_files=total_files,
+                              cancel_token=cancel_token)
+        return fragment_paths
+
+    def render_fragments_incrementally(self, entries: List[ScanEntry], jobs: int, cache: RenderCache,
+                                       feedback_callback: Optional[Callable] = None,
+                                       progress_callback: Optional[Callable] = None,
+                                       total_files: int = 0,
+                                       cancel_token: Optional[CancellationToken] = None) -> List[str]:
+        """Reuses the cached fragments of unchanged files and renders only the changed ones.
+
+        Returns the fragment paths of all files in directory order, ready to be merged.
+        """
+        settings_key = make_settings_key(font_family=self.font_family, font_size=self.font_size,
+                                          line_spacing=self.line_spacing, layout=self.layout,
+                                          code_font_family=self.code_font_family,
+                                          font_path=self.font_path, code_font_path=self.code_font_path,
+                                          compression=self.compression)
+        if entries:
+            self.found_file = True
+
+        fragment_paths = []
+        misses = []
+        current_file = 0
+        for entry in entries:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            fragment_path = cache.lookup(entry, settings_key, self.source)
+            if fragment_path is None:
+                try:
+                    content_hash = hash_file(entry.relative_path, source=self.source)
+                except OSError:
+                    content_hash = None  # Rendering reports the error; nothing is cached
+                fragment_path = cache.fragment_path(entry.relative_path, settings_key, content_hash or '')
+                misses.append((entry, content_hash, fragment_path))
             else:
-                self.process_directory(self.directory, include_hidden, file_types, feedback_callback,
-                                       progress_callback=progress_callback, total_files=total_file_count)
+                if feedback_callback:
+                    feedback_callback(f"Reused cached render: {entry.relative_path}")
+                if progress_callback:
+                    current_file += 1
+                    progress_callback(current_file, total_files)
+            fragment_paths.append(fragment_path)
 
-            if not self.found_file and file_types is not None:
-                logger.verbose(f"No files with the following extensions were found: {', '.join(file_types)}")
-                return False  # Indicate that no PDF was generated
+        self.truncated_files.difference_update(entry.relative_path for entry, _, _ in misses)
+        self.render_fragments([[entry] for entry, _, _ in misses], [path for _, _, path in misses], jobs,
+                              feedback_callback, progress_callback=progress_callback,
+                              current_file=current_file, total_files=total_files,
+                              cancel_token=cancel_token)
+        for entry, content_hash, fragment_path in misses:
+            # Skipped files produce no fragment and are simply checked again next time, like truncated ones
+            if (content_hash is not None and os.path.isfile(fragment_path)
+                    and entry.relative_path not in self.truncated_files):
+                cache.store(entry, settings_key, content_hash, fragment_path)
+        return fragment_paths
 
-            output_filename = os.path.join(self.output_path, f"{directory_name} dir content.pdf")
-            logger.verbose("Saving PDF...")
-            self.pdf_operations.save_pdf(output_filename)
-            #Tell the user where the PDF is saved
-            logger.verbose("PDF saved in " + output_filename)
+    def add_intro(self):
+        """Starts the document with a page saying what it contains."""
+        self.pdf_operations.add_page()
+        self.pdf_operations.set_font(self.font_family, size=self.font_size)
+        self.pdf_operations.add_text(self.text_for_font(
+            f"This PDF contains the contents of folders and files from the directory '{self.source.name}' and its subdirectories.",
+            self.font_family
+        )).add_line_break()
 
-            if progress_callback:
-                progress_callback(total_file_count, total_file_count)
+    def start_live_pdf(self, cache: RenderCache, manifest: DirectoryManifest, include_hidden: bool,
+                       file_types: Optional[List[str]] = None, jobs: int = 1,
+                       feedback_callback: Optional[Callable] = None,
+                       cancel_token: Optional[CancellationToken] = None) -> LivePDF:
+        """Generates the PDF from cached per-file fragments, like :meth:`generate_pdf` with a cache
+        directory, and returns it as a :class:`LivePDF` that :meth:`update_live_pdf` keeps up to date.
+        """
+        header_path = os.path.join(cache.cache_dir, HEADER_FILE_NAME)
+        self.add_intro()
+        self.pdf_operations.save_pdf(header_path)
+        output_filename = os.path.join(self.output_path, f"{self.source.name} dir content.pdf")
+        live_pdf = LivePDF(output_filename, header_path, dedupe=self.pdf_operations.compression.dedupe)
+        self.update_live_pdf(live_pdf, cache, manifest, include_hidden, file_types, jobs=jobs,
+                             feedback_callback=feedback_callback, cancel_token=cancel_token)
+        return live_pdf
 
-            return True
+    def update_live_pdf(self, live_pdf: LivePDF, cache: RenderCache, manifest: DirectoryManifest,
+                        include_hidden: bool, file_types: Optional[List[str]] = None,
+                        changed_paths: Optional[Set[str]] = None, jobs: int = 1,
+                        feedback_callback: Optional[Callable] = None,
+                        cancel_token: Optional[CancellationToken] = None) -> int:
+        """Re-renders the files in ``changed_paths`` and replaces their pages in the PDF.
+
+        The other files keep the pages they have, and are not looked at: a file that is
+        new to the PDF goes after the closest file before it in the manifest that has
+        pages. When the document has to be merged again (see :attr:`LivePDF.needs_rebuild`),
+        or without ``changed_paths``, every file is looked up in the cache and rendered
+        if needed, and the cache is saved. Returns the number of pages.
+        """
+        with self.profiler.capture():
+            if changed_paths is None or live_pdf.needs_rebuild:
+                entries = list(self.iter_files_to_process(manifest, include_hidden, file_types or None))
+                fragment_paths = self.render_fragments_incrementally(entries, jobs, cache, feedback_callback,
+                                                                     cancel_token=cancel_token)
+                with self.profiler.stage('merge'):
+                    page_count = live_pdf.rebuild((entry.relative_path, path) for entry, path in zip(entries, fragment_paths)
+                                                  if os.path.isfile(path))
+                cache.evict()
+                cache.save()
+            else:
+                changed = []  # (position in the manifest, entry) of the changed files that are still included
+                for relative_path in changed_paths:
+                    index = manifest.index_of(relative_path)
+                    if index is not None and self.includes_file(manifest, manifest.entries[index], include_hidden,
+                                                                file_types or None):
+                        changed.append((index, manifest.entries[index]))
+                changed.sort(key=lambda item: item[0])
+                fragment_paths = self.render_fragments_incrementally([entry for _, entry in changed], jobs, cache,
+                                                                     feedback_callback, cancel_token=cancel_token)
+                included = {entry.relative_path: path if os.path.isfile(path) else None
+                            for (_, entry), path in zip(changed, fragment_paths)}
+                # Files no longer included lose their pages; the others follow in document order
+                fragments = dict.fromkeys(set(changed_paths) - included.keys())
+                fragments.update(included)
+
+                def has_pages(relative_path):
+                    if relative_path in fragments:
+                        return fragments[relative_path] is not None
+                    return relative_path in live_pdf.pages
+
+                previous = {}
+                for index, entry in changed:
+                    if fragments[entry.relative_path] is None or entry.relative_path in live_pdf.pages:
+                        continue
+                    previous[entry.relative_path] = None
+                    for earlier in range(index - 1, -1, -1):
+                        if has_pages(manifest.entries[earlier].relative_path):
+                            previous[entry.relative_path] = manifest.entries[earlier].relative_path
+                            break
+                with self.profiler.stage('merge'):
+                    page_count = live_pdf.update(fragments, previous)
+            self.profiler.count('pages', page_count)
+        logger.verbose("PDF saved in " + live_pdf.output_path)
+        return page_count
+
+    def generate_pdf(self, include_hidden: bool, file_types: Optional[List[str]] = None, 
+                     progress_callback: Optional[Callable] = None, 
+                     feedback_callback: Optional[Callable] = None,
+                     manifest: Optional[DirectoryManifest] = None,
+                     jobs: int = 1,
+                     cache_dir: Optional[str] = None,
+                     cancel_token: Optional[CancellationToken] = None) -> Optional[bool]:
+        """Main function to generate the PDF.
+
+        A manifest from :meth:`scan_directory` can be passed in so the directory
+        is only walked once when other outputs are produced from the same run.
+        With ``jobs`` greater than 1, files are rendered into fragments by that many
+        worker processes (those of the shared executor, if the generator was given one)
+        and merged in directory order. With a ``cache_dir``, every
+        file is rendered into its own cached fragment and unchanged files are reused
+        on the next run. With a ``cancel_token``, the run stops at the next file or
+        chunk once the token is cancelled or a budget runs out, and the
+        OperationCancelled exception is returned without saving a PDF.
+        When the generator was created with ``stream``, finished pages are written
+        to the output file (or to the fragments) as they are produced. The partial
+        file is deleted if no PDF ends up being saved.
+        """
+        fragments_dir = tempfile.mkdtemp(prefix='pdf_fragments_') if jobs > 1 or cache_dir or self.executor else None
+        cache = RenderCache.open(cache_dir, self.cache_max_bytes) if cache_dir else None
+        directory_name = self.source.name
+        output_filename = os.path.join(self.output_path, f"{directory_name} dir content.pdf")
+        saved = False
+        with self.profiler.capture():
+            try:
+                if self.stream and not fragments_dir:
+                    self.pdf_operations.stream_to(output_filename)
+                self.add_intro()
+
+                if manifest is None:
+                    manifest = self.scan_directory(include_hidden=include_hidden, background=True,
+                                                   cancel_token=cancel_token)
+
+                # Explicitly check if file_types is empty to process all
+                selected_types = file_types if file_types else None
+
+                if fragments_dir:
+                    # Fragments are planned from the complete list of files, which also gives the total
+                    entries = list(self.iter_files_to_process(manifest, include_hidden, selected_types))
+                    total_file_count = len(entries)
+                    if cache:
+                        fragment_paths = self.render_fragments_incrementally(
+                            entries, jobs, cache, feedback_callback,
+                            progress_callback=progress_callback, total_files=total_file_count,
+                            cancel_token=cancel_token
+                        )
+                    else:
+                        fragment_paths = self.render_fragments_in_parallel(
+                            entries, jobs, fragments_dir, feedback_callback,
+                            progress_callback=progress_callback, total_files=total_file_count,
+                            cancel_token=cancel_token
+                        )
+                else:
+                    # Count with the same pruned traversal as the renderer, without holding up the first page
+                    file_count = FileCount(self.iter_files_to_process(manifest, include_hidden, selected_types))
+                    report_progress = None
+                    if progress_callback:
+                        def report_progress(current_file, _):
+                            progress_callback(current_file, file_count.estimate(current_file))
+                    try:
+                        self.process_directory(self.directory, include_hidden, selected_types, feedback_callback,
+                                               progress_callback=report_progress, manifest=manifest,
+                                               cancel_token=cancel_token)
+                        total_file_count = file_count.result()
+                    finally:
+                        file_count.stop()  # After a cancellation or an error
+
+                if not self.found_file and file_types is not None:
+                    logger.verbose(f"No files with the following extensions were found: {', '.join(file_types)}")
+                    return False  # Indicate that no PDF was generated
+
+                logger.verbose("Saving PDF...")
+                if fragments_dir:
+                    header_path = os.path.join(fragments_dir, "header.pdf")
+                    self.pdf_operations.save_pdf(header_path)
+                    # Batches in which every file was skipped produce no fragment
+                    with self.profiler.stage('merge'):
+                        page_count = PDFOperations.merge_pdfs(
+                            [header_path] + [path for path in fragment_paths if os.path.isfile(path)], output_filename,
+                            dedupe=self.pdf_operations.compression.dedupe
+                        )
+                    if cache:
+                        cache.evict()
+                        cache.save()
+                else:
+                    self.pdf_operations.save_pdf(output_filename)
+                    page_count = self.pdf_operations.page_count()
+                self.profiler.count('pages', page_count)
+                saved = True
+                #Tell the user where the PDF is saved
+                logger.verbose("PDF saved in " + output_filename)
+
+                if progress_callback:
+                    progress_callback(total_file_count, total_file_count)
+
+                return True
+
+            except OperationCancelled as e:
+                logger.warning(f"PDF generation stopped: {e}")
+                return e
+            except Exception as e:
+                logger.error(f"Error generating PDF: {e}")
+                logger.exception(e)
+                return e  
+            finally:
+                if not saved:
+                    self.pdf_operations.discard()
+                if fragments_dir:
+                    shutil.rmtree(fragments_dir, ignore_errors=True)
+
+    def generate_volumes(self, include_hidden: bool, file_types: Optional[List[str]] = None,
+                         split_by: str = 'directory', volume_size: Optional[int] = None,
+                         progress_callback: Optional[Callable] = None,
+                         feedback_callback: Optional[Callable] = None,
+                         manifest: Optional[DirectoryManifest] = None,
+                         jobs: int = 1,
+                         cache_dir: Optional[str] = None,
+                         cancel_token: Optional[CancellationToken] = None) -> Optional[bool]:
+        """Generates the PDF as numbered volumes instead of a single file, with a JSON index.
+
+        Files are split as described in :func:`plan_volumes`. Volumes split by directory
+        or bytes are planned before rendering and rendered concurrently, one per worker
+        process. Splitting by pages needs the page count of every file, so each file is
+        rendered into its own fragment first and the fragments are merged into volumes;
+        the same is done with a ``cache_dir``, so unchanged files are reused.
+
+        Writes "<name> dir content 001.pdf", "<name> dir content 002.pdf", ... and
+        "<name> volumes.json", which lists the files in each volume, and removes the
+        volumes of a previous run that are no longer part of the output. Returns like
+        :meth:`generate_pdf`; the volumes written so far are deleted if the run fails.
+        """
+        if split_by not in SPLIT_MODES:
+            raise ValueError(f"Unknown split mode '{split_by}'. Choose from: {', '.join(SPLIT_MODES)}")
+        directory_name = self.source.name
+        use_fragments = split_by == 'pages' or cache_dir is not None
+        fragments_dir = tempfile.mkdtemp(prefix='pdf_fragments_') if use_fragments and not cache_dir else None
+        cache = RenderCache.open(cache_dir, self.cache_max_bytes) if cache_dir else None
+        volume_paths = []
+        saved = False
+        with self.profiler.capture():
+            try:
+                if manifest is None:
+                    manifest = self.scan_directory(include_hidden=include_hidden, cancel_token=cancel_token)
+                entries = list(self.iter_files_to_process(manifest, include_hidden, file_types if file_types else None))
+                if not entries:
+                    logger.verbose("No files were found to put in volumes")
+                    return False
+                self.found_file = True
+
+                if use_fragments:
+                    if cache:
+                        fragment_paths = self.render_fragments_incrementally(
+                            entries, jobs, cache, feedback_callback,
+                            progress_callback=progress_callback, total_files=len(entries),
+                            cancel_token=cancel_token
+                        )
+                    else:
+                        fragment_paths = [os.path.join(fragments_dir, f"fragment_{index:05d}.pdf")
+                                          for index in range(len(entries))]
+                        self.render_fragments([[entry] for entry in entries], fragment_paths, jobs, feedback_callback,
+                                              progress_callback=progress_callback, total_files=len(entries),
+                                              cancel_token=cancel_token)
+                    # Skipped files produce no fragment
+                    rendered = [(entry, path) for entry, path in zip(entries, fragment_paths) if os.path.isfile(path)]
+                    page_counts = ([PDFOperations.count_pages(path) for _, path in rendered]
+                                   if split_by == 'pages' else None)
+                    volumes = []
+                    for indexes in plan_volumes([entry for entry, _ in rendered], split_by, volume_size, page_counts):
+                        volume_path = os.path.join(self.output_path, self.volume_filename(directory_name, len(volumes) + 1))
+                        with self.profiler.stage('merge'):
+                            page_count = PDFOperations.merge_pdfs([rendered[index][1] for index in indexes], volume_path,
+                                                                  dedupe=self.pdf_operations.compression.dedupe)
+                        volume_paths.append(volume_path)
+                        volumes.append((volume_path, page_count, [rendered[index][0].relative_path for index in indexes]))
+                    if cache:
+                        cache.evict()
+                        cache.save()
+                else:
+                    plan = plan_volumes(entries, split_by, volume_size)
+                    planned_paths = [os.path.join(self.output_path, self.volume_filename(directory_name, number))
+                                     for number in range(1, len(plan) + 1)]
+                    volume_paths.extend(planned_paths)
+                    rendered_files = self.render_fragments([[entries[index] for index in indexes] for indexes in plan],
+                                                           planned_paths, jobs, feedback_callback,
+                                                           progress_callback=progress_callback, total_files=len(entries),
+                                                           cancel_token=cancel_token)
+                    # A volume in which every file was skipped is not written; the others are renumbered
+                    volumes = []
+                    for planned_path, files in zip(planned_paths, rendered_files):
+                        if files:
+                            volume_path = os.path.join(self.output_path, self.volume_filename(directory_name, len(volumes) + 1))
+                            os.replace(planned_path, volume_path)
+                            volume_paths.append(volume_path)
+                            volumes.append((volume_path, PDFOperations.count_pages(volume_path), files))
+
+                if not volumes:
+                    logger.verbose("Every file was skipped; no volumes were written")
+                    return False
+
+                index_path = os.path.join(self.output_path, f"{directory_name} volumes.json")
+                with open(index_path, 'w', encoding='utf-8') as index_file:
+                    json.dump({
+                        'directory': self.directory,
+                        'split_by': split_by,
+                        'volume_size': volume_size or DEFAULT_VOLUME_SIZES.get(split_by),
+                        'volumes': [
+                            {'file': os.path.basename(path), 'pages': pages, 'bytes': os.path.getsize(path), 'files': files}
+                            for path, pages, files in volumes
+                        ],
+                    }, index_file, indent=4)
+                self.profiler.count('pages', sum(pages for _, pages, _ in volumes))
+                saved = True
+                self.remove_stale_volumes(directory_name, [path for path, _, _ in volumes])
+                logger.verbose(f"{len(volumes)} volumes saved in {self.output_path}, listed in {index_path}")
+
+                if progress_callback:
+                    progress_callback(len(entries), len(entries))
+
+                return True
+
+            except OperationCancelled as e:
+                logger.warning(f"PDF generation stopped: {e}")
+                return e
+            except Exception as e:
+                logger.error(f"Error generating PDF volumes: {e}")
+                logger.exception(e)
+                return e
+            finally:
+                if not saved:
+                    for volume_path in volume_paths:
+                        if os.path.isfile(volume_path):
+                            os.remove(volume_path)
+                if fragments_dir:
+                    shutil.rmtree(fragments_dir, ignore_errors=True)
+
+    @staticmethod
+    def volume_filename(directory_name: str, number: int) -> str:
+        return f"{directory_name} dir content {number:03d}.pdf"
 
-        except Exception as e:
-            logger.error(f"Error generating PDF: {e}")
-            logger.exception(e)
-            return e  
+    def remove_stale_volumes(self, directory_name: str, volume_paths: List[str]):
+        """Deletes volumes left in the output folder by an earlier run that produced more of them."""
+        pattern = re.compile(re.escape(f"{directory_name} dir content ") + r"\d{3,}\.pdf")
+        current = {os.path.basename(path) for path in volume_paths}
+        for file_name in os.listdir(self.output_path):
+            if pattern.fullmatch(file_name) and file_name not in current:
+                os.remove(os.path.join(self.output_path, file_name))
 
-    def get_total_file_count(self, file_types: Optional[List[str]] = None) -> int:
+    def get_total_file_count(self, file_types: Optional[List[str]] = None, include_hidden: bool = False,
+                             manifest: Optional[DirectoryManifest] = None) -> int:
         """Calculates the total number of files to be processed."""
-        total_file_count = 0
-        for root, _, files in os.walk(self.directory):
-            if os.path.basename(root) not in self.exclude_folders:
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if self.should_process_file(file_path, file_types):
-                        total_file_count += 1
-        return total_file_count
\ No newline at end of file
+        if manifest is None:
+            manifest = self.scan_directory(include_hidden=include_hidden)
+        return sum(1 for _ in self.iter_files_to_process(manifest, include_hidden, file_types))
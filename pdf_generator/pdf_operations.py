@@ -1,24 +1,228 @@
-from fpdf import FPDF
+import hashlib
+
+from fpdf.php import UTF8ToUTF16BE
+
+from utils.profiler import NULL_PROFILER
+from .compression import COMPRESSION_PRESETS, DEFAULT_COMPRESSION
+from .font_cache import DEFAULT_FONT_CACHE_DIR, register_unicode_font
+from .streaming_fpdf import CompressedFPDF, StreamingFPDF
+
+def _object_key(obj, keys=None):
+    """Returns a hashable key of a PDF object's content, following indirect references.
+
+    Equal keys mean the objects would be written identically, wherever they came from.
+    ``keys`` remembers the key of each indirect object of one reader, so that the
+    streams shared by its pages, such as embedded fonts, are hashed once.
+    """
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+    if isinstance(obj, IndirectObject):
+        if keys is None:
+            return _object_key(obj.get_object())
+        reference = (obj.idnum, obj.generation)
+        if reference not in keys:
+            keys[reference] = _object_key(obj.get_object(), keys)
+        return keys[reference]
+    if isinstance(obj, DictionaryObject):
+        key = tuple(sorted((name, _object_key(value, keys)) for name, value in obj.items()))
+        if isinstance(obj, StreamObject):
+            key = (key, hashlib.sha1(obj.get_data()).digest())
+        return key
+    if isinstance(obj, ArrayObject):
+        return tuple(_object_key(value, keys) for value in obj)
+    return (type(obj).__name__, str(obj))
 
 class PDFOperations:
-    def __init__(self):
-        self.pdf = FPDF()
+    def __init__(self, profiler=NULL_PROFILER, compression=DEFAULT_COMPRESSION):
+        if compression not in COMPRESSION_PRESETS:
+            raise ValueError(f"Unknown compression '{compression}'. Choose from: {', '.join(COMPRESSION_PRESETS)}")
+        self.compression = COMPRESSION_PRESETS[compression]
+        self.pdf = CompressedFPDF(compress_level=self.compression.level)
         self.margin = 10
         self.processed_files = 0
+        self.profiler = profiler
+        self.font_files = {}  # Unicode font family -> (TrueType file, metrics cache directory)
+
+    def stream_to(self, output_path):
+        """Writes the document to ``output_path`` page by page while it is built.
+
+        Must be called before the first page is added. :meth:`save_pdf` then only
+        finishes the file.
+        """
+        if self.pdf.page_no():
+            raise RuntimeError("Streaming must be set up before the first page is added.")
+        self.pdf = StreamingFPDF(output_path, compress_level=self.compression.level)
+
+    def discard(self):
+        """Deletes the partially written file of a streamed document that will not be saved."""
+        if isinstance(self.pdf, StreamingFPDF):
+            self.pdf.discard()
 
     def add_page(self):
         self.pdf.add_page()
 
+    def add_font_file(self, family, ttf_path, cache_dir=DEFAULT_FONT_CACHE_DIR):
+        """Makes a TrueType font available under ``family``, so text in it can use any Unicode character.
+
+        The font is loaded the first time it is selected.
+        """
+        self.font_files[family.lower()] = (ttf_path, cache_dir)
+
+    def is_unicode_font(self, family):
+        return family.lower() in self.font_files
+
     def set_font(self, family, size=12):
+        if family.lower() in self.font_files:
+            with self.profiler.stage('font_load'):
+                register_unicode_font(self.pdf, family, *self.font_files[family.lower()])
         self.pdf.set_font(family, size=size)
 
     def add_text(self, text, align='L'):
         effective_page_width = self.pdf.w - 2*self.margin  # Calculate the effective page width
-        self.pdf.multi_cell(effective_page_width, 10, txt=text, align=align)
+        with self.profiler.stage('layout'):
+            self.pdf.multi_cell(effective_page_width, 10, txt=text, align=align)
         return self  # Return self to allow method chaining
 
+    def add_code(self, text, line_height):
+        """Lays out text line by line in the current font, which must be monospace.
+
+        Lines are wrapped at a fixed number of characters, worked out once from the
+        width of one character, and the lines of each page are written in a single
+        text object. This keeps indentation intact and avoids measuring every word.
+        """
+        pdf = self.pdf
+        with self.profiler.stage('layout'):
+            line_width = pdf.w - pdf.l_margin - pdf.r_margin
+            chars_per_line = max(1, int(line_width / pdf.get_string_width('M')))
+            lines = []
+            for line in text.expandtabs(4).replace('\r', '').split('\n'):
+                if pdf.unifontsubset and not line.isascii():
+                    lines.extend(self._wrap_by_width(line, line_width))  # Wide characters take more room
+                else:
+                    lines.extend([line[start:start + chars_per_line] for start in range(0, len(line), chars_per_line)] or [''])
+            if text.endswith('\n'):
+                lines.pop()  # A trailing newline ends the last line rather than starting an empty one
+
+            while lines:
+                lines_on_page = int((pdf.page_break_trigger - pdf.y) / line_height)
+                if lines_on_page < 1:
+                    pdf.add_page()
+                    continue
+                self._write_lines(lines[:lines_on_page], line_height)
+                del lines[:lines_on_page]
+            pdf.x = pdf.l_margin
+        return self
+
+    def _wrap_by_width(self, line, line_width):
+        """Splits a line into pieces that fit the line width, measuring every character."""
+        pieces = []
+        start = 0
+        width = 0
+        for index, char in enumerate(line):
+            char_width = self.pdf.get_string_width(char)
+            if width + char_width > line_width and index > start:
+                pieces.append(line[start:index])
+                start = index
+                width = 0
+            width += char_width
+        pieces.append(line[start:])
+        return pieces
+
+    def _write_lines(self, lines, line_height):
+        """Writes lines below the current position as one PDF text object and moves the position past them."""
+        pdf = self.pdf
+        # Same baseline as FPDF.cell uses for a line of this height
+        baseline = pdf.y + 0.5 * line_height + 0.3 * pdf.font_size
+        operators = [
+            f"BT /F{pdf.current_font['i']} {pdf.font_size_pt:.2f} Tf {pdf.l_margin * pdf.k:.2f} "
+            f"{(pdf.h - baseline) * pdf.k:.2f} Td {line_height * pdf.k:.2f} TL"
+        ]
+        if pdf.unifontsubset:
+            for line in lines:
+                pdf.current_font['subset'].extend(set(map(ord, line)))
+                operators.append(f"({pdf._escape(UTF8ToUTF16BE(line, False))}) Tj T*")
+        else:
+            operators.extend(f"({pdf._escape(line)}) Tj T*" for line in lines)
+        operators.append("ET")
+        content = '\n'.join(operators)
+        pdf._out(f"q {pdf.text_color} {content} Q" if pdf.color_flag else content)
+        pdf.y += len(lines) * line_height
+
     def add_line_break(self):
         self.pdf.ln(10)
 
     def save_pdf(self, output_path):
-        self.pdf.output(output_path)
+        with self.profiler.stage('output'):
+            for font in self.pdf.fonts.values():
+                if font['type'] == 'TTF':
+                    # FPDF records every character it writes; each glyph only needs to be embedded once
+                    font['subset'] = sorted(set(font['subset']))
+            self.pdf.output(output_path)
+
+    def page_count(self):
+        return self.pdf.page_no()
+
+    @staticmethod
+    def count_pages(input_path):
+        """Returns the number of pages of a PDF file."""
+        from pypdf import PdfReader  # pypdf is slow to import and only needed to read fragments back
+        return len(PdfReader(input_path).pages)
+
+    @staticmethod
+    def merge_pdfs(input_paths, output_path, dedupe=False, page_counts=None, group_sizes=None):
+        """Concatenates the given PDF files, in order, into a single PDF. Returns the number of pages.
+
+        Every file brings its own fonts and resources. With ``dedupe``, pages whose
+        resources are identical to those of an earlier page share that page's copy.
+        The number of pages taken from each file is appended to ``page_counts``, if given.
+        With ``group_sizes``, the pages of each run of that many input files, in order,
+        go under a node of their own in the page tree instead of straight under its root.
+        """
+        from pypdf import PdfReader, PdfWriter
+        from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject
+        if group_sizes is not None and page_counts is None:
+            page_counts = []
+        writer = PdfWriter()
+        if dedupe:
+            shared_resources = {}
+            for input_path in input_paths:
+                pages_before = len(writer.pages)
+                keys = {}  # Object numbers are those of this file
+                for page in PdfReader(input_path).pages:
+                    key = _object_key(page.raw_get('/Resources'), keys)
+                    if key in shared_resources:
+                        page[NameObject('/Resources')] = shared_resources[key]  # Already in the writer, so not copied again
+                    added_page = writer.add_page(page)
+                    shared_resources.setdefault(key, added_page.raw_get('/Resources'))
+                if page_counts is not None:
+                    page_counts.append(len(writer.pages) - pages_before)
+        else:
+            for input_path in input_paths:
+                pages_before = len(writer.pages)
+                writer.append(input_path)
+                if page_counts is not None:
+                    page_counts.append(len(writer.pages) - pages_before)
+        if group_sizes is not None:
+            tree_reference = writer.root_object.raw_get('/Pages')
+            tree = tree_reference.get_object()
+            kids = list(tree['/Kids'])
+            file_page_counts = page_counts[len(page_counts) - len(input_paths):]
+            nodes = ArrayObject()
+            start = file_index = 0
+            for size in group_sizes:
+                count = sum(file_page_counts[file_index:file_index + size])
+                node = DictionaryObject({
+                    NameObject('/Type'): NameObject('/Pages'),
+                    NameObject('/Parent'): tree_reference,
+                    NameObject('/Kids'): ArrayObject(kids[start:start + count]),
+                    NameObject('/Count'): NumberObject(count),
+                })
+                node_reference = writer._add_object(node)
+                for kid in kids[start:start + count]:
+                    kid.get_object()[NameObject('/Parent')] = node_reference
+                nodes.append(node_reference)
+                start += count
+                file_index += size
+            tree[NameObject('/Kids')] = nodes
+        with open(output_path, 'wb') as output_file:
+            writer.write(output_file)
+        return len(writer.pages)
@@ -0,0 +1,161 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from typing import Optional
+
+from utils.directory_scanner import ScanEntry
+from utils.sources import Source
+from utils.logging_utils import logger
+
+# Bump this when the way files are rendered changes, so old fragments are not reused.
+RENDER_VERSION = 1
+
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+INDEX_FILE_NAME = 'index.json'
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024, source: Optional[Source] = None) -> str:
+    """Returns the SHA-256 hex digest of a file's content.
+
+    With a ``source``, ``file_path`` is the relative path of a file in it.
+    """
+    digest = hashlib.sha256()
+    with (source.open(file_path) if source else open(file_path, 'rb')) as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_settings_key(**settings) -> str:
+    """Returns a short key identifying the render settings a fragment was produced with."""
+    settings['render_version'] = RENDER_VERSION
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+class RenderCache:
+    """On-disk cache of rendered per-file PDF fragments.
+
+    Fragments are keyed on the file's relative path, content hash and render settings.
+    The index also remembers each file's mtime and size, so unchanged files are
+    recognized without reading them. The cache is trimmed to ``max_bytes`` by
+    evicting the least recently used fragments.
+    """
+
+    # Caches loaded by open(), by directory, with the stamp of their index when last loaded or saved
+    _open_caches = {}
+    _open_lock = threading.Lock()
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, INDEX_FILE_NAME)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries = self._load_index()
+
+    @classmethod
+    def open(cls, cache_dir: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> 'RenderCache':
+        """Returns the cache of a directory, reusing the one loaded earlier in this process.
+
+        A long-running process keeps the index in memory between runs instead of
+        parsing it again; it is only reloaded if the index changed on disk since.
+        """
+        key = os.path.abspath(cache_dir)
+        with cls._open_lock:
+            cached = cls._open_caches.get(key)
+        if cached is not None and cached[0] == cls._index_stamp(cached[1].index_path):
+            cached[1].max_bytes = max_bytes
+            return cached[1]
+        cache = cls(cache_dir, max_bytes)
+        cache._remember()
+        return cache
+
+    @staticmethod
+    def _index_stamp(index_path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(index_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _remember(self):
+        with self._open_lock:
+            self._open_caches[os.path.abspath(self.cache_dir)] = (self._index_stamp(self.index_path), self)
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                return json.load(index_file).get('entries', {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable render cache index {self.index_path}: {e}")
+            return {}
+
+    def fragment_path(self, relative_path: str, settings_key: str, content_hash: str) -> str:
+        name = hashlib.sha256(f"{relative_path}\0{settings_key}\0{content_hash}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.pdf")
+
+    def lookup(self, entry: ScanEntry, settings_key: str, source: Optional[Source] = None) -> Optional[str]:
+        """Returns the cached fragment for an unchanged file, or None if it has to be rendered.
+
+        The content is only hashed (read from ``source``, if given) when the size
+        matches but the mtime does not.
+        """
+        record = self.entries.get(entry.relative_path)
+        if record is None or record['settings'] != settings_key or record['size'] != entry.size:
+            return None
+        if not os.path.isfile(record['fragment']):
+            return None
+
+        if record['mtime_ns'] != entry.mtime_ns:
+            content_hash = hash_file(entry.relative_path, source=source) if source else hash_file(entry.path)
+            if content_hash != record['hash']:
+                return None
+            record['mtime_ns'] = entry.mtime_ns  # Touched but unchanged
+
+        record['last_used'] = time.time()
+        return record['fragment']
+
+    def store(self, entry: ScanEntry, settings_key: str, content_hash: str, fragment_path: str):
+        """Records a freshly rendered fragment for a file."""
+        previous = self.entries.get(entry.relative_path)
+        if previous and previous['fragment'] != fragment_path:
+            self._remove_fragment(previous['fragment'])
+
+        self.entries[entry.relative_path] = {
+            'mtime_ns': entry.mtime_ns,
+            'size': entry.size,
+            'hash': content_hash,
+            'settings': settings_key,
+            'fragment': fragment_path,
+            'bytes': os.path.getsize(fragment_path),
+            'last_used': time.time(),
+        }
+
+    def evict(self):
+        """Removes the least recently used fragments until the cache fits in ``max_bytes``."""
+        total_bytes = sum(record['bytes'] for record in self.entries.values())
+        if total_bytes <= self.max_bytes:
+            return
+
+        for relative_path, record in sorted(self.entries.items(), key=lambda item: item[1]['last_used']):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove_fragment(record['fragment'])
+            del self.entries[relative_path]
+            total_bytes -= record['bytes']
+
+    def save(self):
+        """Writes the index atomically so an interrupted run cannot corrupt it."""
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as index_file:
+            json.dump({'version': RENDER_VERSION, 'entries': self.entries}, index_file)
+        os.replace(temp_path, self.index_path)
+        self._remember()
+
+    @staticmethod
+    def _remove_fragment(fragment_path: str):
+        try:
+            os.remove(fragment_path)
+        except FileNotFoundError:
+            pass
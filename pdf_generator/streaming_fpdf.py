@@ -0,0 +1,164 @@
+import os
+import zlib
+
+from fpdf import FPDF
+from fpdf.php import UTF8ToUTF16BE
+
+class _FileBuffer:
+    """Stands in for ``FPDF.buffer`` and sends everything appended to it to a file.
+
+    FPDF appends to its buffer with ``+=`` and takes object offsets from ``len()``,
+    so the document is written to disk as it is produced with FPDF's own code.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, 'wb')
+        self.length = 0
+
+    def __iadd__(self, text: str):
+        data = text.encode('latin1')  # FPDF keeps binary data in latin1 strings
+        self.file.write(data)
+        self.length += len(data)
+        return self
+
+    def __len__(self) -> int:
+        return self.length
+
+    def close(self):
+        self.file.close()
+
+
+class CompressedFPDF(FPDF):
+    """An FPDF document whose page contents are compressed at a chosen zlib level.
+
+    FPDF always compresses at zlib's default level. Level 0 turns compression off.
+    """
+
+    def __init__(self, *args, compress_level: int = zlib.Z_DEFAULT_COMPRESSION, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compress_level = compress_level
+        self.set_compression(compress_level != 0)
+
+    def _put_page(self, n: int):
+        if self.def_orientation == 'P':
+            w_pt, h_pt = self.fw_pt, self.fh_pt
+        else:
+            w_pt, h_pt = self.fh_pt, self.fw_pt
+        self._newobj()
+        self._out('<</Type /Page')
+        self._out('/Parent 1 0 R')
+        if n in self.orientation_changes:
+            self._out('/MediaBox [0 0 %.2f %.2f]' % (h_pt, w_pt))
+        self._out('/Resources 2 0 R')
+        if self.page_links and n in self.page_links:
+            self._out(self._page_annotations(n, w_pt, h_pt))
+        if self.pdf_version > '1.3':
+            self._out('/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>')
+        self._out('/Contents ' + str(self.n + 1) + ' 0 R>>')
+        self._out('endobj')
+
+        content = self.pages.pop(n)
+        if self.compress:
+            content = zlib.compress(content.encode('latin1'), self.compress_level)
+            stream_filter = '/Filter /FlateDecode '
+        else:
+            stream_filter = ''
+        self._newobj()
+        self._out('<<' + stream_filter + '/Length ' + str(len(content)) + '>>')
+        self._putstream(content)
+        self._out('endobj')
+
+    def _page_annotations(self, n: int, w_pt: float, h_pt: float) -> str:
+        annots = '/Annots ['
+        for pl in self.page_links[n]:
+            rect = '%.2f %.2f %.2f %.2f' % (pl[0], pl[1], pl[0] + pl[2], pl[1] - pl[3])
+            annots += '<</Type /Annot /Subtype /Link /Rect [' + rect + '] /Border [0 0 0] '
+            if isinstance(pl[4], str):
+                annots += '/A <</S /URI /URI ' + self._textstring(pl[4]) + '>>>>'
+            else:
+                link = self.links[pl[4]]
+                h = w_pt if link[0] in self.orientation_changes else h_pt
+                annots += '/Dest [%d 0 R /XYZ 0 %.2f null]>>' % (1 + 2 * link[0], h - link[1] * self.k)
+        return annots + ']'
+
+    def _putpages(self):
+        # Same as FPDF._putpages, except for the compression level
+        if hasattr(self, 'str_alias_nb_pages'):
+            for n in range(1, self.page + 1):
+                self.pages[n] = self.pages[n].replace(UTF8ToUTF16BE(self.str_alias_nb_pages, False),
+                                                      UTF8ToUTF16BE(str(self.page), False))
+                self.pages[n] = self.pages[n].replace(self.str_alias_nb_pages, str(self.page))
+        for n in range(1, self.page + 1):
+            self._put_page(n)
+        self._put_page_tree()
+
+    def _put_page_tree(self):
+        if self.def_orientation == 'P':
+            w_pt, h_pt = self.fw_pt, self.fh_pt
+        else:
+            w_pt, h_pt = self.fh_pt, self.fw_pt
+        self.offsets[1] = len(self.buffer)
+        self._out('1 0 obj')
+        self._out('<</Type /Pages')
+        self._out('/Kids [' + ''.join(str(3 + 2 * i) + ' 0 R ' for i in range(self.page)) + ']')
+        self._out('/Count ' + str(self.page))
+        self._out('/MediaBox [0 0 %.2f %.2f]' % (w_pt, h_pt))
+        self._out('>>')
+        self._out('endobj')
+
+
+class StreamingFPDF(CompressedFPDF):
+    """An FPDF document that is written to its output file while it is being built.
+
+    Each page is written out as soon as it is finished and then dropped from
+    memory, so memory use does not grow with the number of pages. The objects that
+    FPDF writes at the end (page tree, fonts, resources, xref and trailer) are
+    written when the document is closed by :meth:`output`.
+
+    Page numbering aliases are not supported, since pages are written before the
+    total is known.
+    """
+
+    def __init__(self, output_path: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_path = output_path
+        self.buffer = _FileBuffer(output_path)
+        self.pages_written = 0
+        self._out('%PDF-' + self.pdf_version)
+
+    def alias_nb_pages(self, alias='{nb}'):
+        self.error('Page numbering aliases are not supported when streaming')
+
+    def _endpage(self):
+        super()._endpage()
+        # Pages are the first objects written, so they get the same numbers as in FPDF._putpages
+        self._put_page(self.page)
+        self.pages_written = self.page
+
+    def _putheader(self):
+        pass  # Written when the file was opened
+
+    def _putpages(self):
+        # The pages themselves were written as they were finished; only the page tree is left
+        self._put_page_tree()
+
+    def flush(self):
+        """Flushes what has been written so far to the file."""
+        self.buffer.file.flush()
+
+    def output(self, name='', dest=''):
+        """Finishes the document and closes the file. ``name`` must be the path given when it was created."""
+        if name and os.path.abspath(name) != os.path.abspath(self.output_path):
+            self.error('A streamed PDF can only be saved to ' + self.output_path)
+        if self.state < 3:
+            self.close()
+        self.buffer.close()
+        return ''
+
+    def discard(self):
+        """Closes and deletes the partially written file."""
+        self.buffer.close()
+        try:
+            os.remove(self.output_path)
+        except OSError:
+            pass
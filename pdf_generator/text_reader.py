@@ -0,0 +1,239 @@
+"""
+Reads the text of the files to render, in whatever encoding they are in.
+
+The encoding is guessed from the start of a file (see ``detect_encoding``) and
+checked over the whole file before anything of it is rendered. Files of at least
+MMAP_THRESHOLD bytes that the source can map are decoded straight from the mapped
+pages, one slice at a time, instead of being copied through a buffered text stream.
+"""
+
+import codecs
+import io
+from typing import Iterator, List, Optional, Tuple
+
+from utils.cancellation import CancellationToken
+from utils.file_sniffer import SNIFF_SIZE, TextEncoding, detect_encoding
+from utils.sources import Source
+
+# Files from this size up are memory-mapped, if their source is a directory on disk
+MMAP_THRESHOLD = 256 * 1024
+
+# Encodings tried, in order, when text guessed to be UTF-8 or Windows-1252 turns out
+# not to be; Latin-1 decodes any byte. Both decode ASCII as ASCII.
+_FALLBACK_ENCODINGS = (TextEncoding('cp1252'), TextEncoding('latin-1'))
+
+def translate_newlines(text: str) -> str:
+    """Turns Windows and old Mac line breaks into '\\n', as reading a file in text mode does."""
+    return text.replace('\r\n', '\n').replace('\r', '\n') if '\r' in text else text
+
+def _char_boundary(buffer, start: int, end: int, codec: str, unit: int) -> int:
+    """Moves ``end`` back so that the slice from ``start`` does not cut a character in two."""
+    end -= (end - start) % unit
+    if codec == 'utf-8':
+        boundary = end
+        while boundary > end - 3 and 0x80 <= buffer[boundary] < 0xc0:  # A continuation byte
+            boundary -= 1
+        return boundary
+    if codec.startswith('utf-16'):
+        high_byte = buffer[end - 2] if codec == 'utf-16-be' else buffer[end - 1]
+        if 0xd8 <= high_byte <= 0xdb:  # The first half of a surrogate pair
+            return end - 2
+    return end
+
+def _mapped_slices(buffer, encoding: TextEncoding, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Yields the bounds of consecutive slices of at most ``chunk_size`` bytes of the text of a buffer.
+
+    Slices end after a line break, or between two characters in a line longer than a slice.
+    """
+    newline = '\n'.encode(encoding.codec)
+    unit = len(newline)
+    start, size = encoding.bom_size, len(buffer)
+    while start < size:
+        end = start + chunk_size
+        if end >= size:
+            end = size
+        else:
+            line_end = buffer.rfind(newline, start, end)
+            while line_end >= start and (line_end - start) % unit:  # Not aligned to a character
+                line_end = buffer.rfind(newline, start, line_end + unit - 1)
+            end = line_end + unit if line_end >= start else _char_boundary(buffer, start, end, encoding.codec, unit)
+        yield start, end
+        start = end
+
+def iter_mapped_text(buffer, encoding: TextEncoding, chunk_size: int, errors: str = 'strict') -> Iterator[str]:
+    """Yields the text of a buffer, such as a memory-mapped file, in batches of whole lines.
+
+    Every batch is decoded from a slice of the buffer, so the bytes are not copied on
+    their way to the string. Lines longer than ``chunk_size`` bytes are split.
+    ``errors`` is passed to the decoder.
+    """
+    with memoryview(buffer) as view:
+        pending_cr = False
+        for start, end in _mapped_slices(buffer, encoding, chunk_size):
+            text = str(view[start:end], encoding.codec, errors)
+            if pending_cr:
+                text = '\r' + text
+            # A '\r' cut off from the '\n' that follows it is kept for the next batch
+            pending_cr = text.endswith('\r') and end < len(buffer)
+            if pending_cr:
+                text = text[:-1]
+            yield translate_newlines(text)
+
+class TextFile:
+    """A file of a source, opened to render its text.
+
+    :meth:`detect_encoding` is called first; :meth:`iter_chunks` then yields the
+    text in batches of whole lines of about ``chunk_size`` characters. Files of at
+    least ``mmap_threshold`` bytes are memory-mapped if the source can map them; with
+    ``mmap_threshold`` None, nothing is. A file that fits in one chunk is read whole.
+    """
+
+    def __init__(self, source: Source, relative_path: str, size: int, chunk_size: int,
+                 mmap_threshold: Optional[int] = MMAP_THRESHOLD):
+        self.source = source
+        self.relative_path = relative_path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.encoding: Optional[TextEncoding] = None
+        self.checked = True  # False if the time budget ran out before the whole file was checked
+        self._mapping = None
+        if mmap_threshold is not None and size >= mmap_threshold:
+            self._mapping = source.map(relative_path)
+        self._data = None  # The content of a file that fits in one chunk
+        self._text = None
+        self._chunks = None
+
+    @property
+    def mapped(self) -> bool:
+        return self._mapping is not None
+
+    def detect_encoding(self, cancel_token: Optional[CancellationToken] = None,
+                        started: Optional[float] = None) -> TextEncoding:
+        """Works out the encoding of the file, raising UnicodeDecodeError if the file cannot be decoded.
+
+        The guess from the start of the file is checked against all of it. Text that
+        looked like UTF-8 or Windows-1252 but is not is read with a fallback encoding,
+        tried in the same pass over the file. With a cancellation token, the pass
+        raises OperationCancelled when the job is cancelled, and stops once the file
+        has taken longer than its time budget since ``started``: the encoding that held
+        so far is used, and :attr:`checked` is False. The unchecked rest of the file is
+        then read with replacement characters, if the caller reads it before truncating.
+        """
+        if self._mapping is not None:
+            head = self._mapping[:SNIFF_SIZE]
+        else:
+            with self.source.open(self.relative_path) as file:
+                if self.size <= self.chunk_size:
+                    self._data = head = file.read()
+                else:
+                    head = file.read(SNIFF_SIZE)
+
+        guess = detect_encoding(head)
+        candidates = [guess]
+        if not guess.bom_size and guess.codec in ('utf-8', 'cp1252'):
+            candidates += [encoding for encoding in _FALLBACK_ENCODINGS if encoding != guess]
+        self.encoding = self._check(candidates, cancel_token, started)
+        return self.encoding
+
+    def _check(self, candidates: List[TextEncoding], cancel_token: Optional[CancellationToken],
+               started: Optional[float]) -> TextEncoding:
+        """Returns the first of the candidate encodings that decodes the whole file."""
+        if self._data is not None:
+            with memoryview(self._data) as view:
+                for encoding in candidates:
+                    try:
+                        self._text = translate_newlines(str(view[encoding.bom_size:], encoding.codec))
+                        return encoding
+                    except UnicodeDecodeError:
+                        if encoding is candidates[-1]:
+                            raise
+
+        decoders = [(encoding, codecs.getincrementaldecoder(encoding.codec)()) for encoding in candidates]
+        chunks = self._iter_bytes(candidates[0].bom_size)  # Only a guess without a BOM has fallbacks
+        try:
+            for chunk in chunks:
+                index = 0
+                while index < len(decoders):
+                    try:
+                        text = decoders[index][1].decode(chunk)
+                    except UnicodeDecodeError:
+                        if len(decoders) == 1:
+                            raise
+                        del decoders[index]
+                        continue
+                    index += 1
+                    if index == 1 and len(text) == len(chunk) and text.isascii():
+                        break  # The fallback encodings decode ASCII alike, so they need not check it
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                    if cancel_token.file_timed_out(started):
+                        self.checked = False
+                        return decoders[0][0]
+        finally:
+            chunks.close()  # Releases its view of the mapping
+        for encoding, decoder in decoders:
+            try:
+                decoder.decode(b'', final=True)
+            except UnicodeDecodeError:
+                if encoding is decoders[-1][0]:
+                    raise
+            else:
+                return encoding
+
+    def _iter_bytes(self, offset: int) -> Iterator:
+        """Yields the content of the file from ``offset`` in chunks, as views of the mapping if it is mapped."""
+        if self._mapping is not None:
+            with memoryview(self._mapping) as view:
+                for start in range(offset, len(view), self.chunk_size):
+                    with view[start:start + self.chunk_size] as chunk:
+                        yield chunk
+            return
+        with self.source.open(self.relative_path) as file:
+            file.read(offset)
+            yield from iter(lambda: file.read(self.chunk_size), b'')
+
+    def iter_chunks(self) -> Iterator[str]:
+        """Yields the text of the file in batches of whole lines, splitting lines longer than a chunk."""
+        self._chunks = self._iter_chunks()
+        return self._chunks
+
+    def _iter_chunks(self) -> Iterator[str]:
+        if self._text is not None:
+            if self._text:
+                yield self._text
+            return
+        if self._mapping is not None:
+            yield from iter_mapped_text(self._mapping, self.encoding, self.chunk_size, self._errors)
+            return
+
+        file = self.source.open(self.relative_path)
+        file.read(self.encoding.bom_size)
+        with io.TextIOWrapper(file, encoding=self.encoding.codec, errors=self._errors) as file:
+            batch = []
+            batch_size = 0
+            for line in iter(lambda: file.readline(self.chunk_size), ''):
+                batch.append(line)
+                batch_size += len(line)
+                if batch_size >= self.chunk_size:
+                    yield ''.join(batch)
+                    batch = []
+                    batch_size = 0
+            if batch:
+                yield ''.join(batch)
+
+    @property
+    def _errors(self) -> str:
+        return 'strict' if self.checked else 'replace'
+
+    def close(self):
+        if self._chunks is not None:
+            self._chunks.close()  # Releases its view of the mapping
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
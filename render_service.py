@@ -0,0 +1,393 @@
+"""
+Runs the PDF generator as a long-lived local service.
+
+Jobs are submitted over HTTP on localhost, or on a Unix socket, and queued. A few
+of them run at a time in one process, which keeps fpdf, the parsed configuration,
+font metrics, compiled filters, render cache indexes and a pool of worker processes
+warm between jobs, so small directories are done in a fraction of a second.
+
+Usage:
+    python render_service.py --port 8765
+    python render_service.py --socket /tmp/pdf_generator.sock
+
+API (JSON):
+    POST   /jobs       {"directory": "...", "options": ["-t", ".py"], "name": "..."}
+                       Queues a job and returns it (202). "directory" can also be an archive
+                       or "repository@revision", and "options" are those of main.py
+                       but for --batch, --watch and the logging ones; the outputs go
+                       to <output>/<name>, the directory name by default.
+    GET    /jobs       Lists the jobs, oldest first.
+    GET    /jobs/<id>  Returns a job. Its "status" is queued, running, succeeded, failed
+                       or cancelled.
+    DELETE /jobs/<id>  Cancels a job.
+    GET    /health     Returns the number of queued and running jobs.
+
+Requests must be sent to 127.0.0.1:<port> or localhost:<port>, as their Host header says,
+and jobs posted with Content-Type: application/json, so that web pages cannot submit jobs.
+
+For example: curl -H 'Content-Type: application/json' -d '{"directory": "/src/app"}' http://127.0.0.1:8765/jobs
+"""
+
+import argparse
+import itertools
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from main import create_cancel_token, create_generators, report_outputs, submit_outputs, write_profile
+from pdf_generator.pdf_generator import create_shared_pool
+from utils.argparse_utils import RaisingArgumentParser, parse_arguments, positive_int
+from utils.cancellation import OperationCancelled
+from utils.logging_utils import configure_logging, logger, shutdown_logging
+from utils.profiler import NULL_PROFILER, Profiler
+from utils.sources import close_sources, is_source, open_source
+
+DEFAULT_PORT = 8765
+
+# Finished jobs are kept for status polling until there are more than this many
+MAX_FINISHED_JOBS = 1000
+
+# Options of main.py that the service does not honour; jobs setting them are refused
+CLI_ONLY_OPTIONS = {'batch': '--batch', 'watch': '--watch', 'watch_debounce': '--watch-debounce',
+                    'watch_poll': '--watch-poll', 'log_sync': '--log-sync', 'log_sample': '--log-sample'}
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is full."""
+
+class Job:
+    """A directory whose outputs the service generates, with its options and status."""
+
+    def __init__(self, job_id: str, directory: str, name: str, options: List[str], args: argparse.Namespace):
+        self.id = job_id
+        self.directory = directory
+        self.name = name
+        self.options = options
+        self.args = args
+        self.status = QUEUED
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.errors = {}  # Error message of each task, None for the tasks that succeeded
+        self.error: Optional[str] = None
+        self.cancel_token = None  # Created when the job starts, so the time budget starts then too
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'directory': self.directory,
+            'name': self.name,
+            'options': self.options,
+            'status': self.status,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'seconds': round(self.finished - self.started, 6) if self.finished and self.started else None,
+            'tasks': self.errors,
+            'error': self.error,
+        }
+
+class RenderService:
+    """Queues jobs and runs up to ``concurrency`` of them at a time.
+
+    Jobs given ``-j`` greater than 1 render their files in a pool of ``workers``
+    processes shared by all jobs; other jobs render in the service process. Jobs
+    writing to the same output folder run one after the other.
+    """
+
+    def __init__(self, output_folder_path: str, workers: int = 1, concurrency: int = 1, max_queue: int = 100):
+        self.output_folder_path = output_folder_path
+        self.concurrency = concurrency
+        self.pool = create_shared_pool(workers)
+        self.workers = workers
+        # Each job runs its PDF, structure and manifest tasks side by side
+        self.task_executor = ThreadPoolExecutor(max_workers=3 * concurrency, thread_name_prefix='render-task')
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._output_locks = {}
+        self._ids = itertools.count(1)
+        self._runners = [threading.Thread(target=self._run_jobs, name=f'render-job-{number}', daemon=True)
+                         for number in range(concurrency)]
+        for runner in self._runners:
+            runner.start()
+
+    def submit(self, request: dict) -> Job:
+        """Queues a job from its JSON request. Raises ValueError for an invalid request and QueueFull."""
+        if not isinstance(request, dict) or not isinstance(request.get('directory'), str):
+            raise ValueError("The request must be an object with a 'directory'")
+        directory = os.path.abspath(os.path.expanduser(request['directory']))
+        if not is_source(directory):
+            raise ValueError(f"Invalid directory path: {directory}")
+        options = request.get('options', [])
+        if not isinstance(options, list) or not all(isinstance(option, str) for option in options):
+            raise ValueError("'options' must be a list of strings")
+        try:
+            args = parse_arguments([directory] + options, RaisingArgumentParser)
+        except SystemExit:  # --help and --version print and exit even with a raising parser
+            raise ValueError(f"Invalid options: {' '.join(options)}")
+        defaults = parse_arguments([directory], RaisingArgumentParser)
+        unsupported = [flag for dest, flag in CLI_ONLY_OPTIONS.items() if getattr(args, dest) != getattr(defaults, dest)]
+        if unsupported:
+            raise ValueError(f"Options not supported by the render service: {' '.join(unsupported)}")
+        name = request.get('name') or open_source(directory).name
+        if not isinstance(name, str) or os.path.basename(name) != name or name in ('.', '..'):
+            raise ValueError(f"Invalid output name: {name}")
+
+        with self._lock:
+            job = Job(str(next(self._ids)), directory, name, options, args)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"The queue is full ({self.queue.maxsize} jobs)")
+            self.jobs[job.id] = job
+            self._forget_finished_jobs()
+        logger.info(f"Queued job {job.id}: {directory} -> {name}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancels a queued or running job. Returns None if there is no such job."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished = time.time()
+            elif job.status == RUNNING:
+                job.cancel_token.cancel('Cancelled through the render service.')
+        return job
+
+    def health(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {'status': 'ok', 'queued': statuses.count(QUEUED), 'running': statuses.count(RUNNING),
+                'workers': self.workers, 'concurrency': self.concurrency}
+
+    def shutdown(self):
+        """Cancels the running jobs and stops the worker pool."""
+        for job in self.list_jobs():
+            self.cancel(job.id)
+        for _ in self._runners:
+            self.queue.put(None)
+        for runner in self._runners:
+            runner.join()
+        self.task_executor.shutdown()
+        self.pool.shutdown(cancel_futures=True)
+        close_sources()
+
+    def _forget_finished_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status not in (QUEUED, RUNNING)]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run_jobs(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.status == CANCELLED:
+                    continue
+                # Shared by the jobs queued or running for this output name, and dropped after the last one
+                output_lock = self._output_locks.setdefault(job.name, [threading.Lock(), 0])
+                output_lock[1] += 1
+            try:
+                with output_lock[0]:
+                    with self._lock:
+                        if job.status == CANCELLED:
+                            continue
+                        job.status = RUNNING
+                        job.started = time.time()
+                        job.cancel_token = create_cancel_token(job.args)
+                    try:
+                        self._run_job(job)
+                    except Exception as e:
+                        logger.error(f"Job {job.id} failed: {e}")
+                        logger.exception(e)
+                        job.error = str(e)
+            finally:
+                with self._lock:
+                    output_lock[1] -= 1
+                    if not output_lock[1]:
+                        del self._output_locks[job.name]
+                    if job.status == RUNNING:
+                        if job.cancel_token.cancelled and not job.cancel_token.budget_exceeded:
+                            job.status = CANCELLED
+                        else:
+                            job.status = FAILED if job.error or any(job.errors.values()) else SUCCEEDED
+                        job.finished = time.time()
+            if job.started is not None:
+                logger.info(f"Job {job.id} {job.status} in {job.finished - job.started:.3f} s")
+
+    def _run_job(self, job: Job):
+        args = job.args
+        output_subdir_path = os.path.join(self.output_folder_path, job.name)
+        os.makedirs(output_subdir_path, exist_ok=True)
+        cache_dir = os.path.join(self.output_folder_path, f"{job.name}.cache") if args.incremental else None
+        profiler = Profiler(cprofile=args.cprofile) if args.profile or args.cprofile else NULL_PROFILER
+        pdf_generator, directory_structure_generator = create_generators(
+            job.directory, output_subdir_path, args, profiler, executor=self.pool if args.jobs > 1 else None
+        )
+        try:
+            try:
+                manifest = pdf_generator.scan_directory(include_hidden=args.include_hidden,
+                                                        cancel_token=job.cancel_token)
+            except OperationCancelled as e:
+                job.error = str(e)
+                return
+            futures = submit_outputs(self.task_executor, args, pdf_generator, directory_structure_generator, manifest,
+                                     cache_dir, job.cancel_token)
+            wait(list(futures.values()))
+            job.errors = report_outputs(futures, logger, f'Job {job.id}: ')
+            write_profile(profiler, output_subdir_path, pdf_generator.source.name, args, logger)
+        finally:
+            # The index of an archive or revision stays cached for the next job; its open file or git process does not
+            pdf_generator.source.close()
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'PDFGeneratorRenderService/1'
+
+    @property
+    def service(self) -> RenderService:
+        return self.server.service
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'unix-socket'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def send_json(self, status: int, value):
+        body = json.dumps(value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def is_allowed(self) -> bool:
+        """Refuses requests that a web page could have sent, answering them with an error.
+
+        Over TCP, the Host header must name the loopback address the service listens
+        on, which a DNS-rebound page cannot send. Jobs must be posted as JSON, which a
+        cross-site page cannot send without a preflight request the service never answers.
+        """
+        if self.client_address:  # Not a Unix socket, which no browser can reach
+            port = self.server.server_address[1]
+            if self.headers.get('Host') not in (f'127.0.0.1:{port}', f'localhost:{port}'):
+                self.send_json(403, {'error': f"Invalid Host header: {self.headers.get('Host')}"})
+                return False
+        if self.command == 'POST' and self.headers.get_content_type() != 'application/json':
+            self.send_json(415, {'error': "Jobs must be posted with Content-Type: application/json"})
+            return False
+        return True
+
+    def job_id(self) -> Optional[str]:
+        parts = self.path.rstrip('/').split('/')
+        return parts[2] if len(parts) == 3 and parts[1] == 'jobs' else None
+
+    def do_GET(self):
+        if not self.is_allowed():
+            return
+        if self.path == '/health':
+            self.send_json(200, self.service.health())
+        elif self.path.rstrip('/') == '/jobs':
+            self.send_json(200, [job.to_dict() for job in self.service.list_jobs()])
+        else:
+            job = self.service.get(self.job_id()) if self.job_id() else None
+            if job is None:
+                self.send_json(404, {'error': f"Not found: {self.path}"})
+            else:
+                self.send_json(200, job.to_dict())
+
+    def do_POST(self):
+        if not self.is_allowed():
+            return
+        if self.path.rstrip('/') != '/jobs':
+            self.send_json(404, {'error': f"Not found: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = self.service.submit(json.loads(self.rfile.read(length) or b'null'))
+        except QueueFull as e:
+            self.send_json(503, {'error': str(e)})
+        except ValueError as e:  # Also raised for malformed JSON
+            self.send_json(400, {'error': str(e)})
+        else:
+            self.send_json(202, job.to_dict())
+
+    def do_DELETE(self):
+        if not self.is_allowed():
+            return
+        job = self.service.cancel(self.job_id()) if self.job_id() else None
+        if job is None:
+            self.send_json(404, {'error': f"Not found: {self.path}"})
+        else:
+            self.send_json(200, job.to_dict())
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def create_server(service: RenderService, port: int = DEFAULT_PORT, socket_path: Optional[str] = None):
+    """Creates the HTTP server of a service, on localhost or on a Unix socket. Port 0 picks a free port."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Left behind by a service that did not stop cleanly
+        server = _UnixHTTPServer(socket_path, _RequestHandler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), _RequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+def parse_service_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Run the PDF generator as a local service that accepts jobs over HTTP.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on at 127.0.0.1 (default: {DEFAULT_PORT})')
+    parser.add_argument('--socket', metavar='PATH', help='Listen on this Unix socket instead of a port')
+    parser.add_argument('--workers', type=positive_int, default=os.cpu_count() or 1, help='Worker processes shared by the jobs run with -j')
+    parser.add_argument('--concurrency', type=positive_int, default=2, help='Number of jobs run at the same time')
+    parser.add_argument('--max-queue', type=positive_int, default=100, help='Number of jobs that can wait; more are refused')
+    parser.add_argument('--output', help='Folder the outputs are written to (default: output next to this script)')
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_service_arguments()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    logs_dir = os.path.join(script_dir, 'logs')
+    os.makedirs(logs_dir, exist_ok=True)
+    configure_logging(os.path.join(logs_dir, 'pdf_generator.log'), queued=True)
+
+    service = RenderService(args.output or os.path.join(script_dir, 'output'), args.workers, args.concurrency,
+                            args.max_queue)
+    server = create_server(service, args.port, args.socket)
+    logger.verbose(f"Render service listening on {args.socket or f'http://127.0.0.1:{server.server_address[1]}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.verbose("Stopping the render service...")
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        shutdown_logging()
+
+if __name__ == '__main__':
+    main()
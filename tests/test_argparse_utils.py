@@ -134,5 +134,79 @@ class TestArgparseUtils(unittest.TestCase):
             self.assertTrue(args.verbose)
             self.assertTrue(args.include_hidden)
 
+    def test_jobs_argument(self):
+        with patch("sys.argv", ["script_name", "test_directory"]):
+            self.assertEqual(parse_arguments().jobs, 1)
+        with patch("sys.argv", ["script_name", "test_directory", "--jobs", "4"]):
+            self.assertEqual(parse_arguments().jobs, 4)
+        with self.assertRaises(SystemExit):
+            with patch("sys.argv", ["script_name", "test_directory", "-j", "0"]):
+                parse_arguments()
+
+    def test_exclude_patterns_and_gitignore(self):
+        with patch("sys.argv", ["script_name", "test_directory", "-x", "*.min.js", "build/", "-x", "**/fixtures", "-g"]):
+            args = parse_arguments()
+            self.assertEqual(args.exclude_patterns, ["*.min.js", "build/", "**/fixtures"])
+            self.assertTrue(args.gitignore)
+
+    def test_budget_arguments(self):
+        with patch("sys.argv", ["script_name", "test_directory"]):
+            args = parse_arguments()
+            self.assertIsNone(args.timeout)
+            self.assertIsNone(args.max_file_bytes)
+        with patch("sys.argv", ["script_name", "test_directory", "--timeout", "1.5", "--max-bytes", "1000",
+                                "--file-timeout", "0.5", "--max-file-bytes", "200"]):
+            args = parse_arguments()
+            self.assertEqual((args.timeout, args.max_bytes, args.file_timeout, args.max_file_bytes), (1.5, 1000, 0.5, 200))
+        with self.assertRaises(SystemExit):
+            with patch("sys.argv", ["script_name", "test_directory", "--timeout", "0"]):
+                parse_arguments()
+
+    def test_compression_argument(self):
+        with patch("sys.argv", ["script_name", "test_directory"]):
+            self.assertIsNone(parse_arguments().compression)  # Taken from config.json
+        with patch("sys.argv", ["script_name", "test_directory", "--compression", "small"]):
+            self.assertEqual(parse_arguments().compression, "small")
+        with self.assertRaises(SystemExit):
+            with patch("sys.argv", ["script_name", "test_directory", "--compression", "tiny"]):
+                parse_arguments()
+
+    def test_split_arguments(self):
+        with patch("sys.argv", ["script_name", "test_directory", "--split", "pages", "--volume-size", "500"]):
+            args = parse_arguments()
+            self.assertEqual((args.split, args.volume_size), ("pages", 500))
+        with self.assertRaises(SystemExit):
+            with patch("sys.argv", ["script_name", "test_directory", "--split", "directory", "--volume-size", "500"]):
+                parse_arguments()
+
+    def test_structure_format_argument(self):
+        with patch("sys.argv", ["script_name", "test_directory"]):
+            self.assertEqual(parse_arguments().structure_format, "json")
+        with patch("sys.argv", ["script_name", "test_directory", "--structure-format", "tree"]):
+            self.assertEqual(parse_arguments().structure_format, "tree")
+
+    def test_manifest_arguments(self):
+        with patch("sys.argv", ["script_name", "test_directory", "--manifest-hashes"]):
+            args = parse_arguments()
+            self.assertFalse(args.manifest)
+            self.assertTrue(args.manifest_hashes)
+
+    def test_batch_argument(self):
+        with patch("sys.argv", ["script_name", "--batch", "nightly.txt", "-j", "8"]):
+            args = parse_arguments()
+            self.assertEqual((args.batch, args.directory, args.jobs), ("nightly.txt", None, 8))
+        with self.assertRaises(SystemExit):
+            with patch("sys.argv", ["script_name", "test_directory", "--batch", "nightly.txt"]):
+                parse_arguments()
+
+    def test_watch_arguments(self):
+        with patch("sys.argv", ["script_name", "test_directory", "--watch", "--watch-debounce", "0.5"]):
+            args = parse_arguments()
+            self.assertEqual((args.watch, args.watch_debounce, args.watch_poll), (True, 0.5, None))
+        for extra in (["--split", "directory"], ["--watch-debounce", "0"]):
+            with self.subTest(extra=extra), self.assertRaises(SystemExit):
+                with patch("sys.argv", ["script_name", "test_directory", "--watch"] + extra):
+                    parse_arguments()
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,80 @@
+import unittest
+import json
+import os
+import tempfile
+
+from main import run_batch
+from utils.argparse_utils import parse_arguments
+from utils.batch_file import BatchEntry, read_batch_file
+from utils.logging_utils import logger
+
+class TestBatchFile(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def write(self, file_name, content):
+        path = os.path.join(self.test_dir.name, file_name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_text_file(self):
+        path = self.write("nightly.txt", "# Repositories\nrepos/api\n\n  repos/web/  \n/srv/tools\n")
+        self.assertEqual(read_batch_file(path), [
+            BatchEntry(os.path.join(self.test_dir.name, "repos", "api"), "api"),
+            BatchEntry(os.path.join(self.test_dir.name, "repos", "web"), "web"),
+            BatchEntry(os.path.normpath("/srv/tools"), "tools"),
+        ])
+
+    def test_json_file(self):
+        path = self.write("nightly.json", json.dumps(["a/app", {"directory": "b/app", "name": "app-b"}]))
+        self.assertEqual([entry.name for entry in read_batch_file(path)], ["app", "app-b"])
+
+    def test_invalid_batches(self):
+        for file_name, content in (("same.txt", "a/app\nb/app\n"),
+                                   ("object.json", json.dumps({"directory": "a"})),
+                                   ("nameless.json", json.dumps([{"name": "a"}]))):
+            with self.subTest(file_name=file_name):
+                with self.assertRaises(ValueError):
+                    read_batch_file(self.write(file_name, content))
+
+class TestRunBatch(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def make_directory(self, name, files):
+        directory = os.path.join(self.test_dir.name, name)
+        os.makedirs(directory)
+        for file_name, content in files.items():
+            with open(os.path.join(directory, file_name), 'w', encoding='utf-8') as f:
+                f.write(content)
+        return directory
+
+    def test_run_batch(self):
+        small = self.make_directory("small", {"app.py": "print('small')\n"})
+        large = self.make_directory("large", {"lib.py": "print('large')\n" * 200, "README.md": "# Large\n"})
+        batch_path = os.path.join(self.test_dir.name, "batch.txt")
+        with open(batch_path, 'w', encoding='utf-8') as f:
+            f.write(f"{small}\n{os.path.join(self.test_dir.name, 'missing')}\n{large}\n")
+        output_dir = os.path.join(self.test_dir.name, "output")
+
+        args = parse_arguments(['--batch', batch_path, '--timeout', '60'])
+        with self.assertLogs(logger, level='INFO') as logs:
+            self.assertFalse(run_batch(args, output_dir, logger))  # The missing directory fails the batch
+
+        for name in ("small", "large"):
+            self.assertTrue(os.path.isfile(os.path.join(output_dir, name, f"{name} dir content.pdf")))
+            self.assertTrue(os.path.isfile(os.path.join(output_dir, name, f"{name} directory content.txt")))
+        self.assertFalse(os.path.exists(os.path.join(output_dir, "missing")))
+        started = [message.split(': rendering')[0].rsplit(':', 1)[-1] for message in logs.output if ': rendering' in message]
+        self.assertEqual(started, ["large", "small"])  # Largest first
+        self.assertTrue(any("Invalid directory path" in message and "missing" in message for message in logs.output))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from benchmarks.benchmark import STAGES, run_stage
+from benchmarks.synthetic_tree import build_tree
+
+class TestSyntheticTree(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_trees_are_reproducible(self):
+        first = build_tree(os.path.join(self.test_dir, "first"), "mixed", scale=0.05)
+        second = build_tree(os.path.join(self.test_dir, "second"), "mixed", scale=0.05)
+        self.assertEqual(first, second)
+        self.assertGreater(first.binary_files, 0)
+        self.assertEqual(first.files, first.text_files + first.binary_files)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            build_tree(self.test_dir, "nonexistent")
+
+    def test_run_stages(self):
+        tree_dir = os.path.join(self.test_dir, "tree")
+        output_dir = os.path.join(self.test_dir, "output")
+        os.makedirs(output_dir)
+        build_tree(tree_dir, "wide", scale=0.02)
+
+        for stage in STAGES:
+            result = run_stage(stage, tree_dir, output_dir)
+            self.assertGreater(result['seconds'], 0)
+        self.assertGreater(run_stage('generate_pdf', tree_dir, output_dir)['output_bytes'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
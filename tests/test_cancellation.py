@@ -0,0 +1,73 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+
+from directory_structure_generator.directory_structure import print_directory_structure
+from utils.cancellation import BudgetExceeded, CancellationToken, OperationCancelled
+from utils.directory_scanner import DirectoryScanner
+
+class TestCancellationToken(unittest.TestCase):
+    def test_cancel(self):
+        cancel_token = CancellationToken()
+        cancel_token.raise_if_cancelled()
+        cancel_token.cancel("Stop.")
+        with self.assertRaises(OperationCancelled) as context:
+            cancel_token.raise_if_cancelled()
+        self.assertNotIsInstance(context.exception, BudgetExceeded)
+        self.assertEqual(str(context.exception), "Stop.")
+
+    def test_time_budget(self):
+        cancel_token = CancellationToken(deadline=time.time() - 1)
+        with self.assertRaises(BudgetExceeded):
+            cancel_token.raise_if_cancelled()
+        self.assertTrue(cancel_token.cancelled)
+
+    def test_byte_budget(self):
+        cancel_token = CancellationToken(max_bytes=100)
+        cancel_token.add_bytes(60)
+        with self.assertRaises(BudgetExceeded):
+            cancel_token.add_bytes(60)
+
+    def test_per_file_budgets(self):
+        cancel_token = CancellationToken(max_file_bytes=10, file_timeout=5)
+        self.assertTrue(cancel_token.exceeds_file_size(11))
+        self.assertFalse(cancel_token.exceeds_file_size(10))
+        self.assertFalse(cancel_token.file_timed_out(time.time()))
+        self.assertTrue(cancel_token.file_timed_out(time.time() - 10))
+
+    def test_settings_recreate_the_budgets(self):
+        cancel_token = CancellationToken(timeout=60, max_file_bytes=10)
+        copy = CancellationToken(**cancel_token.to_settings())
+        self.assertEqual(copy.deadline, cancel_token.deadline)
+        self.assertEqual(copy.max_file_bytes, 10)
+
+class TestCancelledScans(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.test_dir, "subdir"))
+        with open(os.path.join(self.test_dir, "subdir", "file.txt"), 'w') as f:
+            f.write("content")
+        self.cancel_token = CancellationToken()
+        self.cancel_token.cancel()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_scan_stops(self):
+        with self.assertRaises(OperationCancelled):
+            DirectoryScanner(self.test_dir, cancel_token=self.cancel_token).scan()
+
+        manifest = DirectoryScanner(self.test_dir, cancel_token=self.cancel_token).scan_in_background()
+        manifest.wait()
+        self.assertEqual([entry.name for entry in manifest], ["subdir"])
+
+    def test_directory_structure_stops(self):
+        manifest = DirectoryScanner(self.test_dir).scan()
+        with self.assertRaises(OperationCancelled):
+            print_directory_structure(self.test_dir, "tests/test_ignore_folders.json", manifest,
+                                      cancel_token=self.cancel_token)
+
+if __name__ == "__main__":
+    unittest.main()
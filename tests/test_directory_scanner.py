@@ -0,0 +1,207 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from utils.directory_scanner import DirectoryScanner
+from utils.sources import DirectorySource
+from utils.file_sniffer import TextEncoding, detect_encoding, guess_mime_type, sniff_binary_type
+from directory_structure_generator.directory_structure import print_directory_structure
+from pdf_generator.pdf_generator import PDFGenerator
+
+class TestDirectoryScanner(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.create_test_file("file1.txt", "This is a test file.")
+        self.create_test_file(os.path.join("subdir", "subfile.txt"), "Content of subfile.")
+        self.create_test_file(os.path.join("subdir", "nested", "nested_file.py"), "print('nested')")
+        self.create_test_file(os.path.join("ignore_this", "ignored_file.txt"), "This file should be ignored.")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_test_file(self, file_name, content):
+        """Helper function to create test files."""
+        file_path = os.path.join(self.test_dir, file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_scan_lists_children_after_their_parent(self):
+        manifest = DirectoryScanner(self.test_dir).scan()
+        relative_paths = [entry.relative_path for entry in manifest]
+
+        self.assertLess(relative_paths.index("subdir"), relative_paths.index(os.path.join("subdir", "subfile.txt")))
+        nested = relative_paths.index(os.path.join("subdir", "nested"))
+        self.assertEqual(relative_paths[nested + 1], os.path.join("subdir", "nested", "nested_file.py"))
+
+    def test_scan_records_stat_data(self):
+        manifest = DirectoryScanner(self.test_dir).scan()
+        entry = next(entry for entry in manifest if entry.name == "file1.txt")
+        self.assertTrue(entry.is_file)
+        self.assertEqual(entry.depth, 0)
+        self.assertEqual(entry.size, len("This is a test file."))
+        self.assertEqual(entry.mtime_ns, os.stat(entry.path).st_mtime_ns)
+
+    def test_scan_prunes_ignored_folders(self):
+        manifest = DirectoryScanner(self.test_dir, ["ignore_this"]).scan()
+        names = [entry.name for entry in manifest]
+        self.assertNotIn("ignore_this", names)
+        self.assertNotIn("ignored_file.txt", names)
+
+    def test_background_scan_yields_the_same_entries(self):
+        scanner = DirectoryScanner(self.test_dir, ["ignore_this"])
+        manifest = scanner.scan_in_background()
+        self.assertEqual(list(manifest), list(scanner.scan()))
+        manifest.wait()
+        self.assertTrue(manifest.complete)
+
+    def test_background_scan_errors_reach_the_consumers(self):
+        class FailingSource(DirectorySource):
+            def list_dir(self, relative_path, depth):
+                if relative_path == "subdir":
+                    raise OSError("disk went away")
+                return super().list_dir(relative_path, depth)
+
+        manifest = DirectoryScanner(self.test_dir, source=FailingSource(self.test_dir)).scan_in_background()
+        found = []
+        with self.assertRaises(OSError):
+            for entry in manifest:
+                found.append(entry.relative_path)
+        self.assertIn("subdir", found)  # The entries found before the error come first
+        with self.assertRaises(OSError):
+            manifest.wait()
+
+        # A top directory that cannot be read is an error, not an empty tree
+        missing = os.path.join(self.test_dir, "missing")
+        with self.assertRaises(FileNotFoundError):
+            DirectoryScanner(missing).scan()
+        result = PDFGenerator(missing, self.test_dir).generate_pdf(False, None)
+        self.assertIsInstance(result, FileNotFoundError)
+
+    def test_manifest_is_shared_between_outputs(self):
+        pdf_generator = PDFGenerator(self.test_dir, self.test_dir, ignore_file_path="tests/test_ignore_folders.json")
+        manifest = pdf_generator.scan_directory()
+
+        self.assertEqual(pdf_generator.get_total_file_count(manifest=manifest), 3)
+
+        structure = print_directory_structure(self.test_dir, "tests/test_ignore_folders.json", manifest)
+        self.assertEqual(sorted(item["name"] for item in structure), ["file1.txt", "subdir"])
+        subdir = next(item for item in structure if item["name"] == "subdir")
+        self.assertEqual(sorted(item["name"] for item in subdir["children"]), ["nested", "subfile.txt"])
+
+    def test_update_manifest_rescans_only_the_changed_paths(self):
+        scanner = DirectoryScanner(self.test_dir, ["ignore_this"])
+        manifest = scanner.scan()
+        self.create_test_file("file1.txt", "Changed, and longer than before.")
+        self.create_test_file(os.path.join("added", "deep", "new.txt"), "New.")
+        self.create_test_file(os.path.join("ignore_this", "another.txt"), "Still ignored.")
+        shutil.rmtree(os.path.join(self.test_dir, "subdir", "nested"))
+
+        changed, structure_changed = scanner.update_manifest(
+            manifest, ["file1.txt", "added", os.path.join("ignore_this", "another.txt"), os.path.join("subdir", "nested")]
+        )
+        self.assertEqual(changed, {"file1.txt", os.path.join("added", "deep", "new.txt"),
+                                   os.path.join("subdir", "nested", "nested_file.py")})
+        self.assertTrue(structure_changed)
+        # The same entries as a fresh scan, with every child after its parent
+        self.assertEqual(sorted(manifest.entries), sorted(scanner.scan().entries))
+        relative_paths = [entry.relative_path for entry in manifest]
+        self.assertEqual(relative_paths.index(os.path.join("added", "deep")), relative_paths.index("added") + 1)
+
+        self.assertEqual(scanner.update_manifest(manifest, ["file1.txt"]), (set(), False))
+        self.create_test_file(os.path.join("subdir", "subfile.txt"), "Edited in place.")
+        self.assertEqual(scanner.update_manifest(manifest), ({os.path.join("subdir", "subfile.txt")}, False))
+
+    def test_update_manifest_keeps_the_path_index(self):
+        for index in range(50):
+            self.create_test_file(os.path.join(f"dir{index % 5}", f"file{index}.txt"), "Content.")
+        scanner = DirectoryScanner(self.test_dir, ["ignore_this"])
+        manifest = scanner.scan()
+
+        def check_index():
+            for position, entry in enumerate(manifest.entries):
+                self.assertEqual(manifest.index_of(entry.relative_path), position)
+
+        # Edits in place do not move entries, and splices move the indexed positions without indexing them again
+        self.assertIsNotNone(manifest.index_of("file1.txt"))
+        positions = manifest._positions
+        self.create_test_file(os.path.join("dir3", "file8.txt"), "Edited.")
+        scanner.update_manifest(manifest, [os.path.join("dir3", "file8.txt")])
+
+        shutil.rmtree(os.path.join(self.test_dir, "dir1"))
+        self.create_test_file(os.path.join("dir2", "new.txt"), "New.")
+        self.create_test_file(os.path.join("dir0", "sub", "newer.txt"), "Newer.")
+        os.remove(os.path.join(self.test_dir, "dir4", "file9.txt"))
+        entries = list(manifest.entries)
+        splices = []
+        scanner.update_manifest(manifest, ["dir1", os.path.join("dir2", "new.txt"), os.path.join("dir0", "sub"),
+                                           os.path.join("dir4", "file9.txt")], splices)
+        self.assertIs(manifest._positions, positions)
+        check_index()
+        # The splices it reports, made in order, turn the old entries into the new ones
+        for start, removed, added in splices:
+            self.assertEqual(entries[start:start + len(removed)], removed)
+            entries[start:start + len(removed)] = added
+        self.assertEqual(entries, manifest.entries)
+        self.assertEqual(len(splices), 4)
+        self.assertIsNone(manifest.index_of(os.path.join("dir1", "file1.txt")))
+        self.assertEqual(sorted(manifest.entries), sorted(scanner.scan().entries))
+
+class TestFileSniffer(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_bytes(self, file_name, content):
+        file_path = os.path.join(self.test_dir, file_name)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        return file_path
+
+    def test_text_files_are_not_binary(self):
+        self.assertIsNone(sniff_binary_type(self.write_bytes("plain.py", b"print('hello')\n")))
+        self.assertIsNone(sniff_binary_type(self.write_bytes("utf8.txt", "caf\u00e9 \u6f22\u5b57\n".encode('utf-8'))))
+        self.assertIsNone(sniff_binary_type(self.write_bytes("empty.txt", b"")))
+        self.assertIsNone(sniff_binary_type(self.write_bytes("cp1252.txt", "Gr\u00fc\u00dfe, sch\u00f6n\n".encode('cp1252') * 50)))
+        self.assertIsNone(sniff_binary_type(self.write_bytes("cp1251.txt", "\u041f\u0440\u0438\u0432\u0435\u0442\n".encode('cp1251') * 50)))
+
+    def test_cut_multibyte_character_is_not_an_error(self):
+        content = "\u6f22".encode('utf-8') * 5000  # 15000 bytes, so the sample ends mid-character
+        self.assertIsNone(sniff_binary_type(self.write_bytes("cjk.txt", content)))
+
+    def test_binary_files_are_detected(self):
+        self.assertEqual(sniff_binary_type(self.write_bytes("archive.jar", b"PK\x03\x04rest")), 'application/zip')
+        self.assertEqual(sniff_binary_type(self.write_bytes("nul.dat", b"abc\x00def")), 'application/octet-stream')
+        self.assertIsNotNone(sniff_binary_type(self.write_bytes("noise.bin", bytes(range(128, 256)) * 4)))
+        # A text extension is not taken as the type of a file that is not text
+        self.assertEqual(sniff_binary_type(self.write_bytes("noise.txt", bytes(range(1, 32)) * 8)), 'application/octet-stream')
+
+    def test_utf16_and_utf32_files_are_not_binary(self):
+        text = "caf\u00e9 \u6f22\u5b57 print('hello')\n" * 10
+        for encoding in ('utf-16', 'utf-16-be', 'utf-32'):
+            with self.subTest(encoding=encoding):
+                content = text.encode(encoding)
+                if encoding == 'utf-16-be':
+                    content = b'\xfe\xff' + content
+                self.assertIsNone(sniff_binary_type(self.write_bytes("wide.txt", content)))
+        # Mostly ASCII UTF-16 is recognized without a byte order mark too
+        self.assertIsNone(sniff_binary_type(self.write_bytes("wide.txt", text.encode('utf-16-le'))))
+
+    def test_detect_encoding(self):
+        self.assertEqual(detect_encoding(b"plain"), TextEncoding('utf-8'))
+        self.assertEqual(detect_encoding(b"\xef\xbb\xbfplain"), TextEncoding('utf-8', 3))
+        self.assertEqual(detect_encoding("plain".encode('utf-16')), TextEncoding('utf-16-le', 2))
+        self.assertEqual(detect_encoding("plain".encode('utf-32')), TextEncoding('utf-32-le', 4))
+        self.assertEqual(detect_encoding(("plain text " * 4).encode('utf-16-be')), TextEncoding('utf-16-be'))
+        self.assertEqual(detect_encoding("caf\u00e9 \u201cquoted\u201d".encode('cp1252')), TextEncoding('cp1252'))
+        self.assertEqual(detect_encoding(b"caf\xe9 \x81"), TextEncoding('latin-1'))
+
+    def test_guess_mime_type(self):
+        self.assertEqual(guess_mime_type("notes.TXT"), "text/plain")
+        self.assertIsNone(guess_mime_type("no_extension"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from directory_structure_generator.directory_structure import (
+    create_pdf_from_directory_structure, iter_structure_entries, iter_structure_tree, print_directory_structure,
+    write_directory_structure, write_directory_tree
+)
+from directory_structure_generator.directory_structure_generator import DirectoryStructureGenerator
+from utils.cancellation import CancellationToken, OperationCancelled
+from utils.directory_scanner import DirectoryScanner, ScanEntry
+
+IGNORE_FILE_PATH = "tests/test_ignore_folders.json"
+
+def entry(relative_path, is_dir=False):
+    return ScanEntry(relative_path, relative_path, os.path.basename(relative_path), relative_path.count(os.sep),
+                     is_dir, not is_dir, 0, 0)
+
+class TestDirectoryStructureWriter(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        for relative_path in ("file1.txt", os.path.join("subdir", "subfile.txt"),
+                              os.path.join("subdir", "nested", "deep.py"), os.path.join("subdir", "café.md"),
+                              os.path.join("ignore_this", "hidden.txt")):
+            path = os.path.join(self.test_dir, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write("content")
+        os.makedirs(os.path.join(self.test_dir, "empty", "empty_child"))
+        self.entries = [entry("src", True), entry(os.path.join("src", "main.py")), entry(os.path.join("src", "lib"), True),
+                        entry(os.path.join("src", "lib", "util.py")), entry("empty", True), entry("README.md")]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, entries, output_format, root_name='.'):
+        output = io.StringIO()
+        write_directory_structure(output, entries, output_format, root_name)
+        return output.getvalue()
+
+    def test_json_matches_nested_structure(self):
+        """Tests that the streamed JSON is exactly the indented dump of the nested structure."""
+        expected = json.dumps(print_directory_structure(self.test_dir, IGNORE_FILE_PATH), indent=4)
+        self.assertEqual(self.write(iter_structure_entries(self.test_dir, IGNORE_FILE_PATH), 'json'), expected)
+        self.assertNotIn("ignore_this", expected)
+        self.assertIn('"children": []', expected)
+        self.assertEqual(self.write([], 'json'), json.dumps([], indent=4))
+
+    def test_ndjson(self):
+        lines = [json.loads(line) for line in self.write(self.entries, 'ndjson').splitlines()]
+        self.assertEqual(lines[2], {"path": os.path.join("src", "lib"), "type": "dir"})
+        self.assertEqual([line["type"] for line in lines], ["dir", "file", "dir", "file", "dir", "file"])
+
+    def test_tree(self):
+        self.assertEqual(self.write(self.entries, 'tree', 'project'), "\n".join([
+            "project/",
+            "├── src/",
+            "│   ├── main.py",
+            "│   └── lib/",
+            "│       └── util.py",
+            "├── empty/",
+            "└── README.md",
+        ]) + "\n")
+        with self.assertRaises(ValueError):
+            self.write(self.entries, 'xml')
+
+    def test_streamed_tree(self):
+        """Tests that the tree written as the scan goes matches the one written from all the entries."""
+        # Whatever the listing order, the file is the last entry drawn in its folder
+        os.makedirs(os.path.join(self.test_dir, "subdir", "mixed", "ignore_this"))
+        with open(os.path.join(self.test_dir, "subdir", "mixed", "kept.txt"), 'w') as f:
+            f.write("content")
+        expected = self.write(list(iter_structure_entries(self.test_dir, IGNORE_FILE_PATH)), 'tree', 'project')
+        self.assertIn("└── kept.txt", expected)
+        for manifest in (None, DirectoryScanner(self.test_dir).scan()):
+            with self.subTest(manifest=manifest is not None):
+                output = io.StringIO()
+                write_directory_tree(output, iter_structure_tree(self.test_dir, IGNORE_FILE_PATH, manifest), 'project')
+                self.assertEqual(output.getvalue(), expected)
+
+    def test_generator_formats(self):
+        name = os.path.basename(self.test_dir)
+        output_dir = os.path.join(self.test_dir, "output")
+        os.makedirs(output_dir)
+        for output_format, file_name in (('json', f"{name} directory content.txt"),
+                                         ('ndjson', f"{name} directory content.ndjson"),
+                                         ('tree', f"{name} directory tree.txt")):
+            DirectoryStructureGenerator(self.test_dir, output_dir, IGNORE_FILE_PATH,
+                                        output_format=output_format).generate_directory_structure()
+            with open(os.path.join(output_dir, file_name), encoding='utf-8') as f:
+                self.assertIn("café" if output_format == 'tree' else "caf\\u00e9", f.read())
+
+    def test_live_structure_follows_splices(self):
+        """Tests that a live structure updated with the splices of a scan is the file written from the scan."""
+        output_dir = os.path.join(self.test_dir, "output")
+        os.makedirs(output_dir)
+        changes = [
+            # Added entries go after their siblings, so the last sibling before them is drawn again
+            (["file2.txt", os.path.join("subdir", "nested", "new.py"), os.path.join("ignore_this", "more.txt"),
+              os.path.join("added", "deep", "new.txt")], []),
+            ([], [os.path.join("subdir", "café.md"), "empty", os.path.join("added", "deep", "new.txt")]),
+            (["file1.txt"], []),  # Changed in place
+        ]
+        for output_format in ('json', 'ndjson', 'tree'):
+            with self.subTest(output_format=output_format):
+                scanner = DirectoryScanner(os.path.join(self.test_dir, "tree"))
+                shutil.copytree(os.path.join(self.test_dir, "subdir"), os.path.join(self.test_dir, "tree", "subdir"))
+                shutil.copytree(os.path.join(self.test_dir, "ignore_this"),
+                                os.path.join(self.test_dir, "tree", "ignore_this"))
+                os.makedirs(os.path.join(self.test_dir, "tree", "empty", "empty_child"))
+                shutil.copy(os.path.join(self.test_dir, "file1.txt"), os.path.join(self.test_dir, "tree"))
+                generator = DirectoryStructureGenerator(scanner.directory, output_dir, IGNORE_FILE_PATH,
+                                                        output_format=output_format)
+                manifest = scanner.scan()
+                live_structure = generator.start_live_structure(manifest)
+                for written, removed in changes:
+                    for relative_path in written:
+                        path = os.path.join(scanner.directory, relative_path)
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        with open(path, 'w') as f:
+                            f.write("changed content")
+                    for relative_path in removed:
+                        path = os.path.join(scanner.directory, relative_path)
+                        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+                    splices = []
+                    scanner.update_manifest(manifest, [path.split(os.sep)[0] if path.startswith("added") else path
+                                                       for path in written + removed], splices)
+                    live_structure.update(splices)
+                    with open(live_structure.output_file_path, encoding='utf-8') as f:
+                        updated = f.read()
+                    generator.generate_directory_structure(manifest)
+                    with open(live_structure.output_file_path, encoding='utf-8') as f:
+                        self.assertEqual(updated, f.read())
+                self.assertIn("new.py", updated)
+                self.assertNotIn("more.txt", updated)
+                shutil.rmtree(scanner.directory)
+
+    def test_cancelled_write_removes_file(self):
+        output_file_path = os.path.join(self.test_dir, "structure.txt")
+        manifest = DirectoryScanner(self.test_dir).scan()
+        cancel_token = CancellationToken()
+        cancel_token.cancel()
+        with self.assertRaises(OperationCancelled):
+            create_pdf_from_directory_structure(self.test_dir, output_file_path, IGNORE_FILE_PATH, manifest,
+                                                cancel_token=cancel_token)
+        self.assertFalse(os.path.exists(output_file_path))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+
+from utils.file_watcher import InotifyWatcher, PollingWatcher, create_watcher
+from utils.path_filter import PathFilter
+
+def inotify_available():
+    try:
+        InotifyWatcher(tempfile.gettempdir(), PathFilter()).close()
+        return True
+    except OSError:
+        return False
+
+class WatcherTests:
+    """Tests shared by the watchers; ``make_watcher`` creates the one under test."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.write("kept.txt", "Kept.")
+        self.write(os.path.join("src", "app.py"), "print('app')")
+        self.write(os.path.join("node_modules", "lib.js"), "lib()")
+        self.watcher = self.make_watcher(PathFilter(["node_modules"]))
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.test_dir)
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.test_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def wait_for(self, expected):
+        """Collects batches until ``expected`` paths were all reported, and returns every path reported."""
+        reported = set()
+        deadline = time.monotonic() + 10
+        while not expected <= reported and time.monotonic() < deadline:
+            batch = self.watcher.wait_for_changes(debounce=0.1, timeout=1)
+            if batch:
+                reported |= batch.paths
+        self.assertLessEqual(expected, reported)
+        return reported
+
+    def test_reports_changed_paths(self):
+        self.write(os.path.join("src", "app.py"), "print('changed')")
+        self.write(os.path.join("src", "new", "module.py"), "print('new')")
+        os.remove(os.path.join(self.test_dir, "kept.txt"))
+        self.write(os.path.join("node_modules", "lib.js"), "changed()")
+        reported = self.wait_for({os.path.join("src", "app.py"), os.path.join("src", "new"), "kept.txt"})
+        self.assertFalse(any(path.startswith("node_modules" + os.sep) for path in reported))
+
+        # Files in a directory created after the watch started are reported too
+        time.sleep(0.05)
+        self.write(os.path.join("src", "new", "module.py"), "print('changed')")
+        self.wait_for({os.path.join("src", "new", "module.py")})
+
+    def test_no_changes(self):
+        self.assertIsNone(self.watcher.wait_for_changes(debounce=0.05, timeout=0.3))
+
+class TestPollingWatcher(WatcherTests, unittest.TestCase):
+    def make_watcher(self, path_filter):
+        return PollingWatcher(self.test_dir, path_filter, interval=0.1)
+
+@unittest.skipUnless(inotify_available(), "inotify is not available")
+class TestInotifyWatcher(WatcherTests, unittest.TestCase):
+    def make_watcher(self, path_filter):
+        return InotifyWatcher(self.test_dir, path_filter)
+
+    def test_changes_are_debounced(self):
+        for index in range(5):
+            self.write(os.path.join("src", "app.py"), f"print({index})")
+            time.sleep(0.02)
+        batch = self.watcher.wait_for_changes(debounce=0.2, timeout=5)
+        self.assertEqual(batch.paths, {os.path.join("src", "app.py")})
+        self.assertIsNone(self.watcher.wait_for_changes(debounce=0.05, timeout=0.3))
+
+    def test_moved_directory_is_watched_under_its_new_name(self):
+        os.rename(os.path.join(self.test_dir, "src"), os.path.join(self.test_dir, "lib"))
+        self.wait_for({"src", "lib"})
+        self.write(os.path.join("lib", "app.py"), "print('moved')")
+        self.wait_for({os.path.join("lib", "app.py")})
+
+class TestCreateWatcher(unittest.TestCase):
+    def test_poll_interval_selects_polling(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            with create_watcher(test_dir, PathFilter(), poll_interval=0.5) as watcher:
+                self.assertIsInstance(watcher, PollingWatcher)
+                self.assertEqual(watcher.interval, 0.5)
+        finally:
+            shutil.rmtree(test_dir)
+
+if __name__ == "__main__":
+    unittest.main()
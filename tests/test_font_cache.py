@@ -0,0 +1,66 @@
+import unittest
+import glob
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from pypdf import PdfReader
+
+from pdf_generator import font_cache
+from pdf_generator.pdf_generator import PDFGenerator
+
+def find_test_font():
+    """Returns a TrueType font to test with: PDF_GENERATOR_TEST_FONT, or a common system font."""
+    candidates = [os.environ.get('PDF_GENERATOR_TEST_FONT', '')]
+    for pattern in ("/usr/share/fonts/**/DejaVuSansMono.ttf", "/usr/share/fonts/**/*.ttf",
+                    "/Library/Fonts/*.ttf", "C:/Windows/Fonts/consola.ttf"):
+        candidates.extend(glob.glob(pattern, recursive=True))
+    return next((path for path in candidates if path and os.path.isfile(path)), None)
+
+TEST_FONT = find_test_font()
+
+@unittest.skipUnless(TEST_FONT, "No TrueType font found; set PDF_GENERATOR_TEST_FONT to run these tests.")
+class TestUnicodeFonts(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, "font_cache")
+        self.source_dir = os.path.join(self.test_dir, "source")
+        os.makedirs(self.source_dir)
+        with open(os.path.join(self.source_dir, "unicode.py"), 'w', encoding='utf-8') as f:
+            f.write("# caf\u00e9 na\u00efve\nprint('Gr\u00f6\u00dfe')\n")
+        self.config_path = os.path.join(self.test_dir, "config.json")
+        with open(self.config_path, 'w') as f:
+            json.dump({"font_family": "Arial", "font_size": 10, "line_spacing": 10, "layout": "code",
+                       "code_font_family": "TestMono", "code_font_path": TEST_FONT,
+                       "font_cache_dir": self.cache_dir}, f)
+        font_cache._loaded_metrics.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        font_cache._loaded_metrics.clear()
+
+    def test_unicode_text_is_kept(self):
+        pdf_generator = PDFGenerator(self.source_dir, self.test_dir, config_path=self.config_path)
+        self.assertTrue(pdf_generator.generate_pdf(False, None))
+        pdf_text = PdfReader(os.path.join(self.test_dir, "source dir content.pdf")).pages[0].extract_text()
+        self.assertIn("caf\u00e9 na\u00efve", pdf_text)
+        self.assertIn("Gr\u00f6\u00dfe", pdf_text)
+
+    def test_metrics_are_cached_across_runs(self):
+        metrics = font_cache.load_font_metrics(TEST_FONT, self.cache_dir)
+        self.assertTrue(os.path.isfile(font_cache.font_cache_path(TEST_FONT, self.cache_dir)))
+
+        font_cache._loaded_metrics.clear()  # As in a new run
+        with patch.object(font_cache, 'parse_font_metrics', side_effect=AssertionError("font parsed again")):
+            self.assertEqual(font_cache.load_font_metrics(TEST_FONT, self.cache_dir)['name'], metrics['name'])
+
+    def test_missing_font_file(self):
+        with open(self.config_path, 'w') as f:
+            json.dump({"code_font_path": "missing.ttf"}, f)
+        with self.assertRaises(FileNotFoundError):
+            PDFGenerator(self.source_dir, self.test_dir, config_path=self.config_path)
+
+if __name__ == "__main__":
+    unittest.main()
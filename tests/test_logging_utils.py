@@ -3,7 +3,10 @@ import os
 import logging
 import tempfile
 
-from utils.logging_utils import configure_logging, VERBOSE
+from logging.handlers import QueueHandler
+
+from pdf_generator.pdf_generator import create_shared_pool
+from utils.logging_utils import configure_logging, file_logger, shutdown_logging, VERBOSE
 
 class TestLoggingConfiguration(unittest.TestCase):
     def setUp(self):
@@ -12,7 +15,8 @@ class TestLoggingConfiguration(unittest.TestCase):
         self.logger = configure_logging(self.log_file)  # Store the configured logger
 
     def tearDown(self):
-        # Close and remove ALL handlers
+        # Stop a queued configuration, then close and remove ALL handlers
+        shutdown_logging(summarize=False)
         for handler in self.logger.handlers[:]:
             handler.close()
             self.logger.removeHandler(handler)
@@ -79,4 +83,47 @@ class TestLoggingConfiguration(unittest.TestCase):
             configure_logging(temp_log2.name)
 
         # Assert that there are still 2 handlers (file and console)
-        self.assertEqual(len(self.logger.handlers), 2)
\ No newline at end of file
+        self.assertEqual(len(self.logger.handlers), 2)
+
+    def test_queued_logging(self):
+        logger = configure_logging(self.log_file, queued=True)
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], QueueHandler)
+
+        logger.info('Queued %s', 'message')
+        file_logger.info('Processed file: %s', 'a.txt')
+        shutdown_logging()
+        with open(self.log_file, 'r') as file:
+            log_content = file.read()
+        self.assertIn('Queued message', log_content)
+        self.assertIn('Processed file: a.txt', log_content)
+
+        # Once the listener is stopped, messages are written directly
+        self.assertEqual(len(logger.handlers), 2)
+        logger.info('After shutdown')
+        with open(self.log_file, 'r') as file:
+            self.assertIn('After shutdown', file.read())
+
+    def test_worker_processes_log_here(self):
+        configure_logging(self.log_file, queued=True)
+        with create_shared_pool(1) as pool:
+            pool.submit(file_logger.info, 'Skipping file %s in a worker', 'b.bin').result()
+        shutdown_logging()
+        with open(self.log_file, 'r') as file:
+            self.assertIn('Skipping file b.bin in a worker', file.read())
+
+    def test_sampled_per_file_messages(self):
+        configure_logging(self.log_file, queued=True, sample_every=3)
+        for index in range(7):
+            file_logger.info('Processed file: %d.txt', index)
+        file_logger.warning('Skipping file 8.txt')
+        shutdown_logging()
+        with open(self.log_file, 'r') as file:
+            log_content = file.read()
+        self.assertEqual([index for index in range(7) if f'Processed file: {index}.txt' in log_content], [0, 3, 6])
+        self.assertIn('Skipping file 8.txt', log_content)
+        self.assertIn('4 of 7 per-file messages were not logged (1 in 3 kept)', log_content)
+
+        # Reconfiguring starts counting again, without sampling unless asked
+        configure_logging(self.log_file)
+        self.assertEqual(file_logger.filters, [])
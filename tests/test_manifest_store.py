@@ -0,0 +1,128 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+from directory_structure_generator import manifest_store
+from directory_structure_generator.directory_structure_generator import DirectoryStructureGenerator
+from directory_structure_generator.manifest_store import diff_manifests
+from pdf_generator.pdf_generator import PDFGenerator
+from utils.cancellation import CancellationToken, OperationCancelled
+from utils.directory_scanner import DirectoryScanner
+
+IGNORE_FILE_PATH = "tests/test_ignore_folders.json"
+
+class TestManifestStore(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.tree_dir = os.path.join(self.test_dir, "tree")
+        self.output_dir = os.path.join(self.test_dir, "output")
+        os.makedirs(self.output_dir)
+        for relative_path in ("file1.txt", "script.py", os.path.join("subdir", "subfile.txt"),
+                              os.path.join("subdir", "nested", "deep.py"), os.path.join("ignore_this", "hidden.txt")):
+            self.write_file(relative_path, "content of " + relative_path)
+        self.generator = DirectoryStructureGenerator(self.tree_dir, self.output_dir, IGNORE_FILE_PATH)
+        self.manifest_path = os.path.join(self.output_dir, "tree manifest.sqlite")
+        self.previous_path = os.path.join(self.output_dir, "tree manifest.previous.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_file(self, relative_path, content):
+        path = os.path.join(self.tree_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def generate(self, hash_files=False):
+        pdf_generator = PDFGenerator(self.tree_dir, self.output_dir, ignore_file_path=IGNORE_FILE_PATH)
+        manifest = pdf_generator.scan_directory()
+        self.generator.generate_manifest(manifest, included_files=pdf_generator.iter_files_to_process(manifest, False, [".txt"]),
+                                         hash_files=hash_files)
+
+    def rows(self):
+        with sqlite3.connect(self.manifest_path) as connection:
+            return {path: (entry_type, size, included, content_hash) for path, entry_type, size, included, content_hash
+                    in connection.execute("SELECT path, type, size, included, hash FROM entries")}
+
+    def test_manifest_records_entries(self):
+        self.generate(hash_files=True)
+        rows = self.rows()
+        self.assertEqual(rows["subdir/subfile.txt"][:3], ("file", len("content of " + os.path.join("subdir", "subfile.txt")), 1))
+        self.assertEqual(len(rows["file1.txt"][3]), 64)
+        self.assertEqual(rows["script.py"][2:], (0, None))  # Not one of the file types, so not hashed either
+        self.assertEqual(rows["subdir"][0], "dir")
+
+    def test_diff_reports_only_changes(self):
+        self.generate()
+        self.generate()
+        self.assertEqual(list(diff_manifests(self.previous_path, self.manifest_path)), [])
+
+        self.write_file(os.path.join("subdir", "nested", "new.txt"), "new")
+        os.remove(os.path.join(self.tree_dir, "file1.txt"))
+        self.write_file("script.py", "a longer content than before")
+        self.write_file(os.path.join("added", "a.txt"), "a")
+        self.generate()
+        self.assertEqual(sorted(diff_manifests(self.previous_path, self.manifest_path)), [
+            ("added", "added"), ("added", "added/a.txt"), ("added", "subdir/nested/new.txt"),
+            ("changed", "script.py"), ("removed", "file1.txt"),
+        ])
+
+    def test_unchanged_files_are_not_hashed_again(self):
+        self.generate(hash_files=True)
+        hashes = {path: row[3] for path, row in self.rows().items()}
+        self.write_file("file1.txt", "changed content")
+        with patch.object(manifest_store, 'hash_file', wraps=manifest_store.hash_file) as hash_file:
+            self.generate(hash_files=True)
+        self.assertEqual([call.args[0] for call in hash_file.call_args_list], ["file1.txt"])
+        self.assertNotEqual(self.rows()["file1.txt"][3], hashes["file1.txt"])
+        self.assertEqual(self.rows()["subdir/subfile.txt"][3], hashes["subdir/subfile.txt"])
+
+    def test_manifest_updated_in_place(self):
+        """Tests that updating the rows of the changed entries gives the manifest a fresh scan writes."""
+        pdf_generator = PDFGenerator(self.tree_dir, self.output_dir, ignore_file_path=IGNORE_FILE_PATH)
+        scanner = DirectoryScanner(self.tree_dir)
+        manifest = scanner.scan()
+
+        def generate():
+            self.generator.generate_manifest(manifest, included_files=pdf_generator.iter_files_to_process(
+                manifest, False, [".txt"]), hash_files=True)
+            return self.rows(), self.root_digest()
+
+        generate()
+        self.write_file("file1.txt", "changed content")
+        self.write_file(os.path.join("subdir", "nested", "new.txt"), "new")
+        self.write_file(os.path.join("ignore_this", "more.txt"), "ignored")
+        self.write_file(os.path.join("added", "a.txt"), "a")
+        os.remove(os.path.join(self.tree_dir, "subdir", "nested", "deep.py"))
+        splices = []
+        scanner.update_manifest(manifest, ["file1.txt", os.path.join("subdir", "nested", "new.txt"), "added",
+                                           os.path.join("subdir", "nested", "deep.py"),
+                                           os.path.join("ignore_this", "more.txt")], splices)
+        included_files = [entry for _, _, added in splices for entry in added
+                          if pdf_generator.includes_file(manifest, entry, False, [".txt"])]
+        with patch.object(manifest_store, 'hash_file', wraps=manifest_store.hash_file) as hash_file:
+            self.generator.update_manifest(splices, included_files, hash_files=True)
+        self.assertEqual(sorted(call.args[0] for call in hash_file.call_args_list),
+                         sorted(["file1.txt", os.path.join("added", "a.txt"), os.path.join("subdir", "nested", "new.txt")]))
+        updated = self.rows(), self.root_digest()
+        self.assertEqual(updated[0]["ignore_this/more.txt"][2], 0)
+        self.assertNotIn("subdir/nested/deep.py", updated[0])
+        self.assertEqual(generate(), updated)
+
+    def root_digest(self):
+        with sqlite3.connect(self.manifest_path) as connection:
+            return connection.execute("SELECT value FROM info WHERE key = 'root_digest'").fetchone()[0]
+
+    def test_cancelled_manifest_is_not_written(self):
+        cancel_token = CancellationToken()
+        cancel_token.cancel()
+        manifest = PDFGenerator(self.tree_dir, self.output_dir, ignore_file_path=IGNORE_FILE_PATH).scan_directory()
+        with self.assertRaises(OperationCancelled):
+            self.generator.generate_manifest(manifest, cancel_token)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+if __name__ == "__main__":
+    unittest.main()
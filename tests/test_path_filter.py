@@ -0,0 +1,94 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from utils.directory_scanner import DirectoryScanner
+from utils.path_filter import PathFilter, compile_gitignore_pattern, parse_gitignore, match_rules
+
+class TestGitignorePatterns(unittest.TestCase):
+    def matches(self, pattern, path, is_dir=False):
+        return match_rules(parse_gitignore([pattern]), path, is_dir)
+
+    def test_comments_and_blank_lines(self):
+        self.assertIsNone(compile_gitignore_pattern("# comment"))
+        self.assertIsNone(compile_gitignore_pattern("   "))
+
+    def test_unanchored_pattern_matches_at_any_depth(self):
+        self.assertTrue(self.matches("*.log", "debug.log"))
+        self.assertTrue(self.matches("*.log", "a/b/debug.log"))
+        self.assertFalse(self.matches("*.log", "debug.log.txt"))
+
+    def test_anchored_pattern(self):
+        self.assertTrue(self.matches("/build", "build", is_dir=True))
+        self.assertFalse(self.matches("/build", "src/build", is_dir=True))
+        self.assertTrue(self.matches("docs/*.md", "docs/index.md"))
+        self.assertFalse(self.matches("docs/*.md", "docs/api/index.md"))
+
+    def test_double_star(self):
+        self.assertTrue(self.matches("**/fixtures", "tests/unit/fixtures", is_dir=True))
+        self.assertTrue(self.matches("docs/**/*.md", "docs/api/v1/index.md"))
+
+    def test_dir_only_pattern(self):
+        self.assertTrue(self.matches("cache/", "cache", is_dir=True))
+        self.assertFalse(self.matches("cache/", "cache"))
+
+    def test_negation(self):
+        rules = parse_gitignore(["*.log", "!keep.log"])
+        self.assertTrue(match_rules(rules, "other.log", False))
+        self.assertFalse(match_rules(rules, "keep.log", False))
+
+class TestPathFilter(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        for relative_path in ["main.py", "bundle.min.js", "app.js", ".env", "notes",
+                              "node_modules/lib/index.js", "build/out.txt", "src/build.py",
+                              "src/generated/api.py", "src/generated/keep.py"]:
+            file_path = os.path.join(self.test_dir, relative_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w') as f:
+                f.write("content")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def scanned_paths(self, path_filter):
+        return sorted(entry.relative_path.replace(os.sep, '/')
+                      for entry in DirectoryScanner(self.test_dir, path_filter=path_filter).scan()
+                      if entry.is_file)
+
+    def test_names_and_patterns(self):
+        path_filter = PathFilter(ignore_folders=["node_modules"], exclude_patterns=["*.min.js"], include_hidden=False)
+        self.assertEqual(self.scanned_paths(path_filter), [
+            "app.js", "build/out.txt", "main.py", "notes", "src/build.py",
+            "src/generated/api.py", "src/generated/keep.py",
+        ])
+
+    def test_folder_patterns_only_match_folders(self):
+        path_filter = PathFilter(exclude_folders=["buil?"])
+        paths = self.scanned_paths(path_filter)
+        self.assertNotIn("build/out.txt", paths)
+        self.assertIn("src/build.py", paths)
+
+    def test_gitignore_files_in_the_tree(self):
+        with open(os.path.join(self.test_dir, ".gitignore"), 'w') as f:
+            f.write("# build output\n/build/\nnode_modules\n")
+        with open(os.path.join(self.test_dir, "src", "generated", ".gitignore"), 'w') as f:
+            f.write("*.py\n!keep.py\n")
+
+        paths = self.scanned_paths(PathFilter(use_gitignore=True, include_hidden=False))
+        self.assertEqual(paths, ["app.js", "bundle.min.js", "main.py", "notes", "src/build.py", "src/generated/keep.py"])
+
+        # Without the option, .gitignore files are not applied
+        self.assertIn("build/out.txt", self.scanned_paths(PathFilter(include_hidden=False)))
+
+    def test_file_types(self):
+        path_filter = PathFilter(file_types=[".py", ".js"], exclude_file_types=[".js"])
+        self.assertTrue(path_filter.accepts_file_type("main.py"))
+        self.assertFalse(path_filter.accepts_file_type("app.js"))
+        self.assertFalse(path_filter.accepts_file_type("notes.txt"))
+        self.assertTrue(path_filter.accepts_file_type("notes"))
+        self.assertFalse(PathFilter(exclude_file_types=["text"]).accepts_file_type("notes"))
+
+if __name__ == "__main__":
+    unittest.main()
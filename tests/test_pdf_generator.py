@@ -2,9 +2,13 @@ import unittest
 import os
 import shutil
 import tempfile
+import time
+from unittest.mock import patch
 
-from pdf_generator.pdf_generator import PDFGenerator
+from pdf_generator.pdf_generator import FileCount, PDFGenerator, create_shared_pool
+from pdf_generator.text_reader import TextFile
 from pypdf import PdfReader
+from utils.cancellation import BudgetExceeded, CancellationToken, OperationCancelled
 
 class TestPDFGenerator(unittest.TestCase):
     def setUp(self):
@@ -202,4 +206,525 @@ class TestPDFGenerator(unittest.TestCase):
         pdf_generator = PDFGenerator(empty_dir, self.output_dir)
         count = pdf_generator.get_total_file_count()
         shutil.rmtree(empty_dir)  # Clean up temporary directory
-        self.assertEqual(count, 0, "Expected count to be 0 for an empty directory.")
\ No newline at end of file
+        self.assertEqual(count, 0, "Expected count to be 0 for an empty directory.")
+
+    def test_generate_pdf_streams_large_file(self):
+        """Tests that a file larger than one read chunk is rendered completely."""
+        lines = [f"line number {i}" for i in range(200)]
+        self.create_test_file("large_file.txt", "\n".join(lines))
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        pdf_generator.read_chunk_size = 256  # Force the file to be split into many chunks
+        result = pdf_generator.generate_pdf(False, [".txt"])
+        self.assertTrue(result, "PDF generation failed unexpectedly.")
+
+        temp_dir_name = os.path.basename(self.test_dir)
+        output_pdf = os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")
+        self.assert_pdf_content(output_pdf, ["large_file.txt", "line number 0", "line number 100", "line number 199"])
+
+    def test_generate_pdf_skips_large_file_with_late_encoding_error(self):
+        """Tests that an encoding error after the first chunk skips the whole file."""
+        with open(os.path.join(self.test_dir, "late_error.txt"), 'wb') as f:
+            # A lone surrogate is invalid UTF-16
+            f.write(("valid text\n" * 100).encode('utf-16') + b"\x00\xd8i\x00")
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        pdf_generator.read_chunk_size = 256
+        result = pdf_generator.generate_pdf(False, [".txt"])
+        self.assertTrue(result, "PDF generation failed unexpectedly.")
+
+        temp_dir_name = os.path.basename(self.test_dir)
+        output_pdf = os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")
+        pdf_text = self.get_text_from_pdf(output_pdf)
+        self.assertNotIn("late_error.txt", pdf_text)
+        self.assertNotIn("valid text", pdf_text)
+
+    def test_generate_pdf_detects_encodings(self):
+        """Tests that Latin-1 and UTF-16 files are decoded, even when UTF-8 only breaks after the first chunk."""
+        self.create_test_file("latin1.txt", "Latin-1 content, caf\u00e9", encoding='latin-1')
+        self.create_test_file("wide.txt", "UTF-16 content\r\nsecond line", encoding='utf-16')
+        with open(os.path.join(self.test_dir, "late_latin1.txt"), 'wb') as f:
+            f.write(b"valid text\n" * 100 + b"caf\xe9 late Latin-1 line")
+        for mmap_threshold in (None, 1):
+            with self.subTest(mmap_threshold=mmap_threshold):
+                pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+                pdf_generator.read_chunk_size = 256
+                pdf_generator.mmap_threshold = mmap_threshold
+                self.assertTrue(pdf_generator.generate_pdf(False, [".txt"]))
+
+                output_pdf = os.path.join(self.output_dir, f"{os.path.basename(self.test_dir)} dir content.pdf")
+                pdf_text = self.get_text_from_pdf(output_pdf)
+                self.assertIn("Latin-1 content, caf", pdf_text)
+                self.assertIn("UTF-16 content\nsecond line", pdf_text)
+                self.assertIn("late Latin-1 line", pdf_text)
+
+    def test_encoding_check_reads_the_file_once(self):
+        """Tests that the fallback encodings are tried in the same pass over the file, which can be cancelled."""
+        with open(os.path.join(self.test_dir, "late_latin1.txt"), 'wb') as f:
+            f.write(b"valid text\n" * 100 + b"caf\xe9 \x81 late Latin-1 line")  # Not UTF-8, nor Windows-1252
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        pdf_generator.read_chunk_size = 256
+        pdf_generator.mmap_threshold = None
+        size = pdf_generator.source.getsize("late_latin1.txt")
+        with patch.object(pdf_generator.source, 'open', wraps=pdf_generator.source.open) as source_open:
+            with pdf_generator.open_text("late_latin1.txt", size) as text_file:
+                self.assertEqual(text_file.detect_encoding().codec, 'latin-1')
+            self.assertEqual(source_open.call_count, 2)  # The start of the file, then one pass over all of it
+
+        cancel_token = CancellationToken()
+        cancel_token.cancel("Stopped by the test.")
+        for mmap_threshold in (None, 1):
+            with self.subTest(mmap_threshold=mmap_threshold):
+                with TextFile(pdf_generator.source, "late_latin1.txt", size, 256, mmap_threshold) as text_file:
+                    with self.assertRaises(OperationCancelled):
+                        text_file.detect_encoding(cancel_token, time.time())
+
+    def test_generate_pdf_renders_8bit_text(self):
+        """Tests that Windows-1252 and Windows-1251 files are rendered instead of being sniffed as binary."""
+        self.create_test_file("german.txt", "Gr\u00fc\u00dfe aus M\u00fcnchen, sch\u00f6ne Stra\u00dfe\n" * 20,
+                              encoding='cp1252')
+        self.create_test_file("russian.txt", "\u041f\u0440\u0438\u0432\u0435\u0442 mir, "
+                              "\u043a\u0430\u043a \u0434\u0435\u043b\u0430\n" * 20, encoding='cp1251')
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        self.assertTrue(pdf_generator.generate_pdf(False, [".txt"]))
+
+        output_pdf = os.path.join(self.output_dir, f"{os.path.basename(self.test_dir)} dir content.pdf")
+        self.assert_pdf_content(output_pdf, ["german.txt", "aus M", "russian.txt", "mir,"])
+
+    def test_generate_pdf_maps_large_files(self):
+        """Tests that a memory-mapped file is rendered completely, in whole lines."""
+        lines = [f"line number {i}" for i in range(200)]
+        self.create_test_file("large_file.txt", "\r\n".join(lines))
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        pdf_generator.read_chunk_size = 256
+        pdf_generator.mmap_threshold = 1024
+        with pdf_generator.open_text("large_file.txt", pdf_generator.source.getsize("large_file.txt")) as text_file:
+            self.assertTrue(text_file.mapped)
+            text_file.detect_encoding()
+            chunks = list(text_file.iter_chunks())
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(chunk.endswith("\n") for chunk in chunks[:-1]))
+        self.assertEqual(''.join(chunks), "\n".join(lines))
+
+        self.assertTrue(pdf_generator.generate_pdf(False, [".txt"]))
+        output_pdf = os.path.join(self.output_dir, f"{os.path.basename(self.test_dir)} dir content.pdf")
+        self.assert_pdf_content(output_pdf, ["line number 0", "line number 100", "line number 199"])
+
+    def test_generate_pdf_parallel_jobs(self):
+        """Tests that rendering with several worker processes keeps all content in directory order."""
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        result = pdf_generator.generate_pdf(False, None, jobs=2)
+        self.assertTrue(result, "PDF generation failed unexpectedly.")
+
+        temp_dir_name = os.path.basename(self.test_dir)
+        output_pdf = os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")
+        pdf_text = self.get_text_from_pdf(output_pdf)
+        self.assert_pdf_content(output_pdf, [
+            "This PDF contains the contents", "file1.txt", "This is a test file.",
+            "file2.py", "file3.md", "subfile.txt", "Content of subfile."
+        ])
+        self.assertLess(pdf_text.index("This PDF contains the contents"), pdf_text.index("file1.txt"))
+
+        manifest = pdf_generator.scan_directory()
+        expected_order = [entry.name for entry in pdf_generator.iter_files_to_process(manifest, False)]
+        positions = [pdf_text.index(f"{name} (") for name in expected_order]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_generate_pdf_shared_executor(self):
+        """Tests that generators sharing a process pool render into it and leave it running for the others."""
+        other_dir = os.path.join(self.test_dir, "other")
+        os.makedirs(other_dir)
+        with open(os.path.join(other_dir, "other.txt"), 'w') as f:
+            f.write("Other content.")
+        with create_shared_pool(2) as pool:
+            for directory, expected in ((self.test_dir, "Content of subfile."), (other_dir, "Other content.")):
+                pdf_generator = PDFGenerator(directory, self.output_dir, executor=pool)
+                self.assertTrue(pdf_generator.generate_pdf(False, [".txt"], jobs=2))
+                output_pdf = os.path.join(self.output_dir, f"{os.path.basename(directory)} dir content.pdf")
+                self.assert_pdf_content(output_pdf, ["This PDF contains the contents", expected])
+            self.assertEqual(pool.submit(len, "pool").result(), 4)
+
+    def test_generate_pdf_incremental_cache(self):
+        """Tests that unchanged files are reused from the render cache and changed files are re-rendered."""
+        cache_dir = os.path.join(self.test_dir, 'cache')
+        temp_dir_name = os.path.basename(self.test_dir)
+        output_pdf = os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")
+
+        def run():
+            feedback = []
+            pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['cache', 'output'])
+            self.assertTrue(pdf_generator.generate_pdf(False, None, feedback_callback=feedback.append,
+                                                       cache_dir=cache_dir))
+            return [message for message in feedback if message.startswith("Reused cached render")]
+
+        self.assertEqual(run(), [])
+        self.assertEqual(len(run()), 4)
+
+        self.create_test_file("file1.txt", "This file has changed.")
+        reused = run()
+        self.assertEqual(len(reused), 3)
+        self.assertNotIn("Reused cached render: file1.txt", reused)
+        self.assert_pdf_content(output_pdf, ["This file has changed.", "print('Hello, world!')", "Content of subfile."])
+
+    def test_truncated_renders_are_not_cached(self):
+        """Tests that a file cut short by the per-file time budget is rendered again without the budget."""
+        self.create_test_file("large_file.txt", "\n".join(f"line number {i}" for i in range(200)))
+        cache_dir = os.path.join(self.test_dir, 'cache')
+        output_pdf = os.path.join(self.output_dir, f"{os.path.basename(self.test_dir)} dir content.pdf")
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['cache', 'output'])
+                pdf_generator.read_chunk_size = 256
+                self.assertTrue(pdf_generator.generate_pdf(False, [".txt"], jobs=jobs, cache_dir=cache_dir,
+                                                           cancel_token=CancellationToken(file_timeout=1e-9)))
+                self.assertIn("Truncated", self.get_text_from_pdf(output_pdf))
+
+                feedback = []
+                pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['cache', 'output'])
+                self.assertTrue(pdf_generator.generate_pdf(False, [".txt"], jobs=jobs, cache_dir=cache_dir,
+                                                           feedback_callback=feedback.append))
+                self.assertNotIn("Reused cached render: large_file.txt", feedback)
+                pdf_text = self.get_text_from_pdf(output_pdf)
+                self.assertIn("line number 199", pdf_text)
+                self.assertNotIn("Truncated", pdf_text)
+
+    def test_live_pdf_updates(self):
+        """Tests that a live PDF replaces the pages of changed files with incremental updates."""
+        from pdf_generator.render_cache import RenderCache
+        from utils.directory_scanner import DirectoryScanner
+
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['cache', 'output'])
+        scanner = DirectoryScanner(self.test_dir, path_filter=pdf_generator.get_path_filter(False))
+        manifest = scanner.scan()
+        cache = RenderCache(os.path.join(self.test_dir, 'cache'))
+        live_pdf = pdf_generator.start_live_pdf(cache, manifest, False)
+        output_pdf = live_pdf.output_path
+        self.assertEqual(live_pdf.page_count, 5)  # The intro page and one page per file
+        merged_size = os.path.getsize(output_pdf)
+
+        self.create_test_file("file1.txt", "This file has changed.")
+        os.remove(os.path.join(self.subdir, "subfile.txt"))
+        changed, _ = scanner.update_manifest(manifest, ["file1.txt", os.path.join("subdir", "subfile.txt")])
+        self.assertEqual(pdf_generator.update_live_pdf(live_pdf, cache, manifest, False, changed_paths=changed), 4)
+        # The update is appended to the merged document, which readers take as its latest version
+        with open(output_pdf, 'rb') as f:
+            self.assertIn(b'/Prev', f.read()[merged_size:])
+        reader = PdfReader(output_pdf, strict=True)
+        texts = [page.extract_text() for page in reader.pages]
+        self.assertEqual(len(texts), 4)
+        self.assertIn("This file has changed.", "".join(texts))
+        self.assertNotIn("Content of subfile.", "".join(texts))
+
+        # Once the output is changed by something else, the next update merges it again
+        os.remove(output_pdf)
+        self.assertTrue(live_pdf.needs_rebuild)
+        self.create_test_file("file2.py", "print('changed')")
+        changed, _ = scanner.update_manifest(manifest, ["file2.py"])
+        self.assertEqual(pdf_generator.update_live_pdf(live_pdf, cache, manifest, False, changed_paths=changed), 4)
+        self.assert_pdf_content(output_pdf, ["This file has changed.", "print('changed')", "# Test Markdown File"])
+
+    def test_live_pdf_page_tree(self):
+        """Tests that an update writes only the nodes of the page tree whose files changed, in scan order."""
+        from pdf_generator.render_cache import RenderCache
+        from utils.directory_scanner import DirectoryScanner
+
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['cache', 'output'])
+        scanner = DirectoryScanner(self.test_dir, path_filter=pdf_generator.get_path_filter(False))
+        manifest = scanner.scan()
+        cache = RenderCache(os.path.join(self.test_dir, 'cache'))
+        with patch('pdf_generator.live_pdf.PAGE_TREE_NODE_FILES', 1):
+            live_pdf = pdf_generator.start_live_pdf(cache, manifest, False)
+        output_pdf = live_pdf.output_path
+        merged_size = os.path.getsize(output_pdf)
+
+        self.create_test_file(os.path.join("subdir", "added.txt"), "Added to subdir.")
+        self.create_test_file("file2.py", "print('changed')")
+        changed, _ = scanner.update_manifest(manifest, [os.path.join("subdir", "added.txt"), "file2.py"])
+        self.assertEqual(pdf_generator.update_live_pdf(live_pdf, cache, manifest, False, changed_paths=changed), 6)
+        with open(output_pdf, 'rb') as f:
+            update = f.read()[merged_size:]
+        self.assertEqual(update.count(b'/Type /Pages'), 3)  # The nodes of subdir/subfile.txt and file2.py, and the root
+        texts = [page.extract_text() for page in PdfReader(output_pdf, strict=True).pages]
+        self.assertIn("print('changed')", "".join(texts))
+
+        # The pages are in the order a merge of the whole scan puts them in
+        self.assertEqual(pdf_generator.update_live_pdf(live_pdf, cache, manifest, False), 6)
+        self.assertEqual([page.extract_text() for page in PdfReader(output_pdf, strict=True).pages], texts)
+
+    def test_render_cache_eviction(self):
+        """Tests that the render cache evicts the least recently used fragments when it is full."""
+        from pdf_generator.render_cache import RenderCache
+        from utils.directory_scanner import DirectoryScanner
+
+        cache = RenderCache(os.path.join(self.test_dir, 'cache'), max_bytes=150)
+        entries = [entry for entry in DirectoryScanner(self.test_dir).scan().iter_files()][:3]
+        for age, entry in enumerate(entries):
+            fragment_path = cache.fragment_path(entry.relative_path, 'settings', 'hash')
+            with open(fragment_path, 'wb') as f:
+                f.write(b'x' * 60)
+            cache.store(entry, 'settings', 'hash', fragment_path)
+            cache.entries[entry.relative_path]['last_used'] = age
+
+        cache.evict()
+        self.assertEqual(sorted(cache.entries), sorted(entry.relative_path for entry in entries[1:]))
+        self.assertIsNotNone(cache.lookup(entries[2], 'settings'))
+        self.assertIsNone(cache.lookup(entries[2], 'other settings'))
+
+    def test_generate_pdf_skips_binary_files(self):
+        """Tests that binary files are detected from their first bytes and neither counted nor rendered."""
+        with open(os.path.join(self.test_dir, "image.txt"), 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n' + bytes(range(256)))
+        with open(os.path.join(self.test_dir, "data.txt"), 'wb') as f:
+            f.write(b'looks like text\x00but is not')
+
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        manifest = pdf_generator.scan_directory()
+        self.assertEqual(pdf_generator.get_total_file_count(manifest=manifest), 4)
+
+        result = pdf_generator.generate_pdf(False, None, manifest=manifest)
+        self.assertTrue(result, "PDF generation failed unexpectedly.")
+
+        temp_dir_name = os.path.basename(self.test_dir)
+        pdf_text = self.get_text_from_pdf(os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf"))
+        self.assertNotIn("image.txt", pdf_text)
+        self.assertNotIn("data.txt", pdf_text)
+
+    def test_file_count_matches_rendered_files(self):
+        """Tests that the progress total uses the same pruning as the renderer."""
+        for folder in [".venv", "node_modules", os.path.join("subdir", "excluded")]:
+            os.makedirs(os.path.join(self.test_dir, folder), exist_ok=True)
+            self.create_test_file(os.path.join(folder, "never_rendered.txt"), "Not rendered.")
+
+        progress = []
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=["excluded"])
+        result = pdf_generator.generate_pdf(False, None, progress_callback=lambda current, total: progress.append((current, total)))
+        self.assertTrue(result, "PDF generation failed unexpectedly.")
+
+        rendered = 4  # file1.txt, file2.py, file3.md and subdir/subfile.txt
+        self.assertEqual(pdf_generator.get_total_file_count(include_hidden=False), rendered)
+        self.assertEqual(progress[-1], (rendered, rendered))
+        self.assertEqual([current for current, _ in progress[:-1]], list(range(1, rendered + 1)))
+        self.assertTrue(all(current <= total <= rendered for current, total in progress))
+
+    def test_file_count_stops(self):
+        """Tests that a stopped file count does not go on reading files in the background."""
+        def endless_files():
+            while True:
+                time.sleep(0.001)
+                yield None
+
+        file_count = FileCount(endless_files())
+        file_count.stop()
+        self.assertTrue(file_count._done.wait(5), "The file count did not stop.")
+
+    def test_generate_pdf_cancelled(self):
+        """Tests that a cancelled token stops the generation without writing a PDF."""
+        cancel_token = CancellationToken()
+        cancel_token.cancel("Stopped by the test.")
+        for jobs in (1, 2):
+            pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+            result = pdf_generator.generate_pdf(False, None, jobs=jobs, cancel_token=cancel_token)
+            self.assertIsInstance(result, OperationCancelled)
+            self.assertEqual(str(result), "Stopped by the test.")
+
+        temp_dir_name = os.path.basename(self.test_dir)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")))
+
+    def test_generate_pdf_byte_budget(self):
+        """Tests that the generation stops once the byte budget is used up."""
+        self.create_test_file("zzz_large.txt", "x" * 1000)
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        result = pdf_generator.generate_pdf(False, None, cancel_token=CancellationToken(max_bytes=500))
+        self.assertIsInstance(result, BudgetExceeded)
+
+    def test_generate_pdf_per_file_budgets(self):
+        """Tests that files over the size budget are skipped and slow files are truncated."""
+        self.create_test_file("large_file.txt", "\n".join(f"line number {i}" for i in range(200)))
+        feedback = []
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        pdf_generator.read_chunk_size = 256
+        cancel_token = CancellationToken(max_file_bytes=100)
+        result = pdf_generator.generate_pdf(False, None, feedback_callback=feedback.append, cancel_token=cancel_token)
+        self.assertTrue(result, "PDF generation failed unexpectedly.")
+        self.assertTrue(any(message.startswith("Skipped file") and "large_file.txt" in message for message in feedback))
+
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        pdf_generator.read_chunk_size = 256
+        result = pdf_generator.generate_pdf(False, None, cancel_token=CancellationToken(file_timeout=1e-9))
+        self.assertTrue(result, "PDF generation failed unexpectedly.")
+
+        temp_dir_name = os.path.basename(self.test_dir)
+        output_pdf = os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")
+        pdf_text = self.get_text_from_pdf(output_pdf)
+        self.assertIn("line number 0", pdf_text)
+        self.assertIn("Truncated", pdf_text)
+        self.assertNotIn("line number 199", pdf_text)
+
+    def test_generate_pdf_profiling(self):
+        """Tests that profiling collects stage times and counters, including from worker processes."""
+        from utils.profiler import Profiler
+
+        for jobs in (1, 2):
+            profiler = Profiler()
+            pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['output'], profiler=profiler)
+            self.assertTrue(pdf_generator.generate_pdf(False, None, jobs=jobs))
+
+            report = profiler.report()
+            for stage in ('scan', 'read', 'filter_chars', 'layout', 'output'):
+                self.assertIn(stage, report['stages'])
+            self.assertEqual(report['counters']['files_processed'], 4)
+            self.assertGreater(report['counters']['pages'], 0)
+            self.assertEqual(len(report['slowest_files']), 4)
+
+    def test_generate_pdf_code_layout(self):
+        """Tests that the code layout keeps indentation and wraps long lines at a fixed width."""
+        self.create_test_file("code.py", "def f():\n\tif True:\n        return '" + "x" * 200 + "'\n")
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir)
+        self.assertEqual(pdf_generator.layout, 'code')
+        self.assertTrue(pdf_generator.generate_pdf(False, [".py"]))
+
+        temp_dir_name = os.path.basename(self.test_dir)
+        pdf_text = self.get_text_from_pdf(os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf"))
+        lines = pdf_text.splitlines()
+        self.assertIn("    if True:", lines)
+        wrapped = [line for line in lines if line.startswith("x")]
+        self.assertTrue(wrapped, "Expected the long line to be wrapped.")
+        self.assertIn("x" * 200, pdf_text.replace("\n", ""))
+
+    def test_generate_pdf_text_layout(self):
+        """Tests that the text layout from the configuration flows content with multi_cell."""
+        config_path = os.path.join(self.test_dir, "config.json")
+        with open(config_path, 'w') as f:
+            f.write('{"font_family": "Arial", "font_size": 10, "line_spacing": 10, "layout": "text"}')
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir, config_path=config_path)
+        self.assertTrue(pdf_generator.generate_pdf(False, [".txt"]))
+        temp_dir_name = os.path.basename(self.test_dir)
+        self.assert_pdf_content(os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf"),
+                                ["This is a test file.", "Content of subfile."])
+
+        with open(config_path, 'w') as f:
+            f.write('{"layout": "fancy"}')
+        with self.assertRaises(ValueError):
+            PDFGenerator(self.test_dir, self.output_dir, config_path=config_path)
+
+    def test_generate_pdf_streaming(self):
+        """Tests that a streamed PDF has the same content as one built in memory."""
+        temp_dir_name = os.path.basename(self.test_dir)
+        output_pdf = os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")
+        for jobs in (1, 2):
+            texts = []
+            for stream in (False, True):
+                pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['output'], stream=stream)
+                self.assertTrue(pdf_generator.generate_pdf(False, None, jobs=jobs))
+                with open(output_pdf, 'rb') as f:
+                    texts.append([page.extract_text() for page in PdfReader(f, strict=True).pages])
+            self.assertEqual(texts[1], texts[0])
+
+    def test_streaming_writes_pages_before_saving(self):
+        """Tests that finished pages are on disk before the PDF is saved, and that unsaved files are removed."""
+        from pdf_generator.pdf_operations import PDFOperations
+
+        output_pdf = os.path.join(self.output_dir, "streamed.pdf")
+        pdf_operations = PDFOperations()
+        pdf_operations.stream_to(output_pdf)
+        pdf_operations.add_page()
+        pdf_operations.set_font("Courier", size=10)
+        pdf_operations.add_code("line\n" * 200, 10)
+        pdf_operations.pdf.flush()
+        self.assertGreater(os.path.getsize(output_pdf), 0)
+        self.assertGreater(pdf_operations.pdf.pages_written, 0)
+        self.assertNotIn(1, pdf_operations.pdf.pages)  # Written pages are dropped from memory
+
+        pdf_operations.save_pdf(output_pdf)
+        self.assertEqual(len(PdfReader(output_pdf, strict=True).pages), pdf_operations.page_count())
+
+        pdf_generator = PDFGenerator(self.test_dir, self.output_dir, stream=True)
+        self.assertFalse(pdf_generator.generate_pdf(False, [".nothing"]))
+        temp_dir_name = os.path.basename(self.test_dir)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")))
+
+    def test_generate_pdf_compression_presets(self):
+        """Tests that every compression preset keeps the content, and that stronger presets write smaller files."""
+        self.create_test_file("big.py", "\n".join(f"value_{index} = compute({index}, 'text')" for index in range(2000)))
+        temp_dir_name = os.path.basename(self.test_dir)
+        output_pdf = os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")
+        sizes = {}
+        for compression in ('none', 'fast', 'small'):
+            for stream in (False, True):
+                pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['output'],
+                                             stream=stream, compression=compression)
+                self.assertTrue(pdf_generator.generate_pdf(False, None))
+                self.assert_pdf_content(output_pdf, ["This is a test file.", "value_1999 = compute(1999, 'text')"])
+                sizes[compression, stream] = os.path.getsize(output_pdf)
+            self.assertEqual(sizes[compression, True], sizes[compression, False])
+        self.assertLess(sizes['fast', False], sizes['none', False])
+        self.assertLessEqual(sizes['small', False], sizes['fast', False])
+
+        with self.assertRaises(ValueError):
+            PDFGenerator(self.test_dir, self.output_dir, compression='tiny')
+
+    def test_merge_dedupes_shared_resources(self):
+        """Tests that merged fragments share their fonts and resources with the small preset."""
+        temp_dir_name = os.path.basename(self.test_dir)
+        output_pdf = os.path.join(self.output_dir, f"{temp_dir_name} dir content.pdf")
+        sizes = {}
+        for compression in ('default', 'small'):
+            pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['output', 'cache'],
+                                         compression=compression)
+            self.assertTrue(pdf_generator.generate_pdf(False, None, cache_dir=os.path.join(self.test_dir, 'cache')))
+            self.assert_pdf_content(output_pdf, ["This PDF contains the contents", "Content of subfile."])
+            reader = PdfReader(output_pdf, strict=True)
+            resources = {page.raw_get('/Resources').idnum for page in reader.pages}
+            sizes[compression] = (len(resources), os.path.getsize(output_pdf))
+        self.assertGreater(sizes['default'][0], 1)
+        self.assertEqual(sizes['small'][0], 2)  # The header's and the one shared by every file fragment
+        self.assertLess(sizes['small'][1], sizes['default'][1])
+
+    def test_plan_volumes(self):
+        """Tests that files are split into volumes by top-level subdirectory, bytes or pages, in order."""
+        from pdf_generator.pdf_generator import plan_volumes
+        from utils.directory_scanner import ScanEntry
+
+        def entry(relative_path, size):
+            return ScanEntry(relative_path, relative_path, os.path.basename(relative_path), 0, False, True, size, 0)
+
+        entries = [entry("a.txt", 10), entry(os.path.join("src", "b.py"), 60), entry(os.path.join("src", "c.py"), 50),
+                   entry(os.path.join("docs", "d.md"), 200), entry("e.txt", 10)]
+        self.assertEqual(plan_volumes(entries, 'directory'), [[0, 4], [1, 2], [3]])
+        self.assertEqual(plan_volumes(entries, 'bytes', 100), [[0, 1], [2], [3], [4]])
+        self.assertEqual(plan_volumes(entries, 'pages', 3, page_counts=[1, 1, 1, 5, 1]), [[0, 1, 2], [3], [4]])
+        with self.assertRaises(ValueError):
+            plan_volumes(entries, 'chapters')
+
+    def test_generate_volumes(self):
+        """Tests that every split mode writes volumes holding all files once, listed in the index."""
+        import json
+
+        self.create_test_file(os.path.join(self.subdir, "long.txt"), "line\n" * 300)
+        temp_dir_name = os.path.basename(self.test_dir)
+        index_path = os.path.join(self.output_dir, f"{temp_dir_name} volumes.json")
+        for split_by, volume_size in (('directory', None), ('bytes', 30), ('pages', 2)):
+            for jobs in (1, 2):
+                pdf_generator = PDFGenerator(self.test_dir, self.output_dir, exclude_folders=['output'])
+                self.assertTrue(pdf_generator.generate_volumes(False, None, split_by, volume_size, jobs=jobs))
+                with open(index_path, encoding='utf-8') as index_file:
+                    volumes = json.load(index_file)['volumes']
+
+                listed = [path for volume in volumes for path in volume['files']]
+                self.assertEqual(sorted(listed), sorted(["file1.txt", "file2.py", "file3.md",
+                                                         os.path.join("subdir", "subfile.txt"),
+                                                         os.path.join("subdir", "long.txt")]))
+                volume_files = sorted(name for name in os.listdir(self.output_dir) if name.endswith(".pdf"))
+                self.assertEqual(volume_files, [volume['file'] for volume in volumes])
+                for volume in volumes:
+                    volume_path = os.path.join(self.output_dir, volume['file'])
+                    self.assertEqual(len(PdfReader(volume_path, strict=True).pages), volume['pages'])
+                    self.assert_pdf_content(volume_path, [os.path.basename(path) for path in volume['files']])
+                if split_by == 'directory':
+                    self.assertEqual(len(volumes), 2)
+                    self.assertEqual(sorted(volumes[-1]['files']), [os.path.join("subdir", "long.txt"),
+                                                                    os.path.join("subdir", "subfile.txt")])
+                elif split_by == 'pages':
+                    self.assertTrue(all(volume['pages'] <= 2 for volume in volumes
+                                        if len(volume['files']) > 1))
+
+        self.assertFalse(PDFGenerator(self.test_dir, self.output_dir).generate_volumes(False, [".nothing"]))
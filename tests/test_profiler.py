@@ -0,0 +1,69 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from utils.profiler import NULL_PROFILER, Profiler
+
+class TestProfiler(unittest.TestCase):
+    def test_stages_and_counters(self):
+        profiler = Profiler()
+        for _ in range(3):
+            with profiler.stage('read'):
+                pass
+        profiler.count('bytes_read', 100)
+        profiler.count('bytes_read', 50)
+        self.assertEqual(list(profiler.timed(iter([1, 2]), 'layout')), [1, 2])
+
+        report = profiler.report()
+        self.assertEqual(report['stages']['read']['calls'], 3)
+        self.assertEqual(report['stages']['layout']['calls'], 3)  # Two items and the final StopIteration
+        self.assertEqual(report['counters'], {'bytes_read': 150})
+
+    def test_slowest_files(self):
+        profiler = Profiler(slowest_files=2)
+        for index, seconds in enumerate([0.3, 0.1, 0.5, 0.2]):
+            profiler.record_file(f"file{index}", seconds, index)
+        self.assertEqual([item['path'] for item in profiler.report()['slowest_files']], ["file2", "file0"])
+
+    def test_merge(self):
+        worker = Profiler()
+        worker.add_time('layout', 1.0)
+        worker.count('pages', 2)
+        worker.record_file("slow.txt", 1.0, 10)
+
+        profiler = Profiler()
+        profiler.add_time('layout', 0.5)
+        profiler.merge(worker.data())
+        report = profiler.report()
+        self.assertEqual(report['stages']['layout'], {'seconds': 1.5, 'calls': 2})
+        self.assertEqual(report['counters']['pages'], 2)
+        self.assertEqual(report['slowest_files'][0]['path'], "slow.txt")
+
+    def test_null_profiler_records_nothing(self):
+        with NULL_PROFILER.stage('read'):
+            NULL_PROFILER.count('pages')
+        NULL_PROFILER.record_file("file", 1.0, 1)
+        self.assertFalse(NULL_PROFILER.enabled)
+        self.assertEqual(NULL_PROFILER.data(), {'stages': {}, 'counters': {}, 'slowest_files': []})
+
+    def test_cprofile_report(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            profiler = Profiler(cprofile=True)
+            with profiler.capture():
+                sorted(range(1000), key=lambda value: -value)
+            report_path = os.path.join(test_dir, "profile.json")
+            cprofile_path = os.path.join(test_dir, "profile.prof")
+            profiler.write_report(report_path, cprofile_path)
+
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+            self.assertTrue(report['cprofile']['top_functions'])
+            self.assertTrue(os.path.isfile(cprofile_path))
+        finally:
+            shutil.rmtree(test_dir)
+
+if __name__ == "__main__":
+    unittest.main()
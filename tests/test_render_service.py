@@ -0,0 +1,139 @@
+import unittest
+import http.client
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from render_service import RenderService, create_server
+
+def wait_for(service, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = service.get(job_id)
+        if job.status not in ('queued', 'running'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+class TestRenderService(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.test_dir, "project")
+        os.makedirs(os.path.join(self.source_dir, "src"))
+        for name, content in (("README.md", "# Project"), (os.path.join("src", "app.py"), "print('app')")):
+            with open(os.path.join(self.source_dir, name), 'w') as f:
+                f.write(content)
+        self.output_dir = os.path.join(self.test_dir, "output")
+        self.service = RenderService(self.output_dir, workers=2, concurrency=2, max_queue=10)
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.service.shutdown()
+        shutil.rmtree(self.test_dir)
+
+    def serve(self, **kwargs):
+        server = create_server(self.service, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def request(self, connection, method, path, body=None, headers=None):
+        connection.request(method, path, json.dumps(body) if body is not None else None,
+                           headers if headers is not None else {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_jobs_over_http(self):
+        server = self.serve(port=0)
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=30)
+        status, job = self.request(connection, 'POST', '/jobs', {"directory": self.source_dir, "options": ["-t", ".py"]})
+        self.assertEqual((status, job['name']), (202, 'project'))
+        # Rendered in the shared worker pool, under another name
+        status, pooled_job = self.request(connection, 'POST', '/jobs', {"directory": self.source_dir, "name": "pooled",
+                                                                        "options": ["-j", "2", "--incremental"]})
+        self.assertEqual(status, 202)
+
+        for job_id, name in ((job['id'], 'project'), (pooled_job['id'], 'pooled')):
+            self.assertEqual(wait_for(self.service, job_id).status, 'succeeded')
+            self.assertTrue(os.path.isfile(os.path.join(self.output_dir, name, "project dir content.pdf")))
+            self.assertTrue(os.path.isfile(os.path.join(self.output_dir, name, "project directory content.txt")))
+        status, job = self.request(connection, 'GET', f"/jobs/{job['id']}")
+        self.assertEqual((status, job['tasks']), (200, {'PDF generation': None, 'Directory structure generation': None}))
+        self.assertIsNotNone(job['seconds'])
+        self.assertEqual([job['id'] for job in self.request(connection, 'GET', '/jobs')[1]], ['1', '2'])
+        self.assertEqual(self.request(connection, 'GET', '/health')[1]['running'], 0)
+        # The output folder locks go with the last job of each name
+        self.assertEqual(self.service._output_locks, {})
+
+    def test_invalid_requests(self):
+        server = self.serve(port=0)
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=30)
+        for body in ({"directory": os.path.join(self.test_dir, "missing")}, {"directory": self.source_dir, "options": ["--split", "sideways"]},
+                     {"directory": self.source_dir, "name": "../elsewhere"}, ["not", "an", "object"],
+                     {"directory": self.source_dir, "options": ["--watch"]}, {"directory": self.source_dir, "options": ["--log-sample", "5"]}):
+            with self.subTest(body=body):
+                self.assertEqual(self.request(connection, 'POST', '/jobs', body)[0], 400)
+        self.assertEqual(self.request(connection, 'GET', '/jobs/42')[0], 404)
+
+    def test_requests_from_web_pages(self):
+        server = self.serve(port=0)
+        port = server.server_address[1]
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        body = {"directory": self.source_dir}
+        # A cross-site form post, and a page of a DNS-rebound host
+        self.assertEqual(self.request(connection, 'POST', '/jobs', body, {'Content-Type': 'text/plain'})[0], 415)
+        for host in (f'attacker.example:{port}', '127.0.0.1', None):
+            with self.subTest(host=host):
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                connection.putrequest('GET', '/jobs', skip_host=True)
+                if host:
+                    connection.putheader('Host', host)
+                connection.endheaders()
+                self.assertEqual(connection.getresponse().status, 403)
+        self.assertEqual(self.service.list_jobs(), [])
+        status, job = self.request(connection, 'POST', '/jobs', body, {'Content-Type': 'application/json; charset=utf-8',
+                                                                     'Host': f'localhost:{port}'})
+        self.assertEqual(status, 202)
+        self.assertEqual(self.request(connection, 'DELETE', '/jobs/42')[0], 404)
+
+    def test_cancel_queued_job(self):
+        busy = threading.Lock()
+        with busy:
+            # Both runners wait for the output folder of their job, so the third job stays queued
+            self.service._output_locks['project'] = [busy, 1]
+            first = self.service.submit({"directory": self.source_dir})
+            second = self.service.submit({"directory": self.source_dir})
+            queued = self.service.submit({"directory": self.source_dir, "name": "other"})
+            self.assertEqual(self.service.cancel(queued.id).status, 'cancelled')
+        for job in (first, second):
+            self.assertEqual(wait_for(self.service, job.id).status, 'succeeded')
+        self.assertEqual(queued.status, 'cancelled')
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "other")))
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Unix sockets are not available")
+    def test_jobs_over_unix_socket(self):
+        socket_path = os.path.join(self.test_dir, "service.sock")
+        self.serve(socket_path=socket_path)
+        status, job = self.request(UnixHTTPConnection(socket_path), 'POST', '/jobs', {"directory": self.source_dir})
+        self.assertEqual(status, 202)
+        self.assertEqual(wait_for(self.service, job['id']).status, 'succeeded')
+        self.assertEqual(self.request(UnixHTTPConnection(socket_path), 'GET', f"/jobs/{job['id']}")[1]['status'], 'succeeded')
+
+if __name__ == "__main__":
+    unittest.main()
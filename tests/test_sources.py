@@ -0,0 +1,202 @@
+import unittest
+import gzip
+import io
+import os
+import random
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+from directory_structure_generator.directory_structure_generator import DirectoryStructureGenerator
+from pdf_generator.pdf_generator import PDFGenerator
+from pypdf import PdfReader
+from utils import sources
+from utils.directory_scanner import DirectoryScanner
+from utils.path_filter import PathFilter
+from utils.sources import DirectorySource, GitSource, is_source, open_source
+
+FILES = {
+    "readme.txt": "Read me first.",
+    ".gitignore": "*.log\n",
+    "debug.log": "Ignored by git.",
+    os.path.join("src", "app.py"): "print('app')\n",
+    os.path.join("src", "lib", "util.py"): "def util():\n    return 42\n",
+    os.path.join("docs", "empty.md"): "",
+}
+
+def git(*args):
+    return subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', *args],
+                          check=True, capture_output=True).stdout
+
+class TestSources(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.tree_dir = os.path.join(self.test_dir, "project")
+        for relative_path, content in FILES.items():
+            self.write(self.tree_dir, relative_path, content)
+
+        self.zip_path = os.path.join(self.test_dir, "project.zip")
+        with zipfile.ZipFile(self.zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for relative_path in FILES:
+                archive.write(os.path.join(self.tree_dir, relative_path), relative_path)
+        self.tar_paths = []
+        for extension, mode in (('.tar', 'w'), ('.tar.gz', 'w:gz')):
+            tar_path = os.path.join(self.test_dir, "project" + extension)
+            with tarfile.open(tar_path, mode) as archive:
+                archive.add(self.tree_dir, arcname='.')
+            self.tar_paths.append(tar_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, directory, relative_path, content):
+        path = os.path.join(directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def make_repository(self):
+        if not shutil.which('git'):
+            self.skipTest("git is not installed")
+        repository = os.path.join(self.test_dir, "repo")
+        shutil.copytree(self.tree_dir, repository)
+        git('-C', repository, 'init', '-q')
+        git('-C', repository, 'add', '-A', '--force')
+        git('-C', repository, 'commit', '-q', '-m', 'First')
+        return repository
+
+    def listing(self, location):
+        return sorted((entry.relative_path, entry.depth, entry.is_dir, entry.is_file, entry.size)
+                      for entry in DirectoryScanner(location).scan())
+
+    def test_sources_list_and_read_the_same_tree(self):
+        expected = self.listing(self.tree_dir)
+        repository = self.make_repository()
+        for location in [self.zip_path] + self.tar_paths + [f"{repository}@HEAD"]:
+            with self.subTest(location=location):
+                self.assertTrue(is_source(location))
+                source = open_source(location)
+                self.assertEqual(self.listing(location), expected)
+                for relative_path, content in FILES.items():
+                    with source.open(relative_path) as file:
+                        self.assertEqual(file.read().decode('utf-8'), content)
+                with self.assertRaises(FileNotFoundError):
+                    source.open("missing.txt")
+                self.assertIs(open_source(location), source)  # Indexed once per process
+
+    def test_gitignore_is_read_from_the_source(self):
+        manifest = DirectoryScanner(self.tar_paths[1], path_filter=PathFilter(use_gitignore=True)).scan()
+        self.assertNotIn("debug.log", [entry.relative_path for entry in manifest])
+        self.assertIn("readme.txt", [entry.relative_path for entry in manifest])
+
+    def test_outputs_are_generated_from_an_archive(self):
+        output_dir = os.path.join(self.test_dir, "output")
+        os.makedirs(output_dir)
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                pdf_generator = PDFGenerator(self.tar_paths[1], output_dir)
+                self.assertIs(pdf_generator.generate_pdf(False, None, jobs=jobs), True)
+                reader = PdfReader(os.path.join(output_dir, "project dir content.pdf"))
+                text = ''.join(page.extract_text() for page in reader.pages)
+                self.assertIn("print('app')", text)
+                self.assertIn("return 42", text)
+
+        structure_generator = DirectoryStructureGenerator(self.zip_path, output_dir, source=open_source(self.zip_path))
+        structure_generator.generate_directory_structure()
+        with open(os.path.join(output_dir, "project directory content.txt"), encoding='utf-8') as f:
+            self.assertIn("util.py", f.read())
+
+    def test_git_revisions(self):
+        repository = self.make_repository()
+        self.write(repository, os.path.join("src", "app.py"), "print('changed')\n")
+        git('-C', repository, 'commit', '-q', '-a', '-m', 'Second')
+
+        old, new = open_source(f"{repository}@HEAD~1"), open_source(f"{repository}@HEAD")
+        self.assertIsInstance(new, GitSource)
+        self.assertEqual(new.name, "repo@HEAD")
+        with old.open(os.path.join("src", "app.py")) as file:
+            self.assertEqual(file.read(), b"print('app')\n")
+        with new.open(os.path.join("src", "app.py")) as file:
+            self.assertEqual(file.read(), b"print('changed')\n")
+        # The stamp of a file changes with its content only
+        self.assertEqual(old.entry("readme.txt").mtime_ns, new.entry("readme.txt").mtime_ns)
+        self.assertNotEqual(old.entry(os.path.join("src", "app.py")).mtime_ns,
+                            new.entry(os.path.join("src", "app.py")).mtime_ns)
+
+        with patch.object(sources, 'GIT_STREAM_THRESHOLD', 4):
+            streamed = GitSource(f"{repository}@HEAD", repository, "HEAD")
+            with streamed.open(os.path.join("src", "lib", "util.py")) as file:
+                self.assertEqual(file.read(), FILES[os.path.join("src", "lib", "util.py")].encode())
+
+        with self.assertRaises(ValueError):
+            open_source(f"{repository}@no-such-revision")
+
+    def test_locations_that_are_not_sources(self):
+        self.assertFalse(is_source(os.path.join(self.tree_dir, "readme.txt")))
+        self.assertIsInstance(open_source(os.path.join(self.test_dir, "missing")), DirectorySource)
+        broken_path = os.path.join(self.test_dir, "broken.zip")
+        with open(broken_path, 'wb') as f:
+            f.write(b"not a zip file")
+        with self.assertRaises(ValueError):
+            open_source(broken_path)
+
+    def test_cached_sources_are_closed(self):
+        first = open_source(self.zip_path)
+        with patch.object(sources._indexed_sources, 'max_sources', 2):
+            tar_sources = [open_source(tar_path) for tar_path in self.tar_paths]
+            self.assertIsNone(first._archive)  # Evicted and closed
+            self.assertIsNot(open_source(self.zip_path), first)
+        # A closed source opens its archive again on the next read
+        with first.open("readme.txt") as file:
+            self.assertEqual(file.read(), b"Read me first.")
+
+        # A tar archive being read from is closed once its last member is
+        tar_source = tar_sources[0]
+        member = tar_source.open("readme.txt")
+        tar_source.close()
+        self.assertIsNotNone(tar_source._archive)
+        self.assertEqual(member.read(), b"Read me first.")
+        member.close()
+        self.assertIsNone(tar_source._archive)
+
+        # An archive that changed is indexed again, and the old index is not used to read it
+        old = open_source(self.tar_paths[0])
+        with tarfile.open(self.tar_paths[0], 'w') as archive:
+            archive.add(os.path.join(self.tree_dir, "readme.txt"), arcname="readme.txt")
+        os.utime(self.tar_paths[0], ns=(0, 0))
+        new = open_source(self.tar_paths[0])
+        self.assertIsNot(new, old)
+        self.assertIsNone(old._archive)
+        with self.assertRaises(OSError):
+            old.open(os.path.join("src", "app.py"))
+        self.assertIsNone(new.entry(os.path.join("src", "app.py")))
+        sources.close_sources()
+
+class TestSeekableGzip(unittest.TestCase):
+    def test_random_reads(self):
+        randomizer = random.Random(7)
+        words = [bytes(randomizer.choices(b'abcdefgh', k=randomizer.randint(1, 12))) for _ in range(500)]
+        data = b' '.join(randomizer.choice(words) for _ in range(200000))
+        with tempfile.TemporaryDirectory() as test_dir:
+            path = os.path.join(test_dir, "data.gz")
+            with open(path, 'wb') as f:
+                # A multi-member file, as written by concatenating gzip files
+                f.write(gzip.compress(data[:len(data) // 3]) + gzip.compress(data[len(data) // 3:]))
+            with patch.object(sources, 'GZIP_CHECKPOINT_INTERVAL', 64 * 1024):
+                file = io.BufferedReader(sources._SeekableGzip(path))
+                try:
+                    for _ in range(50):
+                        offset, size = randomizer.randrange(len(data)), randomizer.randint(1, 100000)
+                        file.seek(offset)
+                        self.assertEqual(file.read(size), data[offset:offset + size])
+                    self.assertGreater(len(file.raw._checkpoints), 2)
+                    file.seek(len(data) - 10)
+                    self.assertEqual(file.read(), data[-10:])
+                finally:
+                    file.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from pdf_generator.config import load_config
+from utils.config_cache import clear_config_cache, load_ignore_folders
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# `main.py --help` must return within this many seconds (the fastest of a few runs)
+STARTUP_BUDGET_SECONDS = 1.0
+
+# `main.py` must render a directory of two small files within this many seconds (the fastest of a few runs)
+SMALL_RUN_BUDGET_SECONDS = 2.0
+
+# Modules that are slow to import and must not be loaded before they are needed
+DEFERRED_MODULES = ('fpdf', 'pypdf', 'cProfile', 'pstats', 'tkinter', 'concurrent.futures.process')
+
+def loaded_modules(code):
+    """Runs ``code`` in a fresh interpreter and returns the deferred modules it loaded."""
+    check = f"{code}\nimport sys\nprint(','.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', check], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+    return [name for name in output.strip().split(',') if name]
+
+class TestStartup(unittest.TestCase):
+    def test_help_within_budget(self):
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, 'main.py', '--help'], cwd=REPO_DIR, capture_output=True)
+            timings.append(time.perf_counter() - start)
+            self.assertEqual(result.returncode, 0)
+        self.assertLess(min(timings), STARTUP_BUDGET_SECONDS)
+
+    def test_small_directory_within_budget(self):
+        """Times a whole run on a tiny directory: imports, configuration, scan, first render and outputs."""
+        with tempfile.TemporaryDirectory(prefix='startup-') as directory:
+            for name, content in (("app.py", "print('app')\n"), ("README.md", "# App\n")):
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(content)
+            name = os.path.basename(directory)
+            output_dir = os.path.join(REPO_DIR, 'output')
+            created_output_dir = not os.path.exists(output_dir)
+            try:
+                timings = []
+                for _ in range(3):
+                    start = time.perf_counter()
+                    result = subprocess.run([sys.executable, 'main.py', directory], cwd=REPO_DIR, capture_output=True)
+                    timings.append(time.perf_counter() - start)
+                    self.assertEqual(result.returncode, 0)
+                self.assertTrue(os.path.isfile(os.path.join(output_dir, name, f"{name} dir content.pdf")))
+                self.assertLess(min(timings), SMALL_RUN_BUDGET_SECONDS)
+            finally:
+                shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)
+                if created_output_dir:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+
+    def test_heavy_imports_are_deferred(self):
+        self.assertEqual(loaded_modules("import main\nimport sys\nsys.argv = ['main.py', '.']\nmain.parse_arguments()"), [])
+        self.assertEqual(loaded_modules("import pdf_generator.pdf_generator"), ['fpdf'])
+        if importlib.util.find_spec('tkinter'):
+            self.assertEqual(loaded_modules("import gui.event_handler"), ['tkinter'])
+
+class TestConfigCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.test_dir.name, "config.json")
+        self.write_json(self.config_path, {"font_size": 12, "font_path": "fonts/a.ttf"})
+        clear_config_cache()
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def write_json(self, path, value):
+        with open(path, 'w') as f:
+            json.dump(value, f)
+
+    def test_config_is_parsed_once_until_changed(self):
+        config = load_config(self.config_path)
+        self.assertEqual(config.font_size, 12)
+        self.assertEqual(config.layout, 'code')
+        self.assertEqual(config.font_path, os.path.join(self.test_dir.name, "fonts/a.ttf"))
+        self.assertIs(load_config(self.config_path), config)
+
+        self.write_json(self.config_path, {"font_size": 14, "layout": "text"})
+        self.assertEqual(load_config(self.config_path).font_size, 14)
+
+        self.write_json(self.config_path, {"layout": "columns"})
+        with self.assertRaises(ValueError):
+            load_config(self.config_path)
+
+    def test_ignore_folders(self):
+        ignore_path = os.path.join(self.test_dir.name, "ignore.json")
+        self.write_json(ignore_path, ["node_modules", ".git"])
+        self.assertEqual(load_ignore_folders(ignore_path), ("node_modules", ".git"))
+        self.assertIs(load_ignore_folders(ignore_path), load_ignore_folders(ignore_path))
+        self.assertEqual(load_ignore_folders(os.path.join(self.test_dir.name, "missing.json")), ())
+
+if __name__ == "__main__":
+    unittest.main()
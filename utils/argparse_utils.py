@@ -1,21 +1,76 @@
 import argparse
 
-def parse_arguments():
-    parser = argparse.ArgumentParser(
+from pdf_generator.compression import COMPRESSION_PRESETS
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return number
+
+def positive_float(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got {value}")
+    return number
+
+class RaisingArgumentParser(argparse.ArgumentParser):
+    """Raises ValueError for invalid arguments instead of printing the usage and exiting."""
+
+    def error(self, message):
+        raise ValueError(message)
+
+def parse_arguments(argv=None, parser_class=argparse.ArgumentParser):
+    """Parses the command line, or ``argv`` if given.
+
+    With :class:`RaisingArgumentParser`, invalid arguments raise ValueError, so that
+    options received from elsewhere (such as render service jobs) can be checked.
+    """
+    parser = parser_class(
         description='Create a PDF from the contents of files in a directory and its subdirectories.'
     )
-    parser.add_argument('directory', type=str, nargs='?', help='The directory containing the files to convert to PDF.')
+    parser.add_argument('directory', type=str, nargs='?', help='The directory containing the files to convert to PDF, or a zip or tar archive, or REPOSITORY@REVISION of a git repository.')
+    parser.add_argument('--batch', metavar='FILE', help='Generate the outputs of every directory listed in FILE (one per line, or a JSON list), sharing one pool of --jobs workers')
     parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose mode.')
     parser.add_argument('-i', '--include-hidden', action='store_true', help='Include hidden files.')
     parser.add_argument('-t', '--file-types', action='append', nargs='*', default=[], help='File types to process')
     parser.add_argument('-e', '--exclude-folders', action='append', nargs='*', default=[], help='Folders to exclude from processing')
     parser.add_argument('-f', '--exclude-file-types', action='append', nargs='*', default=[], help='File types to exclude from processing')
+    parser.add_argument('-x', '--exclude-patterns', action='append', nargs='*', default=[], help='Gitignore-style patterns of files and folders to exclude')
+    parser.add_argument('-g', '--gitignore', action='store_true', help='Also exclude what the .gitignore files in the directory exclude')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=1, help='Number of worker processes used to render the PDF')
+    parser.add_argument('--incremental', action='store_true', help='Reuse cached renders of files unchanged since the last run')
+    parser.add_argument('--watch', action='store_true', help='Keep running and update the outputs whenever files change (implies --incremental)')
+    parser.add_argument('--watch-debounce', type=positive_float, default=0.25, metavar='SECONDS', help='With --watch, wait until nothing has changed for this long before updating')
+    parser.add_argument('--watch-poll', type=positive_float, metavar='SECONDS', help='With --watch, scan for changes at this interval instead of using inotify')
+    parser.add_argument('--timeout', type=positive_float, help='Stop the generation after this many seconds')
+    parser.add_argument('--max-bytes', type=positive_int, help='Stop the generation after reading this many bytes')
+    parser.add_argument('--file-timeout', type=positive_float, help='Truncate a file that takes longer than this many seconds to render')
+    parser.add_argument('--max-file-bytes', type=positive_int, help='Skip files larger than this many bytes')
+    parser.add_argument('--stream', action='store_true', help='Write finished pages to the PDF file while it is being generated')
+    parser.add_argument('--compression', choices=list(COMPRESSION_PRESETS), help='Compression preset of the PDF: faster to write or smaller (default: from config.json)')
+    parser.add_argument('--split', choices=['directory', 'bytes', 'pages'], help='Write the PDF as numbered volumes, one per top-level subdirectory or bounded by bytes or pages')
+    parser.add_argument('--volume-size', type=positive_int, help='Bytes of file content or pages per volume with --split bytes or pages')
+    parser.add_argument('--structure-format', choices=['json', 'ndjson', 'tree'], default='json', help='Format of the directory structure file')
+    parser.add_argument('--manifest', action='store_true', help='Also write a SQLite manifest with the size, mtime and inclusion of every entry')
+    parser.add_argument('--manifest-hashes', action='store_true', help='Record content hashes in the manifest (implies --manifest)')
+    parser.add_argument('--log-sync', action='store_true', help='Write log messages as they are logged instead of from a background thread')
+    parser.add_argument('--log-sample', type=positive_int, default=1, metavar='N', help='Log only one in every N per-file messages; the rest are counted')
+    parser.add_argument('--profile', action='store_true', help='Write a timing report next to the PDF')
+    parser.add_argument('--cprofile', action='store_true', help='Also capture PDF generation with cProfile (implies --profile)')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.batch and args.directory:
+        parser.error('give either a directory or --batch, not both')
+    if args.watch and (args.batch or args.split):
+        parser.error('--watch cannot be combined with --batch or --split')
+    if args.volume_size and args.split not in ('bytes', 'pages'):
+        parser.error('--volume-size requires --split bytes or --split pages')
  
     # Flatten lists of lists created by `append` action
     args.file_types = [item for sublist in args.file_types for item in sublist] if args.file_types else []
     args.exclude_folders = [item for sublist in args.exclude_folders for item in sublist] if args.exclude_folders else []
     args.exclude_file_types = [item for sublist in args.exclude_file_types for item in sublist] if args.exclude_file_types else []
+    args.exclude_patterns = [item for sublist in args.exclude_patterns for item in sublist] if args.exclude_patterns else []
 
     return args
\ No newline at end of file
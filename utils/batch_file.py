@@ -0,0 +1,45 @@
+import json
+import os
+from typing import List, NamedTuple
+
+class BatchEntry(NamedTuple):
+    """A directory of a batch and the name of its folder under output/."""
+    directory: str
+    name: str
+
+def read_batch_file(batch_file_path: str) -> List[BatchEntry]:
+    """Reads the directories of a batch.
+
+    A ``.json`` file holds a list whose items are either a directory path or an object
+    with a ``directory`` and an optional output ``name``. Any other file lists one
+    directory per line; blank lines and lines starting with ``#`` are skipped.
+    Relative directories are relative to the batch file. Each output name defaults
+    to the name of the directory, and must be unique. Raises ValueError otherwise.
+    """
+    base_dir = os.path.dirname(os.path.abspath(batch_file_path))
+    with open(batch_file_path, 'r', encoding='utf-8') as batch_file:
+        if batch_file_path.lower().endswith('.json'):
+            items = json.load(batch_file)
+            if not isinstance(items, list):
+                raise ValueError(f"{batch_file_path} must hold a list of directories")
+        else:
+            items = [line.strip() for line in batch_file]
+            items = [line for line in items if line and not line.startswith('#')]
+
+    entries = []
+    for item in items:
+        if isinstance(item, dict):
+            if 'directory' not in item:
+                raise ValueError(f"Batch item {item} in {batch_file_path} has no 'directory'")
+            directory, name = item['directory'], item.get('name')
+        else:
+            directory, name = item, None
+        directory = os.path.normpath(os.path.join(base_dir, os.path.expanduser(directory)))
+        entries.append(BatchEntry(directory, name or os.path.basename(directory)))
+
+    names = [entry.name for entry in entries]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Output names appear more than once in {batch_file_path}: {', '.join(duplicates)}. "
+                         "Give the directories distinct names.")
+    return entries
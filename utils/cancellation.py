@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Optional
+
+class OperationCancelled(Exception):
+    """Raised when a generation is cancelled or runs out of its time or byte budget."""
+
+class BudgetExceeded(OperationCancelled):
+    """Raised when a generation runs past its time or byte budget."""
+
+class CancellationToken:
+    """Lets a long-running generation be stopped cooperatively.
+
+    The token is passed down the pipeline, which checks it between files and
+    chunks. It can be cancelled from another thread, and it also enforces
+    whole-job budgets (``timeout`` in seconds, ``max_bytes`` read) and per-file
+    budgets (``file_timeout``, ``max_file_bytes``). A job that exceeds a job
+    budget is cancelled. A file that exceeds a per-file budget is skipped or
+    truncated, and the job goes on.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, max_bytes: Optional[int] = None,
+                 file_timeout: Optional[float] = None, max_file_bytes: Optional[int] = None,
+                 deadline: Optional[float] = None):
+        # Deadlines use wall-clock time so they can be handed to worker processes
+        self.deadline = deadline if deadline is not None else (time.time() + timeout if timeout else None)
+        self.max_bytes = max_bytes
+        self.file_timeout = file_timeout
+        self.max_file_bytes = max_file_bytes
+        self.bytes_read = 0
+        self.reason: Optional[str] = None
+        self.budget_exceeded = False
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "Operation cancelled."):
+        """Requests cancellation. Safe to call from any thread."""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def _exceed_budget(self, reason: str):
+        if not self._event.is_set():
+            self.budget_exceeded = True
+            self.cancel(reason)
+
+    def raise_if_cancelled(self):
+        """Raises OperationCancelled if the token was cancelled or the job ran out of time."""
+        if self.deadline is not None and not self._event.is_set() and time.time() > self.deadline:
+            self._exceed_budget("Time budget exceeded.")
+        if self._event.is_set():
+            raise (BudgetExceeded if self.budget_exceeded else OperationCancelled)(self.reason)
+
+    def add_bytes(self, count: int):
+        """Charges bytes read against the job's byte budget."""
+        with self._lock:
+            self.bytes_read += count
+            over_budget = self.max_bytes is not None and self.bytes_read > self.max_bytes
+        if over_budget:
+            self._exceed_budget(f"Byte budget of {self.max_bytes} bytes exceeded.")
+        self.raise_if_cancelled()
+
+    def exceeds_file_size(self, size: int) -> bool:
+        return self.max_file_bytes is not None and size > self.max_file_bytes
+
+    def file_timed_out(self, started: float) -> bool:
+        """Tells whether a file whose processing began at ``started`` has used up its time budget."""
+        return self.file_timeout is not None and time.time() - started > self.file_timeout
+
+    def to_settings(self) -> dict:
+        """Returns the picklable budgets to recreate the token in a worker process.
+
+        Cancellation requested later, and bytes read by workers, are handled by the
+        parent process between batches.
+        """
+        return {
+            'deadline': self.deadline,
+            'file_timeout': self.file_timeout,
+            'max_file_bytes': self.max_file_bytes,
+        }
@@ -0,0 +1,47 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# Parsed files by (absolute path, parser), with the (mtime, size, inode) they were parsed at
+_cache: Dict[Tuple[str, Callable], Tuple[Tuple[int, int, int], object]] = {}
+_lock = threading.Lock()
+
+def load_cached(path: str, parse: Callable[[str], T]) -> T:
+    """Returns ``parse(path)``, parsing the file only once per process until it changes.
+
+    Every generator, GUI run and worker process reads the same configuration files,
+    so the parsed result is kept, keyed by the file's modification time, size and
+    inode. ``parse`` should return an immutable value, since callers share it.
+    Raises FileNotFoundError like ``open`` if the file does not exist.
+    """
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    key = (os.path.abspath(path), parse)
+    with _lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    value = parse(path)
+    with _lock:
+        _cache[key] = (stamp, value)
+    return value
+
+def clear_config_cache():
+    """Forgets every parsed file."""
+    with _lock:
+        _cache.clear()
+
+def _read_ignore_folders(path: str) -> Tuple[str, ...]:
+    with open(path, 'r') as ignore_file:
+        return tuple(json.load(ignore_file))
+
+def load_ignore_folders(ignore_file_path: str) -> Tuple[str, ...]:
+    """Loads the folder names to ignore from a JSON list, or none if the file does not exist."""
+    try:
+        return load_cached(ignore_file_path, _read_ignore_folders)
+    except FileNotFoundError:
+        print(f"Warning: Ignore file '{ignore_file_path}' not found. Proceeding without ignoring folders.")
+        return ()
@@ -0,0 +1,410 @@
+import os
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from utils.cancellation import CancellationToken, OperationCancelled
+from utils.file_sniffer import sniff_binary_type
+from utils.logging_utils import file_logger, logger
+from utils.path_filter import GitignoreStack, PathFilter
+from utils.profiler import NULL_PROFILER, Profiler
+from utils.sources import ScanEntry, Source, open_source
+
+# A background scan hands entries over to readers in batches of this size
+SCAN_BATCH_SIZE = 256
+
+# The path index of a manifest is rebuilt once this many splices have to be replayed on lookups
+MAX_PENDING_SPLICES = 64
+
+class DirectoryManifest:
+    """The result of one scan: every entry of the tree in depth-first (pre-order) order.
+
+    Children always follow their parent directory, and ``depth`` tells the consumer
+    where a subtree ends, so callers can skip whole subtrees without touching the disk.
+
+    A manifest filled by a background scan can be iterated while the scan is still
+    running: iteration yields entries as they are found and ends when the scan does.
+    If the scan failed, iteration and :meth:`wait` raise its error once the entries
+    found before it are used up.
+    Files are sniffed through the ``source`` the entries were listed from.
+    """
+
+    def __init__(self, directory: str, entries: Optional[List[ScanEntry]] = None, complete: bool = True,
+                 source: Optional[Source] = None):
+        self.directory = directory
+        self.source = source if source is not None else open_source(directory)
+        self.entries = entries if entries is not None else []
+        self.complete = complete
+        self.error: Optional[BaseException] = None  # Why a background scan stopped before the end
+        self._condition = threading.Condition()
+        # Sniffed types, shared by the renderer and the thread counting its files
+        self._binary_types: Dict[str, Optional[str]] = {}
+        self._binary_types_lock = threading.Lock()
+        # Position of each entry by relative path, built on first use, with the number of splices it was recorded
+        # after; it is moved by the splices made since (see index_of)
+        self._positions: Optional[Dict[str, Tuple[int, int]]] = None
+        self._splices: List[Tuple[int, int, int]] = []  # (start, entries removed, entries inserted)
+
+    def __iter__(self) -> Iterator[ScanEntry]:
+        if self.complete and self.error is None:
+            return iter(self.entries)
+        return self._iter_while_scanning()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _iter_while_scanning(self) -> Iterator[ScanEntry]:
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self.entries) and not self.complete:
+                    self._condition.wait()
+                batch = self.entries[index:]
+            if not batch:
+                if self.error is not None:
+                    raise self.error
+                return
+            index += len(batch)
+            yield from batch
+
+    def add_entries(self, entries: List[ScanEntry]):
+        """Appends entries found by a background scan and wakes up the readers."""
+        with self._condition:
+            self.entries.extend(entries)
+            self._positions = None
+            self._condition.notify_all()
+
+    def index_of(self, relative_path: str) -> Optional[int]:
+        """Returns the position of the entry at a path, or None if there is none.
+
+        Entries are indexed by path on the first call. A position recorded before
+        later calls to :meth:`splice` is moved past them when it is looked up, and the
+        entries are indexed afresh once MAX_PENDING_SPLICES splices have piled up.
+        """
+        if self._positions is None or len(self._splices) > MAX_PENDING_SPLICES:
+            self._positions = {entry.relative_path: (index, 0) for index, entry in enumerate(self.entries)}
+            self._splices = []
+        found = self._positions.get(relative_path)
+        if found is None:
+            return None
+        position, recorded_after = found
+        for start, removed, inserted in self._splices[recorded_after:]:
+            if position >= start:  # The entries a splice removed are no longer indexed
+                position += inserted - removed
+        return position
+
+    def splice(self, start: int, end: int, entries: List[ScanEntry]):
+        """Replaces the entries from ``start`` to ``end`` with ``entries``, keeping the path index right."""
+        if self._positions is not None:
+            for entry in self.entries[start:end]:
+                self._positions.pop(entry.relative_path, None)
+            self._splices.append((start, end - start, len(entries)))
+            for offset, entry in enumerate(entries):
+                self._positions[entry.relative_path] = (start + offset, len(self._splices))
+        self.entries[start:end] = entries
+
+    def replace_entries(self, entries: List[ScanEntry]):
+        """Replaces all the entries, as after scanning the whole tree again."""
+        self.entries = entries
+        self._positions = None
+
+    def finish(self, error: Optional[BaseException] = None):
+        """Marks the scan as complete, or as failed with ``error``."""
+        with self._condition:
+            self.complete = True
+            self.error = error
+            self._condition.notify_all()
+
+    def wait(self):
+        """Blocks until the scan is complete. Raises the error of a scan that failed."""
+        with self._condition:
+            while not self.complete:
+                self._condition.wait()
+        if self.error is not None:
+            raise self.error
+
+    def forget_binary_types(self, paths: Iterable[str]):
+        """Drops the remembered types of files that changed, so they are sniffed again."""
+        with self._binary_types_lock:
+            for path in paths:
+                self._binary_types.pop(path, None)
+
+    def iter_files(self) -> Iterator[ScanEntry]:
+        return (entry for entry in self if entry.is_file)
+
+    def binary_type(self, entry: ScanEntry) -> Optional[str]:
+        """Returns the MIME type of a binary file, or None for a text file.
+
+        Only the first few KB of the file are read, and the result is remembered so
+        that counting and rendering from the same manifest sniff each file once.
+        """
+        with self._binary_types_lock:
+            if entry.path in self._binary_types:
+                return self._binary_types[entry.path]
+        try:
+            if entry.size:
+                with self.source.open(entry.relative_path) as file:
+                    binary_type = sniff_binary_type(entry.path, file)
+            else:
+                binary_type = None
+        except OSError:
+            binary_type = None  # Let the renderer report the error
+        with self._binary_types_lock:
+            # The file is sniffed outside the lock, so the other thread may have got there first
+            if entry.path in self._binary_types:
+                return self._binary_types[entry.path]
+            self._binary_types[entry.path] = binary_type
+        if binary_type:
+            file_logger.info("Skipping binary file %s (%s)", entry.path, binary_type)
+        return binary_type
+
+
+class DirectoryScanner:
+    """Walks a tree once, listing each directory from its source (``os.scandir`` for a directory on disk).
+
+    Entries excluded by the path filter are dropped, and excluded folders are pruned
+    before descending. When no filter is given, only folders whose name is in
+    ``ignore_folders`` are pruned. A cancellation token, if given, is checked
+    before each directory is opened. Without a ``source``, the one of ``directory``
+    is opened (see :func:`open_source`), so archives and git revisions can be scanned too.
+    """
+
+    def __init__(self, directory: str, ignore_folders: Optional[Iterable[str]] = None,
+                 path_filter: Optional[PathFilter] = None,
+                 cancel_token: Optional[CancellationToken] = None,
+                 profiler: Profiler = NULL_PROFILER,
+                 source: Optional[Source] = None):
+        self.directory = directory
+        self.source = source if source is not None else open_source(directory)
+        self.path_filter = path_filter if path_filter is not None else PathFilter(ignore_folders or ())
+        self.cancel_token = cancel_token
+        self.profiler = profiler
+
+    def iter_entries(self) -> Iterator[ScanEntry]:
+        """Yields the entries of the tree in depth-first (pre-order) order."""
+        return self._iter_tree('', 0, self._enter_directory((), ''))
+
+    def iter_entries_with_last(self, prune_names: Iterable[str] = ()) -> Iterator[Tuple[ScanEntry, bool]]:
+        """Yields the entries of the tree in depth-first order, each with whether it is the last of its siblings.
+
+        One entry of every directory being listed is read ahead to tell. Folders named
+        in ``prune_names`` are left out with everything below them, like folders the
+        path filter excludes, so they do not count as siblings.
+        """
+        prune_names = frozenset(prune_names)
+        gitignores = self._enter_directory((), '')
+        listing = self._iter_kept('', 0, gitignores, prune_names)
+        stack = [[listing, next(listing, None), gitignores]]  # A listing, its next entry and its gitignore rules
+        try:
+            while stack:
+                frame = stack[-1]
+                entry = frame[1]
+                if entry is None:
+                    frame[0].close()
+                    stack.pop()
+                    continue
+                frame[1] = next(frame[0], None)
+                yield entry, frame[1] is None
+                if entry.is_dir:
+                    if self.cancel_token:
+                        self.cancel_token.raise_if_cancelled()
+                    child_gitignores = self._enter_directory(frame[2], entry.relative_path)
+                    listing = self._iter_kept(entry.relative_path, entry.depth + 1, child_gitignores, prune_names)
+                    stack.append([listing, next(listing, None), child_gitignores])
+        finally:
+            for listing, _, _ in stack:
+                listing.close()
+
+    def _iter_kept(self, relative_path: str, depth: int, gitignores: GitignoreStack,
+                   prune_names: frozenset) -> Iterator[ScanEntry]:
+        # The entries of one directory that the scan keeps
+        path_filter = self.path_filter
+        with closing(self.source.list_dir(relative_path, depth)) as listing:
+            for entry in listing:
+                if entry.is_dir:
+                    if entry.name in prune_names or path_filter.excludes_dir(entry.name, entry.relative_path):
+                        continue
+                elif path_filter.excludes_file(entry.name, entry.relative_path):
+                    continue
+                if gitignores and path_filter.is_gitignored(gitignores, entry.relative_path, entry.is_dir):
+                    continue
+                yield entry
+
+    def _enter_directory(self, gitignores: GitignoreStack, relative_path: str) -> GitignoreStack:
+        # The .gitignore files are read from the source too
+        return self.path_filter.enter_directory(gitignores, relative_path, relative_path, self.source.open)
+
+    def _iter_tree(self, relative_path: str, depth: int, gitignores: GitignoreStack) -> Iterator[ScanEntry]:
+        path_filter = self.path_filter
+        list_dir = self.source.list_dir
+        stack = [(list_dir(relative_path, depth), relative_path, depth, gitignores)]
+        try:
+            while stack:
+                iterator, _, depth, gitignores = stack[-1]
+                entry = next(iterator, None)
+                if entry is None:
+                    iterator.close()
+                    stack.pop()
+                    continue
+
+                if entry.is_dir:
+                    if path_filter.excludes_dir(entry.name, entry.relative_path):
+                        continue
+                elif path_filter.excludes_file(entry.name, entry.relative_path):
+                    continue
+                if gitignores and path_filter.is_gitignored(gitignores, entry.relative_path, entry.is_dir):
+                    continue
+
+                yield entry
+                if entry.is_dir:
+                    if self.cancel_token:
+                        self.cancel_token.raise_if_cancelled()
+                    child_gitignores = self._enter_directory(gitignores, entry.relative_path)
+                    stack.append((list_dir(entry.relative_path, depth + 1), entry.relative_path, depth + 1,
+                                  child_gitignores))
+        finally:
+            for iterator, _, _, _ in stack:
+                iterator.close()
+
+    def scan_entry(self, relative_path: str) -> Optional[ScanEntry]:
+        """Returns the entry at a path of the tree, or None if it is missing or excluded."""
+        entry, _ = self._scan_entry(relative_path)
+        return entry
+
+    def _scan_entry(self, relative_path: str) -> Tuple[Optional[ScanEntry], GitignoreStack]:
+        # Also returns the gitignore rules that apply inside the entry, for a directory
+        path_filter = self.path_filter
+        parts = relative_path.split(os.sep)
+        gitignores = self._enter_directory((), '')
+        for depth, name in enumerate(parts):
+            entry = self.source.entry(os.sep.join(parts[:depth + 1]))
+            if entry is None or (depth < len(parts) - 1 and not entry.is_dir):
+                return None, gitignores
+            if entry.is_dir:
+                if path_filter.excludes_dir(name, entry.relative_path):
+                    return None, gitignores
+            elif path_filter.excludes_file(name, entry.relative_path):
+                return None, gitignores
+            if gitignores and path_filter.is_gitignored(gitignores, entry.relative_path, entry.is_dir):
+                return None, gitignores
+            if entry.is_dir:
+                gitignores = self._enter_directory(gitignores, entry.relative_path)
+        return entry, gitignores
+
+    def update_manifest(self, manifest: DirectoryManifest, relative_paths: Optional[Iterable[str]] = None,
+                        splices: Optional[List[Tuple[int, List[ScanEntry], List[ScanEntry]]]] = None
+                        ) -> Tuple[Set[str], bool]:
+        """Brings a complete manifest up to date after the given paths changed on disk.
+
+        Only the entries at those paths are looked at again, with the subtrees of the
+        directories that appeared; the entries below a path that disappeared are
+        dropped. New entries go after their siblings. Without ``relative_paths``, the
+        whole tree is scanned again. Returns the relative paths of the files that were
+        added, changed or removed, and whether entries were added or removed.
+
+        Every change made to the entries is appended to ``splices``, if given, as
+        ``(start, removed entries, added entries)`` in the order they were made, so that
+        other outputs can follow the manifest without walking it. A file changed in place
+        is one entry removed and added at the same position.
+        """
+        if relative_paths is None:
+            old_entries = manifest.entries
+            old = {entry.relative_path: entry for entry in old_entries}
+            manifest.replace_entries(list(self.iter_entries()))
+            if splices is not None:
+                splices.append((0, old_entries, manifest.entries))
+            new = {entry.relative_path: entry for entry in manifest.entries}
+            changed = {path for path, entry in new.items() if old.get(path) != entry}
+            changed.update(path for path in old if path not in new)
+            manifest.forget_binary_types(os.path.join(self.directory, path) for path in changed)
+            return {path for path in changed if (new.get(path) or old[path]).is_file}, old.keys() != new.keys()
+
+        changed = set()
+        structure_changed = False
+        # Parents are handled before their children, so new entries can be placed after them
+        for relative_path in sorted(set(relative_paths), key=lambda path: (path.count(os.sep), path)):
+            entries = manifest.entries
+            index = manifest.index_of(relative_path)
+            old = entries[index] if index is not None else None
+            new, gitignores = self._scan_entry(relative_path)
+            if old is not None and new is not None and old.is_dir == new.is_dir:
+                if old != new and not new.is_dir:
+                    entries[index] = new
+                    changed.add(relative_path)
+                    if splices is not None:
+                        splices.append((index, [old], [new]))
+                continue
+
+            if old is not None:
+                end = self._subtree_end(entries, index)
+                removed = entries[index:end]
+                changed.update(entry.relative_path for entry in removed if entry.is_file)
+                manifest.splice(index, end, [])
+                if splices is not None:
+                    splices.append((index, removed, []))
+                structure_changed = True
+            if new is not None:
+                parent_path = os.path.dirname(relative_path)
+                if parent_path:
+                    parent = manifest.index_of(parent_path)
+                    if parent is None:
+                        continue  # The parent is excluded, so the entry is too
+                    position = self._subtree_end(entries, parent)
+                else:
+                    position = len(entries)
+                added = [new]
+                if new.is_dir:
+                    added.extend(self._iter_tree(relative_path, new.depth + 1, gitignores))
+                manifest.splice(position, position, added)
+                if splices is not None:
+                    splices.append((position, [], added))
+                changed.update(entry.relative_path for entry in added if entry.is_file)
+                structure_changed = True
+        manifest.forget_binary_types(os.path.join(self.directory, path) for path in changed)
+        return changed, structure_changed
+
+    @staticmethod
+    def _subtree_end(entries: List[ScanEntry], index: int) -> int:
+        """Returns the index after the last entry below the entry at ``index``."""
+        depth = entries[index].depth
+        end = index + 1
+        while end < len(entries) and entries[end].depth > depth:
+            end += 1
+        return end
+
+    def scan(self) -> DirectoryManifest:
+        """Scans the whole tree and returns the manifest."""
+        with self.profiler.stage('scan'):
+            return DirectoryManifest(self.directory, list(self.iter_entries()), source=self.source)
+
+    def scan_in_background(self) -> DirectoryManifest:
+        """Starts scanning in a background thread and returns the manifest right away.
+
+        Consumers can start working on the first entries while the rest of the tree
+        is still being walked.
+        """
+        manifest = DirectoryManifest(self.directory, complete=False, source=self.source)
+        threading.Thread(target=self._fill_manifest, args=(manifest,), name='directory-scanner', daemon=True).start()
+        return manifest
+
+    def _fill_manifest(self, manifest: DirectoryManifest):
+        batch = []
+        started = time.perf_counter()
+        error = None
+        try:
+            for entry in self.iter_entries():
+                batch.append(entry)
+                if len(batch) >= SCAN_BATCH_SIZE:
+                    manifest.add_entries(batch)
+                    batch = []
+        except OperationCancelled as e:
+            logger.info(f"Stopped scanning directory {self.directory}: {e}")
+        except Exception as e:
+            # Handed to the consumers, so that a truncated manifest does not pass for a complete one
+            logger.error(f"Error scanning directory {self.directory}: {e}")
+            error = e
+        finally:
+            manifest.add_entries(batch)
+            manifest.finish(error)
+            self.profiler.add_time('scan', time.perf_counter() - started)
@@ -0,0 +1,149 @@
+import os
+import codecs
+import mimetypes
+from functools import lru_cache
+from typing import BinaryIO, NamedTuple, Optional
+
+# Only the start of a file is read to decide whether it is binary
+SNIFF_SIZE = 8192
+
+# Share of undecodable bytes and control characters above which a file is treated as binary
+MAX_NON_TEXT_RATIO = 0.1
+
+MAGIC_NUMBERS = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'\x00\x00\x01\x00', 'image/x-icon'),
+    (b'%PDF-', 'application/pdf'),
+    (b'PK\x03\x04', 'application/zip'),
+    (b'PK\x05\x06', 'application/zip'),
+    (b'\x1f\x8b\x08', 'application/gzip'),
+    (b'\xfd7zXZ\x00', 'application/x-xz'),
+    (b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (b'\x28\xb5\x2f\xfd', 'application/zstd'),
+    (b'\x7fELF', 'application/x-executable'),
+    (b'\xca\xfe\xba\xbe', 'application/java-vm'),
+    (b'\xcf\xfa\xed\xfe', 'application/x-mach-binary'),
+    (b'\x00asm', 'application/wasm'),
+    (b'SQLite format 3\x00', 'application/vnd.sqlite3'),
+    (b'wOFF', 'font/woff'),
+    (b'wOF2', 'font/woff2'),
+    (b'OggS', 'audio/ogg'),
+    (b'fLaC', 'audio/flac'),
+    (b'ID3', 'audio/mpeg'),
+)
+
+# Byte order marks and the codec of the text that follows them. The UTF-32 LE mark
+# starts with the UTF-16 LE one, so it is tried first.
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+# Text without a byte order mark is taken as UTF-16 if this share of its code units
+# have a zero high byte, as in mostly ASCII text, and hardly any has a zero low byte
+MIN_UTF16_ZERO_RATIO = 0.7
+MAX_UTF16_LOW_ZERO_RATIO = 0.02
+
+# Bytes that Windows-1252 leaves undefined; text that uses them is read as Latin-1
+_CP1252_UNDEFINED = (b'\x81', b'\x8d', b'\x8f', b'\x90', b'\x9d')
+
+# Control characters that are common in text files
+_TEXT_CONTROL_CHARS = frozenset('\t\n\r\f\v\b\x1b')
+
+class TextEncoding(NamedTuple):
+    """The codec of a text file, and the size of the byte order mark its text starts after."""
+    codec: str
+    bom_size: int = 0
+
+def _guess_utf16(head: bytes) -> Optional[str]:
+    units = len(head) // 2
+    if units < 16:
+        return None
+    even_zeros = head[0:units * 2:2].count(0)
+    odd_zeros = head[1:units * 2:2].count(0)
+    if odd_zeros >= MIN_UTF16_ZERO_RATIO * units and even_zeros <= MAX_UTF16_LOW_ZERO_RATIO * units:
+        return 'utf-16-le'
+    if even_zeros >= MIN_UTF16_ZERO_RATIO * units and odd_zeros <= MAX_UTF16_LOW_ZERO_RATIO * units:
+        return 'utf-16-be'
+    return None
+
+def legacy_encoding(data: bytes) -> TextEncoding:
+    """Returns the 8-bit encoding to read text that is not UTF-8 with: Windows-1252, or Latin-1."""
+    return TextEncoding('latin-1' if any(byte in data for byte in _CP1252_UNDEFINED) else 'cp1252')
+
+def detect_encoding(head: bytes) -> TextEncoding:
+    """Guesses the encoding of a text file from its start.
+
+    A byte order mark decides. Without one, the zero bytes of mostly ASCII text give
+    UTF-16 away; anything else is UTF-8 if ``head`` decodes as UTF-8, or else an
+    8-bit encoding (see :func:`legacy_encoding`). The rest of the file may still
+    prove the guess wrong.
+    """
+    for bom, codec in BYTE_ORDER_MARKS:
+        if head.startswith(bom):
+            return TextEncoding(codec, len(bom))
+    codec = _guess_utf16(head)
+    if codec:
+        return TextEncoding(codec)
+    try:
+        # A multi-byte character cut off at the end of the sample is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        return legacy_encoding(head)
+    return TextEncoding('utf-8')
+
+def _is_mostly_text(text: str) -> bool:
+    non_text = sum(1 for char in text if char == '\ufffd' or ('\x7f' <= char <= '\x9f')
+                   or (char < ' ' and char not in _TEXT_CONTROL_CHARS))
+    return non_text <= MAX_NON_TEXT_RATIO * len(text)
+
+@lru_cache(maxsize=None)
+def _guess_type_for_extension(extension: str) -> Optional[str]:
+    return mimetypes.guess_type(f"file{extension}")[0]
+
+def guess_mime_type(file_path: str) -> Optional[str]:
+    """Guesses the MIME type of a file from its name, caching the result per extension."""
+    return _guess_type_for_extension(os.path.splitext(file_path)[1].lower())
+
+def sniff_binary_type(file_path: str, file: Optional[BinaryIO] = None) -> Optional[str]:
+    """Looks at the start of a file and returns a MIME type if it is binary, or None for text.
+
+    A file is binary if it starts with a known magic number, contains a NUL byte, or
+    if too much of its start is undecodable or made of control characters. The start
+    is decoded with the encoding :func:`detect_encoding` guesses, so 8-bit text is
+    not mistaken for broken UTF-8, and the NUL bytes of UTF-16 and UTF-32 text are
+    part of its characters.
+    The start is read from ``file`` if it is given (already open in binary mode), or
+    else from ``file_path``.
+    """
+    if file is None:
+        with open(file_path, 'rb') as file:
+            head = file.read(SNIFF_SIZE)
+    else:
+        head = file.read(SNIFF_SIZE)
+    if not head:
+        return None
+
+    for magic, mime_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime_type
+    encoding = detect_encoding(head)
+    if not encoding.codec.startswith(('utf-16', 'utf-32')) and b'\x00' in head:
+        return 'application/octet-stream'
+
+    # A multi-byte character cut off at the end of the sample is not an error
+    text = codecs.getincrementaldecoder(encoding.codec)(errors='replace').decode(head[encoding.bom_size:], final=False)
+    if not _is_mostly_text(text):
+        mime_type = guess_mime_type(file_path)
+        # The extension of a file that does not hold text says nothing about what it holds
+        return mime_type if mime_type and not mime_type.startswith('text/') else 'application/octet-stream'
+    return None
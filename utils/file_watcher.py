@@ -0,0 +1,247 @@
+"""
+Watches a directory tree for changes, with inotify where it is available and by
+polling elsewhere.
+
+Watchers report the relative paths that changed, in batches: once something
+changes, they keep collecting until nothing has changed for the debounce delay,
+so that an editor saving a file or a checkout touching many files leads to one
+update rather than many.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, FrozenSet, NamedTuple, Optional, Set, Tuple
+
+from utils.directory_scanner import DirectoryScanner
+from utils.logging_utils import logger
+from utils.path_filter import PathFilter
+
+# Seconds without changes after which a batch of changes is reported
+DEFAULT_DEBOUNCE = 0.25
+
+# A batch is reported after this many debounce delays even if changes keep coming
+MAX_DEBOUNCE_DELAYS = 20
+
+# Seconds between two scans of the tree when polling
+DEFAULT_POLL_INTERVAL = 1.0
+
+# inotify constants, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_EXCL_UNLINK)
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, length of the name
+
+class ChangeBatch(NamedTuple):
+    """Relative paths that changed. ``rescan`` is set when changes may have been missed."""
+    paths: FrozenSet[str]
+    rescan: bool
+
+class FileWatcher:
+    """Base class of the watchers; subclasses read the changes that happened within a timeout."""
+
+    kind = 'none'
+
+    def __init__(self, directory: str, path_filter: PathFilter):
+        self.directory = directory
+        self.path_filter = path_filter
+
+    def wait_for_changes(self, debounce: float = DEFAULT_DEBOUNCE,
+                         timeout: Optional[float] = None) -> Optional[ChangeBatch]:
+        """Blocks until something changes and returns the batch, or None after ``timeout`` seconds."""
+        paths, rescan = self._read_changes(timeout)
+        if not paths and not rescan:
+            return None
+        deadline = time.monotonic() + debounce * MAX_DEBOUNCE_DELAYS
+        while time.monotonic() < deadline:
+            more_paths, more_rescan = self._read_changes(min(debounce, max(0.0, deadline - time.monotonic())))
+            if not more_paths and not more_rescan:
+                break
+            paths |= more_paths
+            rescan = rescan or more_rescan
+        return ChangeBatch(frozenset(paths), rescan)
+
+    def _read_changes(self, timeout: Optional[float]) -> Tuple[Set[str], bool]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PollingWatcher(FileWatcher):
+    """Finds changes by scanning the tree every ``interval`` seconds and comparing sizes and mtimes.
+
+    Works everywhere, but each scan costs as much as the tree is large.
+    """
+
+    kind = 'polling'
+
+    def __init__(self, directory: str, path_filter: PathFilter, interval: float = DEFAULT_POLL_INTERVAL):
+        super().__init__(directory, path_filter)
+        self.interval = interval
+        self.snapshot = self._scan()
+        self.next_poll = time.monotonic() + interval
+
+    def _scan(self) -> Dict[str, tuple]:
+        scanner = DirectoryScanner(self.directory, path_filter=self.path_filter)
+        return {entry.relative_path: (entry.is_dir, entry.size, entry.mtime_ns) for entry in scanner.iter_entries()}
+
+    def _read_changes(self, timeout: Optional[float]) -> Tuple[Set[str], bool]:
+        wait = max(0.0, self.next_poll - time.monotonic())
+        if timeout is not None and timeout < wait:
+            time.sleep(timeout)
+            return set(), False
+        time.sleep(wait)
+        self.next_poll = time.monotonic() + self.interval
+        snapshot = self._scan()
+        changed = {path for path, stamp in snapshot.items() if self.snapshot.get(path) != stamp}
+        changed.update(path for path in self.snapshot if path not in snapshot)
+        self.snapshot = snapshot
+        return changed, False
+
+
+class InotifyWatcher(FileWatcher):
+    """Receives changes from the Linux kernel through inotify, so nothing is scanned while waiting.
+
+    Every directory of the tree that the path filter does not exclude is watched,
+    including the ones created later. Raises OSError if inotify is not available
+    or the watch limit (``fs.inotify.max_user_watches``) is reached.
+    """
+
+    kind = 'inotify'
+
+    def __init__(self, directory: str, path_filter: PathFilter):
+        super().__init__(directory, path_filter)
+        self._libc = _load_libc()
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self.watches: Dict[int, str] = {}  # Watch descriptor -> relative path of the directory
+        try:
+            self._watch_tree('')
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, relative_path: str):
+        """Watches a directory and the directories below it that are not excluded."""
+        self._add_watch(relative_path)
+        stack = [relative_path]
+        while stack:
+            parent = stack.pop()
+            try:
+                with os.scandir(os.path.join(self.directory, parent)) as entries:
+                    for entry in entries:
+                        child = os.path.join(parent, entry.name) if parent else entry.name
+                        if entry.is_dir(follow_symlinks=False) and not self.path_filter.excludes_dir(entry.name, child):
+                            self._add_watch(child)
+                            stack.append(child)
+            except OSError:
+                continue  # Removed in the meantime; its parent reports it
+
+    def _add_watch(self, relative_path: str):
+        path = os.path.join(self.directory, relative_path) if relative_path else self.directory
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(error, f"Cannot watch {path}: {os.strerror(error)}")
+        self.watches[wd] = relative_path
+
+    def _remove_watches(self, relative_path: str):
+        prefix = relative_path + os.sep
+        for wd, path in list(self.watches.items()):
+            if path == relative_path or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def _read_changes(self, timeout: Optional[float]) -> Tuple[Set[str], bool]:
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set(), False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set(), False
+
+        changed = set()
+        rescan = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0'))
+            offset += _EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            parent = self.watches.get(wd)
+            if parent is None or not name:
+                continue  # Events about a watched directory itself are also reported by its parent
+            relative_path = os.path.join(parent, name) if parent else name
+            changed.add(relative_path)
+            if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                self._remove_watches(relative_path)  # Its events would come under the old path
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and \
+                    not self.path_filter.excludes_dir(name, relative_path):
+                try:
+                    self._watch_tree(relative_path)
+                except OSError as e:
+                    logger.warning(f"Changes below {relative_path} will be missed: {e}")
+        return changed, rescan
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError(errno.ENOSYS, "The C library has no inotify support")
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+def create_watcher(directory: str, path_filter: PathFilter, poll_interval: Optional[float] = None) -> FileWatcher:
+    """Returns an inotify watcher, or a polling one if inotify cannot be used or ``poll_interval`` is given."""
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(directory, path_filter)
+        except OSError as e:
+            logger.warning(f"Polling for changes every {DEFAULT_POLL_INTERVAL} seconds, inotify cannot be used: {e}")
+    return PollingWatcher(directory, path_filter, poll_interval or DEFAULT_POLL_INTERVAL)
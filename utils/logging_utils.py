@@ -1,8 +1,17 @@
+import atexit
 import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Optional, Tuple
 
 # Create a logger
 logger = logging.getLogger('pdf_generator')
 
+# Messages logged once per file go through this child logger, so they can be sampled
+file_logger = logger.getChild('files')
+
 # Define a custom logging level
 VERBOSE = 55 # Choose a unique level number
 logging.addLevelName(VERBOSE, "VERBOSE")
@@ -14,13 +23,65 @@ def verbose(self, message, *args, **kws):
 
 logging.Logger.verbose = verbose
 
-def configure_logging(log_file):
+# The listener writing queued records, when logging is queued
+_listener: Optional[QueueListener] = None
+
+# The queue spawned worker processes log to, and the listener writing its records in this process
+_worker_queue = None
+_worker_listener: Optional[QueueListener] = None
+
+class SamplingFilter(logging.Filter):
+    """Lets one in every ``every`` records through and counts the others. Warnings and errors always pass."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self.seen = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            self.seen += 1
+            if (self.seen - 1) % self.every == 0:
+                return True
+            self.dropped += 1
+            return False
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """Queues records as they are, leaving the formatting to the listener thread.
+
+    QueueHandler formats records before queueing them, so they can be sent to other
+    processes; these records stay in this process.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(log_file, queued: bool = False, sample_every: int = 1):
+    """Logs everything to ``log_file`` and VERBOSE messages to the console.
+
+    With ``queued``, records are handed to a background thread that formats and
+    writes them, so logging costs the caller little more than appending to a queue.
+    Call :func:`shutdown_logging` (also done at exit) to write what is still queued.
+    With ``sample_every`` greater than 1, only one in that many per-file messages
+    (logged with :data:`file_logger`) is kept; the number dropped is logged at shutdown.
+    """
     if log_file is None or log_file == '':
         raise ValueError('log_file cannot be None or an empty string')
 
-    # Remove all existing handlers
-    for handler in logger.handlers:
+    # Remove the handlers of an earlier configuration to avoid duplicate logging
+    shutdown_logging(summarize=False)
+    for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+        handler.close()
+    for log_filter in file_logger.filters[:]:
+        if isinstance(log_filter, SamplingFilter):
+            file_logger.removeFilter(log_filter)
 
     logger.setLevel(logging.DEBUG) # Set the logger's level to DEBUG to capture all messages
 
@@ -37,12 +98,100 @@ def configure_logging(log_file):
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    # Remove all handlers associated with the logger to avoid duplicate logging
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
+    if sample_every > 1:
+        import multiprocessing.util  # Only needed to report sampling from worker processes
+        sampling_filter = SamplingFilter(sample_every)
+        file_logger.addFilter(sampling_filter)
+        multiprocessing.util.register_after_fork(sampling_filter, _sample_in_worker)
 
     # Add the handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    if queued:
+        global _listener
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        logger.addHandler(_InProcessQueueHandler(log_queue))
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
 
     return logger
+
+def worker_logging() -> Tuple[Optional[Callable], tuple]:
+    """Returns the initializer of a process pool, and its arguments, that sends the workers' records here.
+
+    Spawned workers start with no handlers, so their per-file messages would be lost.
+    With the initializer, they queue their records to a listener in this process that
+    writes them with the configured handlers. Returns no initializer if logging is not
+    configured.
+    """
+    global _worker_queue, _worker_listener
+    if _worker_listener is None:
+        handlers = _listener.handlers if _listener is not None else [
+            handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+        if not handlers:
+            return None, ()
+        import multiprocessing  # Only needed when rendering in worker processes
+        _worker_queue = multiprocessing.get_context('spawn').Queue()
+        _worker_listener = QueueListener(_worker_queue, *handlers, respect_handler_level=True)
+        _worker_listener.start()
+    sample_every = next((log_filter.every for log_filter in file_logger.filters
+                         if isinstance(log_filter, SamplingFilter)), 1)
+    return _log_to_queue, (_worker_queue, sample_every)
+
+def _log_to_queue(log_queue, sample_every: int):
+    # Runs in each worker process as it starts
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(QueueHandler(log_queue))  # Formats the records, so they can be sent to this process
+    if sample_every > 1:
+        sampling_filter = SamplingFilter(sample_every)
+        file_logger.addFilter(sampling_filter)
+        _sample_in_worker(sampling_filter)
+
+def shutdown_logging(summarize: bool = True):
+    """Logs how many per-file messages were sampled out and writes the records still queued."""
+    global _listener, _worker_listener
+    if summarize:
+        _log_sampling_summary()
+    if _worker_listener is not None:
+        worker_listener, _worker_listener = _worker_listener, None
+        worker_listener.stop()
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        _log_directly(listener.handlers)  # Anything logged from now on is written directly
+
+def _log_sampling_summary():
+    for log_filter in file_logger.filters:
+        if isinstance(log_filter, SamplingFilter) and log_filter.dropped:
+            logger.info(f"{log_filter.dropped} of {log_filter.seen} per-file messages were not logged "
+                        f"(1 in {log_filter.every} kept)")
+            log_filter.seen = log_filter.dropped = 0
+
+def _log_directly(handlers):
+    for handler in logger.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            logger.removeHandler(handler)
+    for handler in handlers:
+        logger.addHandler(handler)
+
+def _sample_in_worker(sampling_filter: SamplingFilter):
+    # A worker process samples its own messages and reports them when it exits; atexit does not run there
+    sampling_filter.seen = sampling_filter.dropped = 0
+    sampling_filter._lock = threading.Lock()
+    import multiprocessing.util
+    multiprocessing.util.Finalize(sampling_filter, _log_sampling_summary, exitpriority=0)
+
+def _after_fork_in_child():
+    # A forked worker process has the queue but not the listener thread, so it writes directly
+    global _listener
+    if _listener is not None:
+        handlers, _listener = _listener.handlers, None
+        _log_directly(handlers)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,201 @@
+import io
+import os
+import re
+from functools import lru_cache
+from typing import BinaryIO, Callable, Iterable, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+from utils.file_sniffer import guess_mime_type
+
+GITIGNORE_FILE_NAME = '.gitignore'
+
+class GitignoreRule(NamedTuple):
+    """A compiled gitignore-style pattern."""
+    regex: Pattern
+    negate: bool
+    dir_only: bool
+
+# Gitignore rules of the directories above an entry, as (base relative path, rules) pairs
+GitignoreStack = Tuple[Tuple[str, Tuple[GitignoreRule, ...]], ...]
+
+def is_pattern(value: str) -> bool:
+    """Tells whether a folder or file name given by the user is a glob or a path rather than a plain name."""
+    return any(char in value for char in '*?[/')
+
+def compile_gitignore_pattern(pattern: str) -> Optional[GitignoreRule]:
+    """Compiles one line of a .gitignore file. Returns None for blank lines and comments.
+
+    Patterns without a slash match a name at any depth. Patterns with a slash are
+    anchored to the directory of the .gitignore file. ``*`` and ``?`` do not match
+    ``/``, while ``**`` matches across directories.
+    """
+    pattern = pattern.rstrip()
+    if not pattern or pattern.startswith('#'):
+        return None
+
+    negate = pattern.startswith('!')
+    if negate:
+        pattern = pattern[1:]
+    if pattern.startswith('\\'):
+        pattern = pattern[1:]  # Escaped leading '!' or '#'
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    if not pattern:
+        return None
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    regex = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            regex.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            regex.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            regex.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            content = pattern[i + 1:end]
+            if content.startswith('!'):
+                content = '^' + content[1:]
+            regex.append('[' + content.replace('\\', '\\\\') + ']')
+            i = end + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+
+    prefix = '' if anchored else '(?:.*/)?'
+    return GitignoreRule(re.compile(prefix + ''.join(regex)), negate, dir_only)
+
+def parse_gitignore(lines: Iterable[str]) -> Tuple[GitignoreRule, ...]:
+    """Compiles the lines of a .gitignore file, skipping blank lines and comments."""
+    return tuple(rule for rule in map(compile_gitignore_pattern, lines) if rule is not None)
+
+def match_rules(rules: Sequence[GitignoreRule], path: str, is_dir: bool, ignored: bool = False) -> bool:
+    """Applies rules in order to a slash-separated path. The last matching rule wins."""
+    for rule in rules:
+        if (is_dir or not rule.dir_only) and rule.regex.fullmatch(path):
+            ignored = not rule.negate
+    return ignored
+
+def to_posix_path(relative_path: str) -> str:
+    return relative_path.replace(os.sep, '/') if os.sep != '/' else relative_path
+
+class PathFilter:
+    """Precompiled include/exclude rules shared by the scanner, the PDF generator and the
+    directory structure generator.
+
+    Plain folder names and file extensions are looked up in frozensets. Folder names
+    that contain glob characters or slashes, and ``exclude_patterns``, are compiled as
+    gitignore-style patterns. With ``use_gitignore``, the scanner also applies the
+    .gitignore files it finds in the tree. Excluded folders are pruned before the
+    scanner descends into them.
+    """
+
+    def __init__(self, ignore_folders: Iterable[str] = (), exclude_folders: Iterable[str] = (),
+                 exclude_file_types: Iterable[str] = (), file_types: Optional[Iterable[str]] = None,
+                 include_hidden: bool = True, exclude_patterns: Iterable[str] = (),
+                 use_gitignore: bool = False):
+        folders = list(ignore_folders) + list(exclude_folders)
+        self.excluded_folder_names = frozenset(name for name in folders if not is_pattern(name))
+        self.file_types = frozenset(file_types) if file_types else None
+        self.exclude_file_types = frozenset(exclude_file_types)
+        self.include_hidden = include_hidden
+        self.use_gitignore = use_gitignore
+
+        # Folder entries that are patterns only apply to folders, like a trailing '/' in .gitignore
+        patterns = [name.rstrip('/') + '/' for name in folders if is_pattern(name)] + list(exclude_patterns)
+        self.rules = parse_gitignore(patterns)
+        self._has_negation = any(rule.negate for rule in self.rules)
+        self._dir_regex = self._combine(self.rules)
+        self._file_regex = self._combine([rule for rule in self.rules if not rule.dir_only])
+
+        # Files without an extension all get the same MIME type, so their fate is decided once
+        fallback_type = guess_mime_type('') or "application/octet-stream"
+        self._accepts_extensionless = not any(
+            excluded_type in fallback_type or excluded_type in "text"
+            for excluded_type in self.exclude_file_types
+        )
+
+    @staticmethod
+    def _combine(rules: Sequence[GitignoreRule]) -> Optional[Pattern]:
+        if not rules:
+            return None
+        return re.compile('|'.join(f'(?:{rule.regex.pattern})' for rule in rules))
+
+    def _matches_rules(self, relative_path: str, is_dir: bool) -> bool:
+        if not self.rules:
+            return False
+        path = to_posix_path(relative_path)
+        if self._has_negation:
+            return match_rules(self.rules, path, is_dir)
+        regex = self._dir_regex if is_dir else self._file_regex
+        return regex is not None and regex.fullmatch(path) is not None
+
+    def excludes_dir(self, name: str, relative_path: str) -> bool:
+        """Determines if a folder, and everything below it, should be skipped."""
+        return (not self.include_hidden and name.startswith('.')) or \
+               name in self.excluded_folder_names or \
+               self._matches_rules(relative_path, True)
+
+    def excludes_file(self, name: str, relative_path: str) -> bool:
+        """Determines if a file should be skipped because it is hidden or matches a pattern."""
+        return (not self.include_hidden and name.startswith('.')) or \
+               self._matches_rules(relative_path, False)
+
+    def accepts_file_type(self, file_path: str) -> bool:
+        """Determines if a file should be processed based on the file type inclusion/exclusion lists."""
+        file_extension = os.path.splitext(file_path)[-1]
+        if file_extension:
+            return (self.file_types is None or file_extension in self.file_types) and \
+                   file_extension not in self.exclude_file_types
+        return self._accepts_extensionless
+
+    def load_gitignore(self, directory_path: str,
+                       open_file: Optional[Callable[[str], BinaryIO]] = None) -> Tuple[GitignoreRule, ...]:
+        """Reads and compiles the .gitignore file of a directory, if there is one.
+
+        With ``open_file``, the file is opened in binary mode with it (from an archive,
+        for example) instead of from the disk.
+        """
+        path = os.path.join(directory_path, GITIGNORE_FILE_NAME)
+        try:
+            with (open_file(path) if open_file else open(path, 'rb')) as file:
+                return parse_gitignore(io.TextIOWrapper(file, encoding='utf-8', errors='replace'))
+        except OSError:
+            return ()
+
+    def is_gitignored(self, gitignores: GitignoreStack, relative_path: str, is_dir: bool) -> bool:
+        """Applies the .gitignore files of the directories above an entry, deepest last."""
+        path = to_posix_path(relative_path)
+        ignored = False
+        for base, rules in gitignores:
+            ignored = match_rules(rules, path[len(base) + 1:] if base else path, is_dir, ignored)
+        return ignored
+
+    def enter_directory(self, gitignores: GitignoreStack, directory_path: str, relative_path: str,
+                        open_file: Optional[Callable[[str], BinaryIO]] = None) -> GitignoreStack:
+        """Returns the gitignore rules that apply inside a directory the scanner descends into."""
+        if not self.use_gitignore:
+            return gitignores
+        rules = self.load_gitignore(directory_path, open_file)
+        return gitignores + ((to_posix_path(relative_path), rules),) if rules else gitignores
+
+@lru_cache(maxsize=64)
+def compile_path_filter(ignore_folders: Tuple[str, ...] = (), exclude_folders: Tuple[str, ...] = (),
+                        exclude_file_types: Tuple[str, ...] = (), file_types: Optional[Tuple[str, ...]] = None,
+                        include_hidden: bool = True, exclude_patterns: Tuple[str, ...] = (),
+                        use_gitignore: bool = False) -> PathFilter:
+    """Returns a PathFilter for the given options, compiling it only once per process.
+
+    Filters are not changed once built, so generators with the same options (in a
+    batch, or in the render service) share one.
+    """
+    return PathFilter(ignore_folders, exclude_folders, exclude_file_types, file_types, include_hidden,
+                      exclude_patterns, use_gitignore)
@@ -0,0 +1,193 @@
+import heapq
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Iterable, Iterator, Optional
+
+# Number of slowest files kept in the report
+SLOWEST_FILES = 10
+
+# Number of functions listed from the cProfile capture
+TOP_FUNCTIONS = 25
+
+class Profiler:
+    """Collects per-stage wall times, counters and the slowest files of a generation.
+
+    The same profiler is shared by the PDF generator, the PDF operations and the
+    directory structure generator, which may run in different threads. Worker
+    processes collect their own data and it is merged in with :meth:`merge`, so
+    stage times of parallel renders are summed across workers.
+
+    Use :data:`NULL_PROFILER` when profiling is off: its methods do nothing, so the
+    instrumentation costs a method call per stage.
+    """
+
+    enabled = True
+
+    def __init__(self, slowest_files: int = SLOWEST_FILES, cprofile: bool = False):
+        self.started = time.perf_counter()
+        self.stages = {}  # name -> [seconds, calls]
+        self.counters = {}
+        self.slowest_files = []  # min-heap of (seconds, path, size)
+        self.max_slowest_files = slowest_files
+        self.cprofile = None
+        if cprofile:
+            import cProfile  # cProfile and pstats are only loaded when a capture is requested
+            self.cprofile = cProfile.Profile()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Adds the time spent in the block to a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        with self._lock:
+            totals = self.stages.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+
+    def timed(self, iterable: Iterable, name: str) -> Iterator:
+        """Yields from an iterable, adding the time spent producing each item to a stage."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add_time(name, time.perf_counter() - start)
+            yield item
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_file(self, path: str, seconds: float, size: int):
+        """Remembers a file if it is among the slowest ones so far."""
+        with self._lock:
+            item = (seconds, path, size)
+            if len(self.slowest_files) < self.max_slowest_files:
+                heapq.heappush(self.slowest_files, item)
+            elif item > self.slowest_files[0]:
+                heapq.heapreplace(self.slowest_files, item)
+
+    @contextmanager
+    def capture(self):
+        """Runs the block under cProfile, if cProfile capture was requested.
+
+        cProfile only sees the thread that enters the block.
+        """
+        if self.cprofile is None:
+            yield
+            return
+        self.cprofile.enable()
+        try:
+            yield
+        finally:
+            self.cprofile.disable()
+
+    def data(self) -> dict:
+        """Returns the collected stages, counters and slowest files in a picklable form."""
+        with self._lock:
+            return {
+                'stages': {name: list(totals) for name, totals in self.stages.items()},
+                'counters': dict(self.counters),
+                'slowest_files': list(self.slowest_files),
+            }
+
+    def merge(self, data: Optional[dict]):
+        """Adds the data collected by another profiler, typically in a worker process."""
+        if not data:
+            return
+        for name, (seconds, calls) in data['stages'].items():
+            self.add_time(name, seconds, calls)
+        for name, amount in data['counters'].items():
+            self.count(name, amount)
+        for seconds, path, size in data['slowest_files']:
+            self.record_file(path, seconds, size)
+
+    def report(self, cprofile_path: Optional[str] = None) -> dict:
+        """Builds the machine-readable report. The cProfile stats are dumped to ``cprofile_path`` if given."""
+        data = self.data()
+        report = {
+            'total_seconds': round(time.perf_counter() - self.started, 6),
+            'stages': {
+                name: {'seconds': round(seconds, 6), 'calls': calls}
+                for name, (seconds, calls) in sorted(data['stages'].items(), key=lambda item: -item[1][0])
+            },
+            'counters': data['counters'],
+            'slowest_files': [
+                {'path': path, 'seconds': round(seconds, 6), 'bytes': size}
+                for seconds, path, size in sorted(data['slowest_files'], reverse=True)
+            ],
+        }
+        if self.cprofile is not None:
+            report['cprofile'] = self._cprofile_report(cprofile_path)
+        return report
+
+    def _cprofile_report(self, cprofile_path: Optional[str]) -> dict:
+        import pstats
+        stats = pstats.Stats(self.cprofile, stream=io.StringIO())
+        if cprofile_path:
+            stats.dump_stats(cprofile_path)
+        top_functions = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]
+        return {
+            'stats_file': cprofile_path,
+            'top_functions': [
+                {
+                    'function': f"{file_name}:{line}({function_name})",
+                    'calls': total_calls,
+                    'total_seconds': round(total_time, 6),
+                    'cumulative_seconds': round(cumulative_time, 6),
+                }
+                for (file_name, line, function_name), (_, total_calls, total_time, cumulative_time, _)
+                in top_functions
+            ],
+        }
+
+    def write_report(self, report_path: str, cprofile_path: Optional[str] = None) -> dict:
+        report = self.report(cprofile_path)
+        with open(report_path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=4)
+        return report
+
+
+class _NullProfiler(Profiler):
+    """A profiler that records nothing."""
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__(slowest_files=0)
+
+    def stage(self, name: str):
+        return nullcontext()
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        pass
+
+    def timed(self, iterable: Iterable, name: str) -> Iterable:
+        return iterable
+
+    def count(self, name: str, amount: int = 1):
+        pass
+
+    def record_file(self, path: str, seconds: float, size: int):
+        pass
+
+    def capture(self):
+        return nullcontext()
+
+    def merge(self, data: Optional[dict]):
+        pass
+
+
+NULL_PROFILER = _NullProfiler()
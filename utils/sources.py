@@ -0,0 +1,642 @@
+"""
+Sources of the files of a tree: a directory, a zip or tar archive, or a revision of a git repository.
+
+A source lists the entries of each directory of its tree and opens files by their
+relative path. The scanner, the sniffer and the renderer only go through it, so
+archive members and git blobs are read where they are, without extracting them first.
+"""
+
+import bisect
+import errno
+import io
+import mmap
+import os
+import stat
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from utils.logging_utils import logger
+
+# Archives are recognized by their extension
+ZIP_EXTENSIONS = ('.zip',)
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# The decompressor of a gzip-compressed tar archive is saved about every this many
+# uncompressed bytes, so that reading a member only decompresses from the save before it
+GZIP_CHECKPOINT_INTERVAL = 1024 * 1024
+
+# Blobs up to this size are read whole through one long-running `git cat-file --batch`;
+# larger ones are streamed from a `git cat-file blob` of their own
+GIT_STREAM_THRESHOLD = 1024 * 1024
+
+# Archives and git revisions stay indexed, per process, up to this many; the least
+# recently opened ones are closed beyond that
+MAX_INDEXED_SOURCES = 16
+
+_GZIP_INPUT_SIZE = 64 * 1024
+_GZIP_BLOCK_SIZE = 256 * 1024
+
+class ScanEntry(NamedTuple):
+    """A single file or directory found while scanning a tree."""
+    path: str
+    relative_path: str
+    name: str
+    depth: int
+    is_dir: bool
+    is_file: bool
+    size: int
+    mtime_ns: int
+
+
+class Source:
+    """Where the files of a tree are read from.
+
+    ``location`` is what the user gave (a path, or "repository@revision"), and ``name``
+    is what the outputs are named after. Entries have the relative paths of the tree;
+    their ``path`` is the location joined with the relative path, for messages.
+    """
+
+    def __init__(self, location: str, name: str):
+        self.location = location
+        self.name = name
+
+    def list_dir(self, relative_path: str, depth: int) -> Iterator[ScanEntry]:
+        """Yields the entries of a directory of the tree ('' for the top), which are at ``depth``."""
+        raise NotImplementedError
+
+    def entry(self, relative_path: str) -> Optional[ScanEntry]:
+        """Returns the entry at a path of the tree, or None if there is none."""
+        raise NotImplementedError
+
+    def open(self, relative_path: str) -> BinaryIO:
+        """Opens a file of the tree for reading in binary mode. Raises OSError if it cannot be read."""
+        raise NotImplementedError
+
+    def map(self, relative_path: str) -> Optional[mmap.mmap]:
+        """Memory-maps a file of the tree read-only, or returns None if the source cannot map its files."""
+        return None
+
+    def getsize(self, relative_path: str) -> int:
+        entry = self.entry(relative_path)
+        if entry is None or not entry.is_file:
+            raise _not_found(os.path.join(self.location, relative_path))
+        return entry.size
+
+    def close(self):
+        pass
+
+
+class DirectorySource(Source):
+    """A directory on disk, walked with ``os.scandir``."""
+
+    def __init__(self, location: str):
+        super().__init__(location, os.path.basename(location))
+
+    def list_dir(self, relative_path: str, depth: int) -> Iterator[ScanEntry]:
+        path = os.path.join(self.location, relative_path) if relative_path else self.location
+        try:
+            iterator = os.scandir(path)
+        except OSError as e:
+            if not relative_path:
+                raise  # Without its top directory, there is nothing to scan
+            logger.warning(f"Skipping directory {path}: {e}")
+            return
+        with iterator:
+            for entry in iterator:
+                yield self._make_entry(entry, relative_path, depth)
+
+    def entry(self, relative_path: str) -> Optional[ScanEntry]:
+        path = os.path.join(self.location, relative_path)
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        is_dir = stat.S_ISDIR(stat_result.st_mode)
+        is_file = stat.S_ISREG(stat_result.st_mode)
+        size, mtime_ns = (stat_result.st_size, stat_result.st_mtime_ns) if is_file else (0, 0)
+        return ScanEntry(path, relative_path, os.path.basename(relative_path), relative_path.count(os.sep),
+                         is_dir, is_file, size, mtime_ns)
+
+    def open(self, relative_path: str) -> BinaryIO:
+        return open(os.path.join(self.location, relative_path), 'rb')
+
+    def map(self, relative_path: str) -> Optional[mmap.mmap]:
+        with open(os.path.join(self.location, relative_path), 'rb') as file:
+            if not os.fstat(file.fileno()).st_size:
+                return None  # Empty files cannot be mapped
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)  # Read ahead, as the file is decoded from start to end
+        return mapping
+
+    def getsize(self, relative_path: str) -> int:
+        return os.path.getsize(os.path.join(self.location, relative_path))
+
+    @staticmethod
+    def _make_entry(entry: os.DirEntry, parent_relative_path: str, depth: int) -> ScanEntry:
+        relative_path = os.path.join(parent_relative_path, entry.name) if parent_relative_path else entry.name
+        try:
+            is_dir = entry.is_dir()
+            is_file = not is_dir and entry.is_file()
+        except OSError:
+            is_dir = is_file = False
+
+        size = mtime_ns = 0
+        if is_file:
+            try:
+                stat_result = entry.stat()
+                size, mtime_ns = stat_result.st_size, stat_result.st_mtime_ns
+            except OSError:
+                is_file = False
+        return ScanEntry(entry.path, relative_path, entry.name, depth, is_dir, is_file, size, mtime_ns)
+
+
+class _IndexedSource(Source):
+    """A source whose entries are all listed up front, from the table of contents of an archive or from a git tree.
+
+    Directories that only appear in the paths of their members are added too.
+    Members with absolute paths or ".." in their path are left out.
+    """
+
+    def __init__(self, location: str, name: str):
+        super().__init__(location, name)
+        self._entries: Dict[str, ScanEntry] = {}
+        self._children: Dict[str, List[ScanEntry]] = {'': []}
+        self._members = {}  # Relative path of a file -> what _open_member opens
+
+    def _add(self, member_path: str, is_dir: bool, is_file: bool, size: int = 0, mtime_ns: int = 0, member=None):
+        parts = [part for part in member_path.split('/') if part and part != '.']
+        if not parts or '..' in parts:
+            return
+        for depth, name in enumerate(parts):
+            relative_path = os.sep.join(parts[:depth + 1])
+            existing = self._entries.get(relative_path)
+            if depth < len(parts) - 1:
+                if existing is not None:
+                    continue
+                entry = ScanEntry(os.path.join(self.location, relative_path), relative_path, name, depth,
+                                  True, False, 0, 0)
+            else:
+                entry = ScanEntry(os.path.join(self.location, relative_path), relative_path, name, depth,
+                                  is_dir, is_file, size, mtime_ns)
+            siblings = self._children.get(os.sep.join(parts[:depth]))
+            if siblings is None:
+                return  # Below a member that is not a directory
+            if existing is None:
+                siblings.append(entry)
+            else:
+                siblings[siblings.index(existing)] = entry  # A directory listed after its members, or a duplicate
+            self._entries[relative_path] = entry
+            if entry.is_dir:
+                self._children.setdefault(relative_path, [])
+        if is_file:
+            self._members[os.sep.join(parts)] = member
+
+    def list_dir(self, relative_path: str, depth: int) -> Iterator[ScanEntry]:
+        yield from self._children.get(relative_path, ())
+
+    def entry(self, relative_path: str) -> Optional[ScanEntry]:
+        return self._entries.get(relative_path)
+
+    def open(self, relative_path: str) -> BinaryIO:
+        entry = self._entries.get(relative_path)
+        if entry is None or not entry.is_file:
+            raise _not_found(os.path.join(self.location, relative_path))
+        return self._open_member(self._members[relative_path])
+
+    def _open_member(self, member) -> BinaryIO:
+        raise NotImplementedError
+
+
+class _ArchiveSource(_IndexedSource):
+    """An archive file, indexed when the source is created.
+
+    Closing the source closes the archive file; the next read opens it again, so a
+    source that is still shared can be closed safely. An archive that changed since it
+    was indexed is not opened again, as the index would not match it.
+    """
+
+    def __init__(self, location: str, name: str):
+        super().__init__(location, name)
+        self._lock = threading.Lock()
+        self._version = _file_version(location)
+        self._archive = self._open_archive()
+
+    def _open_archive(self):
+        raise NotImplementedError
+
+    def _opened_archive(self):
+        """Returns the open archive, opening it again if the source was closed. Called with the lock held."""
+        if self._archive is None:
+            if _file_version(self.location) != self._version:
+                raise OSError(errno.ESTALE, f"{self.location} changed since it was indexed")
+            self._archive = self._open_archive()
+        return self._archive
+
+    def close(self):
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+
+class ZipSource(_ArchiveSource):
+    """The members of a zip archive, decompressed as they are read."""
+
+    def __init__(self, location: str):
+        super().__init__(location, _strip_extension(os.path.basename(location), ZIP_EXTENSIONS))
+        for info in self._archive.infolist():
+            if info.is_dir():
+                self._add(info.filename, True, False)
+            else:
+                self._add(info.filename, False, True, info.file_size, _zip_mtime_ns(info.date_time), info)
+
+    def _open_archive(self):
+        import zipfile  # Only loaded for archives
+        return zipfile.ZipFile(self.location)
+
+    def _open_member(self, info) -> BinaryIO:
+        # Members can be read from several threads at once, and stay readable when the archive is closed
+        with self._lock:
+            return self._opened_archive().open(info)
+
+
+class TarSource(_ArchiveSource):
+    """The members of a tar archive, plain or compressed with gzip, bzip2 or xz.
+
+    Members are read through one file, so reads from several threads take turns, and
+    closing the source waits for the members being read to be closed. A
+    gzip-compressed archive is read through :class:`_SeekableGzip`, so going back to
+    an earlier member does not decompress the archive again from its start. Links and
+    other special members are listed, but have no content.
+    """
+
+    def __init__(self, location: str):
+        self._readers = 0
+        self._closing = False
+        super().__init__(location, _strip_extension(os.path.basename(location), TAR_EXTENSIONS))
+        for member in self._archive:
+            if member.isdir():
+                self._add(member.name, True, False)
+            elif member.isreg():
+                self._add(member.name, False, True, member.size, int(member.mtime) * 1_000_000_000, member)
+            else:
+                self._add(member.name, False, False)
+
+    def _open_archive(self):
+        import tarfile  # Only loaded for archives
+        with open(self.location, 'rb') as archive:
+            compressed_with_gzip = archive.read(2) == b'\x1f\x8b'
+        if compressed_with_gzip:
+            return tarfile.open(fileobj=io.BufferedReader(_SeekableGzip(self.location)), mode='r:')
+        return tarfile.open(self.location)
+
+    def _open_member(self, member) -> BinaryIO:
+        with self._lock:
+            file = self._opened_archive().extractfile(member)
+            self._readers += 1
+            self._closing = False
+            return io.BufferedReader(_LockedReader(file, self._lock, self._release_reader))
+
+    def _release_reader(self):
+        self._readers -= 1
+        if self._closing and not self._readers:
+            self._closing = False
+            self._archive.close()
+            self._archive = None
+
+    def close(self):
+        with self._lock:
+            if self._readers:
+                self._closing = True  # The last reader closes the archive
+            elif self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+
+class GitSource(_IndexedSource):
+    """The tree of a revision of a git repository (bare or not), read with the ``git`` command.
+
+    Git does not record when files were modified, so the ``mtime_ns`` of a file is
+    taken from its blob id instead: it changes exactly when the content does, which is
+    all the render cache and the manifest use it for. Symbolic links and submodules are
+    listed, but have no content.
+    """
+
+    def __init__(self, location: str, repository: str, revision: str, tree: Optional[str] = None):
+        import subprocess  # Only loaded for git revisions
+        self._subprocess = subprocess
+        self.repository = repository
+        self.revision = revision
+        repository_name = os.path.basename(os.path.abspath(repository))
+        if repository_name == '.git':
+            repository_name = os.path.basename(os.path.dirname(os.path.abspath(repository)))
+        name = f"{_strip_extension(repository_name, ('.git',))}@{revision}"
+        super().__init__(location, name.replace('/', '_').replace(os.sep, '_').replace(':', '_'))
+        self._lock = threading.Lock()
+        self._batch = None  # The `git cat-file --batch` process, started on the first read
+
+        self.tree = tree or self.resolve(repository, revision)
+        for record in self._git('ls-tree', '-r', '-t', '-l', '-z', self.tree).split(b'\0'):
+            if not record:
+                continue
+            info, _, member_path = record.partition(b'\t')
+            mode, kind, object_id, size = info.split()
+            member_path = os.fsdecode(member_path)
+            if kind == b'tree':
+                self._add(member_path, True, False)
+            elif kind == b'blob' and mode != b'120000':
+                self._add(member_path, False, True, int(size), int(object_id[:15], 16), (object_id, int(size)))
+            else:
+                self._add(member_path, False, False)
+
+    @staticmethod
+    def resolve(repository: str, revision: str) -> str:
+        """Returns the id of the tree of a revision. Raises ValueError if the repository has no such revision."""
+        import subprocess
+        result = subprocess.run(['git', '-C', repository, 'rev-parse', '--verify', '--quiet', f'{revision}^{{tree}}'],
+                                capture_output=True)
+        if result.returncode:
+            raise ValueError(f"'{revision}' is not a revision of the git repository {repository}")
+        return result.stdout.decode().strip()
+
+    def _git(self, *args: str) -> bytes:
+        result = self._subprocess.run(['git', '-C', self.repository, *args], capture_output=True)
+        if result.returncode:
+            raise ValueError(f"Cannot read {self.location}: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+
+    def _open_member(self, member: Tuple[bytes, int]) -> BinaryIO:
+        object_id, size = member
+        if size > GIT_STREAM_THRESHOLD:
+            process = self._subprocess.Popen(['git', '-C', self.repository, 'cat-file', 'blob', object_id.decode()],
+                                             stdout=self._subprocess.PIPE, stderr=self._subprocess.DEVNULL)
+            return io.BufferedReader(_ProcessOutput(process))
+        with self._lock:
+            if self._batch is None or self._batch.poll() is not None:
+                self._batch = self._subprocess.Popen(['git', '-C', self.repository, 'cat-file', '--batch'],
+                                                     stdin=self._subprocess.PIPE, stdout=self._subprocess.PIPE)
+            self._batch.stdin.write(object_id + b'\n')
+            self._batch.stdin.flush()
+            header = self._batch.stdout.readline().split()  # "<id> blob <size>", or "<id> missing"
+            if len(header) != 3:
+                raise OSError(errno.EIO, f"Cannot read blob {object_id.decode()} from {self.repository}")
+            data = self._batch.stdout.read(int(header[2]) + 1)[:-1]  # The content is followed by a newline
+        return io.BytesIO(data)
+
+    def close(self):
+        with self._lock:
+            if self._batch is not None:
+                self._batch.stdin.close()
+                self._batch.wait()
+                self._batch = None
+
+
+class _LockedReader(io.RawIOBase):
+    """Reads a file that shares its underlying file with others, holding ``lock`` for each read.
+
+    ``on_close`` is called, with the lock held, when the reader is closed.
+    """
+
+    def __init__(self, file: BinaryIO, lock: threading.Lock, on_close: Optional[Callable[[], None]] = None):
+        self._file = file
+        self._lock = lock
+        self._on_close = on_close
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        with self._lock:
+            return self._file.readinto(buffer)
+
+    def close(self):
+        if not self.closed and self._on_close is not None:
+            with self._lock:
+                self._on_close()
+        super().close()
+
+
+class _ProcessOutput(io.RawIOBase):
+    """Reads the output of a process, which is stopped when it is closed."""
+
+    def __init__(self, process):
+        self._process = process
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self._process.stdout.readinto(buffer)
+
+    def close(self):
+        if not self.closed:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.stdout.close()
+            self._process.wait()
+        super().close()
+
+
+class _SeekableGzip(io.RawIOBase):
+    """Reads a gzip file, seeking in both directions without decompressing from the start each time.
+
+    The state of the decompressor is copied every GZIP_CHECKPOINT_INTERVAL bytes of
+    output, and a seek resumes from the last copy before the target (as zran.c from
+    the zlib sources does). The last decompressed block is kept, so going back a
+    little, as when a file is sniffed and then read, costs nothing.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._position = 0
+        self._checkpoint_offsets = [0]
+        self._checkpoints = [(0, zlib.decompressobj(31))]  # (offset in the gzip file, decompressor), by output offset
+        self._resume(0)
+
+    def _resume(self, index: int):
+        file_offset, decompressor = self._checkpoints[index]
+        self._file.seek(file_offset)
+        self._decompressor = decompressor.copy()
+        self._input = b''  # Compressed bytes not fed to the decompressor yet
+        self._block = b''
+        self._block_start = self._checkpoint_offsets[index]
+
+    def _next_block(self) -> bool:
+        """Decompresses the block after the current one. Returns False at the end of the file."""
+        start = self._block_start + len(self._block)
+        data = b''
+        try:
+            while not data:
+                if not self._input:
+                    self._input = self._file.read(_GZIP_INPUT_SIZE)
+                    if not self._input:
+                        return False
+                if self._decompressor.eof:
+                    self._decompressor = zlib.decompressobj(31)  # The next member of a multi-member file
+                data = self._decompressor.decompress(self._input, _GZIP_BLOCK_SIZE)
+                self._input = self._decompressor.unused_data if self._decompressor.eof else self._decompressor.unconsumed_tail
+        except zlib.error as e:
+            raise OSError(errno.EIO, f"Invalid gzip data: {e}")
+        self._block, self._block_start = data, start
+        end = start + len(data)
+        if not self._input and end >= self._checkpoint_offsets[-1] + GZIP_CHECKPOINT_INTERVAL:
+            self._checkpoint_offsets.append(end)
+            self._checkpoints.append((self._file.tell(), self._decompressor.copy()))
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Can only seek from the start or the current position")
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        while not self._block_start <= self._position < self._block_start + len(self._block):
+            if self._position < self._block_start:
+                self._resume(bisect.bisect_right(self._checkpoint_offsets, self._position) - 1)
+            elif not self._next_block():
+                return 0
+        start = self._position - self._block_start
+        count = min(len(buffer), len(self._block) - start)
+        buffer[:count] = self._block[start:start + count]
+        self._position += count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _not_found(path: str) -> FileNotFoundError:
+    return FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
+def _strip_extension(file_name: str, extensions: Tuple[str, ...]) -> str:
+    for extension in extensions:
+        if file_name.lower().endswith(extension) and len(file_name) > len(extension):
+            return file_name[:-len(extension)]
+    return file_name
+
+def _zip_mtime_ns(date_time: tuple) -> int:
+    try:
+        return int(time.mktime(date_time + (0, 0, -1))) * 1_000_000_000
+    except (OverflowError, ValueError):
+        return 0
+
+def _split_git_location(location: str) -> Optional[Tuple[str, str]]:
+    """Splits "repository@revision" at the first '@' that follows a git repository."""
+    index = location.find('@')
+    while index > 0:
+        repository = location[:index]
+        if index < len(location) - 1 and (os.path.exists(os.path.join(repository, '.git')) or
+                                          (os.path.isfile(os.path.join(repository, 'HEAD')) and
+                                           os.path.isdir(os.path.join(repository, 'objects')))):
+            return repository, location[index + 1:]
+        index = location.find('@', index + 1)
+    return None
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ZIP_EXTENSIONS + TAR_EXTENSIONS)
+
+def is_source(location: str) -> bool:
+    """Tells whether a location names a directory, an archive or a revision of a git repository."""
+    return (os.path.isdir(location) or (os.path.isfile(location) and is_archive(location)) or
+            _split_git_location(location) is not None)
+
+def open_source(location: str) -> Source:
+    """Returns the source of a directory, a zip or tar archive, or "repository@revision".
+
+    A location that is none of these is taken as a directory, which reports that it
+    is missing when it is scanned. Archives and git trees are indexed once per process
+    (and again if the archive changes, or the revision moves), so every generator and
+    worker that opens the same location shares the index. Raises ValueError if an
+    archive or revision cannot be read.
+    """
+    if os.path.isdir(location):
+        return DirectorySource(location)
+    if os.path.isfile(location) and is_archive(location):
+        return _indexed_sources.get('archive', location, _file_version(location))
+    git_location = _split_git_location(location)
+    if git_location is not None:
+        return _indexed_sources.get('git', location, GitSource.resolve(*git_location))
+    return DirectorySource(location)
+
+def _open_indexed(kind: str, location: str, version) -> Source:
+    if kind == 'git':
+        return GitSource(location, *_split_git_location(location), tree=version)
+    import tarfile
+    import zipfile
+    try:
+        return ZipSource(location) if location.lower().endswith(ZIP_EXTENSIONS) else TarSource(location)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        raise ValueError(f"Cannot read archive {location}: {e}")
+
+def _file_version(path: str) -> Tuple[int, int]:
+    stat_result = os.stat(path)
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+class _SourceCache:
+    """The indexed sources of a process, by kind and location, with the version they were indexed at.
+
+    Holds at most ``max_sources``, closing the least recently opened ones beyond that,
+    and closes a source when its archive changed or its revision moved and it is
+    indexed again. Closing only releases files and processes (see
+    :class:`_ArchiveSource`), so a closed source that is still being read from keeps
+    working. A forked worker drops the sources of its parent without closing them, as
+    the open files and processes are the parent's.
+    """
+
+    def __init__(self, max_sources: int):
+        self.max_sources = max_sources
+        self._sources: 'OrderedDict[Tuple[str, str], Tuple[object, Source]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get(self, kind: str, location: str, version) -> Source:
+        key = (kind, location)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._sources.clear()
+                self._pid = os.getpid()
+            cached = self._sources.get(key)
+            if cached is not None and cached[0] == version:
+                self._sources.move_to_end(key)
+                return cached[1]
+        source = _open_indexed(kind, location, version)  # Outside the lock, as indexing can take a while
+
+        with self._lock:
+            replaced = self._sources.pop(key, None)
+            self._sources[key] = (version, source)
+            dropped = [replaced[1]] if replaced is not None else []
+            while len(self._sources) > self.max_sources:
+                dropped.append(self._sources.popitem(last=False)[1][1])
+        for old_source in dropped:
+            old_source.close()
+        return source
+
+    def close_all(self):
+        with self._lock:
+            sources = [source for _, source in self._sources.values()]
+            self._sources.clear()
+        for source in sources:
+            source.close()
+
+_indexed_sources = _SourceCache(MAX_INDEXED_SOURCES)
+
+def close_sources():
+    """Closes the files and processes of every indexed source of this process, and forgets the sources."""
+    _indexed_sources.close_all()